@@ -0,0 +1,72 @@
+"""Benchmark of the AlertEngine on the latest rows of a large master table.
+
+Every rule count is checked against the target time, by default the one
+second the largest case (5000 tickers x 5000 rules) has to stay well under.
+
+Usage:
+    python benchmarks/bench_alerts.py --tickers 5000 --days 250 --rules 1000 5000
+"""
+import argparse
+import time
+import numpy as np
+import polars as pl
+from stock_alert.alerts import AlertEngine, Comparison, CrossAbove, CrossBelow, Rule
+
+
+def make_master(n_tickers: int, n_days: int, seed: int = 0) -> pl.DataFrame:
+    """Master table with prices and a few feature columns, sorted by identifier and date."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, size=(n_tickers, n_days)), axis=1))
+    return pl.DataFrame({
+        "identifier": np.repeat([f"T{i:05d}" for i in range(n_tickers)], n_days),
+        "Date": np.tile(np.arange(n_days), n_tickers),
+        "Close": close.ravel(),
+    }).with_columns(
+        pl.col("Close").rolling_mean(21).over("identifier").alias("sma_21d"),
+        pl.col("Close").rolling_mean(50).over("identifier").alias("sma_50d"),
+        pl.col("Close").pct_change().over("identifier").alias("returns_1d"),
+    )
+
+
+def make_rules(n_rules: int) -> list[Rule]:
+    """Thresholds on the returns, comparisons and crossovers between columns."""
+    rules = []
+    for i in range(n_rules):
+        kind = i % 4
+        if kind == 0:
+            rules.append(Comparison("returns_1d", ">", i / n_rules / 10, name=f"rule_{i}"))
+        elif kind == 1:
+            rules.append(Comparison("Close", "<", "sma_21d", name=f"rule_{i}"))
+        elif kind == 2:
+            rules.append(CrossAbove("sma_21d", "sma_50d", name=f"rule_{i}"))
+        else:
+            rules.append(CrossBelow("Close", 100 + i % 50, name=f"rule_{i}"))
+    return rules
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickers", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=250)
+    parser.add_argument("--rules", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--target", type=float, default=1.0, help="Seconds every rule count must stay under")
+    args = parser.parse_args()
+
+    master = make_master(args.tickers, args.days).lazy()
+    print(f"{args.tickers} tickers x {args.days} days, best of {args.repeats}")
+    print(f"{'rules':>6} {'time (s)':>9} {'alerts':>9} {'target':>7}")
+
+    for n_rules in args.rules:
+        engine = AlertEngine(make_rules(n_rules))
+        timings = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            alerts = engine.evaluate(master)
+            timings.append(time.perf_counter() - start)
+        status = "ok" if min(timings) < args.target else "MISSED"
+        print(f"{n_rules:>6} {min(timings):>9.3f} {alerts.height:>9} {status:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Benchmark of the FeatureEngine planner against independent feature windows.
+
+Every feature evaluated on its own sorts its partitions and recomputes the
+sub-expressions it shares with other features. The planner sorts once per
+window and computes shared sub-expressions once, so the gap should widen as
+the number of features grows.
+
+Usage:
+    python benchmarks/bench_feature_planner.py --tickers 200 --days 1000
+"""
+import argparse
+import time
+import numpy as np
+import polars as pl
+from stock_alert.features import Feature, FeatureEngine, MovingAverage
+from stock_alert.features.atomic_features import Lag, RelativeStrengthIndex, Returns, Volatility
+
+
+def make_data(n_tickers: int, n_days: int, seed: int = 0) -> pl.LazyFrame:
+    """Random walks for `n_tickers`, rows shuffled so that every window has to sort."""
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0, 0.02, size=(n_tickers, n_days))
+    return pl.LazyFrame({
+        "identifier": np.repeat([f"T{i:05d}" for i in range(n_tickers)], n_days),
+        "Date": np.tile(np.arange(n_days), n_tickers),
+        "Close": (100 * np.exp(np.cumsum(returns, axis=1))).ravel(),
+    }).select(pl.all().shuffle(seed=seed))
+
+
+def make_features(n_features: int) -> list[Feature]:
+    """Cycle through the feature classes with growing windows."""
+    classes = [MovingAverage, Volatility, RelativeStrengthIndex, Returns, Lag]
+    features = []
+    for i in range(n_features):
+        cls = classes[i % len(classes)]
+        size = 2 + i // len(classes)
+        kwargs = {"n_days": size} if cls in (Returns, Lag) else {"window_days": size}
+        features.append(cls(column="Close", sort_by="Date", group_by="identifier", **kwargs))
+    return features
+
+
+def best_of(repeats: int, run) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickers", type=int, default=200)
+    parser.add_argument("--days", type=int, default=1000)
+    parser.add_argument("--features", type=int, nargs="+", default=[5, 25, 100, 200, 400])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    data = make_data(args.tickers, args.days).collect().lazy()
+    print(f"{args.tickers} tickers x {args.days} days, best of {args.repeats}")
+    print(f"{'features':>8} {'independent (s)':>16} {'planned (s)':>12} {'speedup':>8}")
+
+    for n_features in args.features:
+        features = make_features(n_features)
+        engine = FeatureEngine(features)
+
+        independent = best_of(args.repeats, lambda: data.with_columns(f.compute() for f in features).collect())
+        planned = best_of(args.repeats, lambda: engine.transform(data).collect())
+        print(f"{n_features:>8} {independent:>16.3f} {planned:>12.3f} {independent / planned:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
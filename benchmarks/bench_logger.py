@@ -0,0 +1,76 @@
+"""Microbenchmark of the logger proxy against the former inspect.stack() lookup.
+
+Measures the cost of a disabled `logger.debug` call and of an enabled
+`logger.info` call written to /dev/null, from a shallow and a deep call stack
+(the former lookup grows with the depth of the stack), and of `logger.info`
+with the queue handler.
+
+Usage:
+    python benchmarks/bench_logger.py --calls 2000
+"""
+import argparse
+import inspect
+import logging
+import os
+import time
+from common import logger as logger_module
+from common.logger import logger
+
+
+class InspectProxy:
+    """The former proxy: inspects the whole stack and sets up the logger on every call."""
+
+    def __getattr__(self, name: str):
+        for frame_info in inspect.stack():
+            module = inspect.getmodule(frame_info.frame)
+            if module and module.__name__ != __name__:
+                caller_module = module.__name__
+                break
+        else:
+            caller_module = __name__
+        return getattr(logger_module._setup_logger(caller_module), name)
+
+
+def call_at_depth(depth: int, function, *args) -> None:
+    if depth > 0:
+        return call_at_depth(depth - 1, function, *args)
+    function(*args)
+
+
+def per_call(proxy, method: str, calls: int, depth: int) -> float:
+    def loop():
+        getattr(proxy, method)  # Set up the logger of this module
+        for i in range(calls):
+            getattr(proxy, method)("Fetched %s rows", i)
+
+    start = time.perf_counter()
+    call_at_depth(depth, loop)
+    return (time.perf_counter() - start) / calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    # Enabled records go to /dev/null, DEBUG stays disabled
+    logger_module._setup_logger(__name__)
+    logger_module._handler.setStream(open(os.devnull, "w"))
+    logging.getLogger(__name__).setLevel(logging.INFO)
+
+    print(f"{'call':<14} {'depth':>5} {'inspect (us)':>13} {'proxy (us)':>11} {'speedup':>8}")
+    for method in ("debug", "info"):
+        for depth in (0, 30):
+            before = per_call(InspectProxy(), method, args.calls, depth) * 1e6
+            after = per_call(logger, method, args.calls, depth) * 1e6
+            print(f"logger.{method:<7} {depth:>5} {before:>13.1f} {after:>11.2f} {before / after:>7.0f}x")
+
+    # Records are written by a background thread
+    logger_module.enable_queue_logging()
+    logger_module._listener.handlers[0].setStream(open(os.devnull, "w"))
+    queued = per_call(logger, "info", args.calls, 0) * 1e6
+    print(f"logger.info with enable_queue_logging(): {queued:.2f} us per call on the caller's thread")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark of the master table written as computed against the compact `MasterSchema`.
+
+Both tables are written by `DataPipeline` from the same synthetic universe,
+then compared on file size and on the time of typical reads: a full scan of
+a column, the dashboard query (a few tickers over the last year) and the
+alert evaluation (latest rows of every ticker).
+
+Usage:
+    python benchmarks/bench_master_schema.py --tickers 2000 --days 2520
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+import polars as pl
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+from stock_alert.alerts import AlertEngine, Comparison  # noqa: E402
+from stock_alert.features import FeatureEngine, MovingAverage  # noqa: E402
+from stock_alert.features.atomic_features import RelativeStrengthIndex, Returns, Volatility  # noqa: E402
+from stock_alert.fetcher import SyntheticFetcher  # noqa: E402
+from stock_alert.pipeline import DataPipeline  # noqa: E402
+from stock_alert.schema import MasterSchema  # noqa: E402
+from stock_alert.storage import date_literal  # noqa: E402
+
+
+def best_of(repeats: int, run) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def make_engine() -> FeatureEngine:
+    return FeatureEngine([
+        MovingAverage("Close", 21, "Date", "identifier"),
+        MovingAverage("Close", 200, "Date", "identifier"),
+        Returns("Close", 1, "Date", "identifier"),
+        Volatility("Close", 21, "Date", "identifier"),
+        RelativeStrengthIndex("Close", 14, "Date", "identifier"),
+    ])
+
+
+def queries(path: Path, tickers: list[str]) -> dict:
+    """Typical reads of the master table."""
+    def full_scan():
+        pl.scan_parquet(path).select(pl.col("Close").mean()).collect()
+
+    def dashboard():
+        scan = pl.scan_parquet(path)
+        dtype = scan.collect_schema()["Date"]
+        last = scan.select(pl.col("Date").max()).collect().item()
+        scan.filter(
+            pl.col("identifier").is_in(tickers),
+            pl.col("Date") >= date_literal(last - timedelta(days=365), dtype),
+        ).select("identifier", "Date", "Close", "sma_21d").collect()
+
+    def alerts():
+        AlertEngine([Comparison("Close", "<", "sma_21d")]).evaluate(pl.scan_parquet(path))
+
+    return {"full scan": full_scan, "dashboard": dashboard, "alerts": alerts}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickers", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=2520)
+    parser.add_argument("--batch-size", type=int, default=250)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    fetcher = SyntheticFetcher(n_identifiers=args.tickers, n_days=args.days)
+    tickers = fetcher.identifiers[:: max(args.tickers // 5, 1)][:5]
+    print(f"{args.tickers} tickers x {args.days} days, best of {args.repeats}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = {}
+        for label, schema in (("as computed", None), ("MasterSchema", MasterSchema())):
+            output = Path(directory) / label.replace(" ", "_")
+            start = time.perf_counter()
+            DataPipeline(fetcher, make_engine(), str(output), batch_size=args.batch_size, schema=schema).run()
+            write_seconds = time.perf_counter() - start
+            path = output / "master_table.parquet"
+            timings = {name: best_of(args.repeats, query) for name, query in queries(path, tickers).items()}
+            results[label] = {"size (MB)": path.stat().st_size / 1e6, "write (s)": write_seconds, **timings}
+
+    before, after = results["as computed"], results["MasterSchema"]
+    print(f"{'':>12} {'as computed':>12} {'MasterSchema':>13} {'ratio':>7}")
+    for name in before:
+        print(f"{name:>12} {before[name]:>12.3f} {after[name]:>13.3f} {before[name] / after[name]:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
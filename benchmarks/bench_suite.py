@@ -0,0 +1,203 @@
+"""Benchmark suite of FeatureEngine and DataPipeline on synthetic data.
+
+Every case runs in a fresh process, so its peak memory (max RSS) is not
+inflated by the cases before it. Results are stored as JSON together with the
+commit they were measured on, and two result files can be compared to spot
+regressions.
+
+Usage:
+    python benchmarks/bench_suite.py --preset quick
+    python benchmarks/bench_suite.py --preset full --output benchmarks/results/full.json
+    python benchmarks/bench_suite.py --compare before.json after.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from pathlib import Path
+import polars as pl
+
+FEATURE_CLASSES = ["MovingAverage", "Returns", "Volatility", "Lag", "RelativeStrengthIndex"]
+
+PRESETS = {
+    "quick": {"tickers": [10, 100, 1000], "days": [252, 1260], "counts": [1, 10], "pipeline_tickers": [10, 100]},
+    "full": {
+        "tickers": [10, 100, 1000, 10000],
+        "days": [252, 1260, 2520],
+        "counts": [1, 10, 50],
+        "pipeline_tickers": [10, 100, 1000, 10000],
+    },
+}
+
+
+@dataclass
+class Case:
+    """One benchmark case: a suite and its parameters."""
+    suite: str
+    tickers: int
+    days: int
+    feature: str = "mixed"
+    count: int = 1
+    batch_size: int | None = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.suite}/{self.feature}x{self.count}/{self.tickers}x{self.days}/batch={self.batch_size}"
+
+
+def make_features(feature: str, count: int) -> list:
+    """`count` features of one class (or of all classes if "mixed") with growing windows."""
+    from stock_alert.features import MovingAverage
+    from stock_alert.features.atomic_features import Lag, RelativeStrengthIndex, Returns, Volatility
+
+    classes = {
+        "MovingAverage": MovingAverage,
+        "Returns": Returns,
+        "Volatility": Volatility,
+        "Lag": Lag,
+        "RelativeStrengthIndex": RelativeStrengthIndex,
+    }
+    names = FEATURE_CLASSES if feature == "mixed" else [feature]
+    features = []
+    for i in range(count):
+        cls = classes[names[i % len(names)]]
+        size = 5 + 5 * (i // len(names))
+        kwargs = {"n_days": size} if cls in (Returns, Lag) else {"window_days": size}
+        features.append(cls(column="Close", sort_by="Date", group_by="identifier", **kwargs))
+    return features
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_case(case: Case, repeats: int) -> dict:
+    """Runs one case in the current process, returns its measurements."""
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    from stock_alert import DataPipeline, SyntheticFetcher
+    from stock_alert.features import FeatureEngine
+
+    fetcher = SyntheticFetcher(n_identifiers=case.tickers, n_days=case.days)
+    engine = FeatureEngine(make_features(case.feature, case.count))
+
+    with tempfile.TemporaryDirectory() as directory:
+        if case.suite == "features":
+            data = fetcher.scan().collect()
+
+            def run():
+                engine.transform(data.lazy()).collect()
+        else:
+            def run():
+                DataPipeline(fetcher, engine, directory, batch_size=case.batch_size).run()
+
+        rss_before = peak_rss_mb()
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+        peak = peak_rss_mb()
+
+        if case.suite == "features":
+            rows = data.height
+        else:
+            rows = pl.scan_parquet(Path(directory) / "master_table.parquet").select(pl.len()).collect().item()
+
+    return {
+        **asdict(case),
+        "rows": rows,
+        "seconds": min(timings),
+        "seconds_all": timings,
+        "peak_rss_mb": peak,
+        "peak_rss_before_mb": rss_before,
+    }
+
+
+def make_cases(preset: dict) -> list[Case]:
+    cases = []
+    for tickers, days in itertools.product(preset["tickers"], preset["days"]):
+        for feature, count in itertools.product(FEATURE_CLASSES, preset["counts"]):
+            cases.append(Case("features", tickers, days, feature, count))
+        cases.append(Case("features", tickers, days, "mixed", max(preset["counts"])))
+    for tickers, days in itertools.product(preset["pipeline_tickers"], preset["days"]):
+        cases.append(Case("pipeline", tickers, days, "mixed", 10))
+        cases.append(Case("pipeline", tickers, days, "mixed", 10, batch_size=max(tickers // 10, 1)))
+    return cases
+
+
+def metadata() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "polars": pl.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(before_path: str, after_path: str) -> None:
+    """Prints the time and memory ratio of every case present in both files."""
+    before = {Case(**_case_fields(r)).key: r for r in json.loads(Path(before_path).read_text())["results"]}
+    after = {Case(**_case_fields(r)).key: r for r in json.loads(Path(after_path).read_text())["results"]}
+
+    print(f"{'case':<64} {'time':>8} {'memory':>8}")
+    for key in sorted(before.keys() & after.keys()):
+        time_ratio = after[key]["seconds"] / before[key]["seconds"]
+        memory_ratio = after[key]["peak_rss_mb"] / before[key]["peak_rss_mb"]
+        flag = "  <- slower" if time_ratio > 1.2 else ""
+        print(f"{key:<64} {time_ratio:>7.2f}x {memory_ratio:>7.2f}x{flag}")
+
+
+def _case_fields(result: dict) -> dict:
+    return {name: result[name] for name in Case.__dataclass_fields__}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--preset", choices=PRESETS, default="quick")
+    parser.add_argument("--suite", choices=["features", "pipeline"], help="Only run one suite")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="JSON file of the results, benchmarks/results/<commit>.json by default")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    meta = metadata()
+    cases = [case for case in make_cases(PRESETS[args.preset]) if args.suite in (None, case.suite)]
+    results = []
+    print(f"{'case':<64} {'rows':>10} {'time (s)':>9} {'peak MB':>8}")
+    for case in cases:
+        # A fresh process per case, so that peak memory is measured per case
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            result = pool.submit(run_case, case, args.repeats).result()
+        results.append(result)
+        print(f"{case.key:<64} {result['rows']:>10} {result['seconds']:>9.3f} {result['peak_rss_mb']:>8.0f}", flush=True)
+
+    output = Path(args.output or Path(__file__).parent / "results" / f"{meta['commit'] or 'results'}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({"meta": meta, "preset": args.preset, "results": results}, indent=2))
+    print(f"Saved {len(results)} results to {output}")
+
+
+if __name__ == "__main__":
+    main()
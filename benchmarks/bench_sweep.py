@@ -0,0 +1,59 @@
+"""Benchmark of feature sweeps against one rolling feature per window.
+
+A sweep (e.g. `MovingAverage.sweep(windows=range(5, 251))`) derives every
+window from the same running sums of a partition, while separate features
+each run their own rolling kernel per partition.
+
+Usage:
+    python benchmarks/bench_sweep.py --tickers 200 --days 1260 --windows 5 251
+"""
+import argparse
+import os
+import time
+import numpy as np
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+from stock_alert.features import FeatureEngine, MovingAverage  # noqa: E402
+from stock_alert.features.atomic_features import RelativeStrengthIndex  # noqa: E402
+from stock_alert.fetcher import SyntheticFetcher  # noqa: E402
+
+
+def best_of(repeats: int, run) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickers", type=int, default=200)
+    parser.add_argument("--days", type=int, default=1260)
+    parser.add_argument("--windows", type=int, nargs=2, default=[5, 251], metavar=("START", "STOP"))
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    data = SyntheticFetcher(n_identifiers=args.tickers, n_days=args.days).scan().collect().lazy()
+    windows = range(*args.windows)
+    print(f"{args.tickers} tickers x {args.days} days, {len(windows)} windows, best of {args.repeats}")
+    print(f"{'feature':>22} {'per window (s)':>15} {'sweep (s)':>10} {'speedup':>8} {'max rel. diff':>14}")
+
+    for cls in (MovingAverage, RelativeStrengthIndex):
+        separate = FeatureEngine([cls("Close", window, "Date", "identifier") for window in windows])
+        sweep = FeatureEngine(cls.sweep("Close", windows, "Date", "identifier"))
+
+        per_window = best_of(args.repeats, lambda: separate.transform(data).collect())
+        swept = best_of(args.repeats, lambda: sweep.transform(data).collect())
+
+        expected, result = separate.transform(data).collect(), sweep.transform(data).collect()
+        names = [feature.name for feature in separate.features]
+        difference = max(
+            float(np.nanmax(np.abs(result[name] - expected[name]) / expected[name].abs())) for name in names
+        )
+        print(f"{cls.__name__:>22} {per_window:>15.3f} {swept:>10.3f} {per_window / swept:>7.2f}x {difference:>14.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,16 @@
+import argparse
+from datetime import timedelta
+from pathlib import Path
+import polars as pl
 from stock_alert import YFinanceFetcher, DataPipeline
-from stock_alert.features import FeatureEngine, MovingAverage
+from stock_alert.alerts import AlertEngine, AlertStateStore, Comparison, CrossBelow
+from stock_alert.features import FeatureCache, FeatureEngine, MovingAverage
 from stock_alert.features.atomic_features import Returns, Volatility, RelativeStrengthIndex
+from stock_alert.intraday import FileTailSource, StreamingPipeline
+from stock_alert.regimes import RegimeBands
+from stock_alert.schema import MasterSchema
+from stock_alert.sharding import Shard, ShardedPipeline
+from stock_alert.transformer import Difference, ZScore
 #from stock_alert.exporter import PlotExporter, CSVExporter, CompositeExporter
 
 from common.logger import logger
@@ -10,29 +20,71 @@ from common.logger import logger
 #TICKER = "AAPL" #"IE00BFMXXD54" # "^GSPC"
 TICKERS = ["AAPL", "AMZN", "TSLA", "MSFT", "PLTR"]
 PERIOD = "5y"
+MAX_WORKERS = 8
+INCREMENTAL = True
 
 # Feature Engineering
 IDENTIFIER = "identifier"
 SORT_BY = "Date"
 COLUMN = "Close"
+# Directory of a FeatureCache, e.g. "data/features" for repeated runs over the
+# same data; off by default since every daily run brings new rows and misses
+FEATURE_CACHE = None
+FEATURE_CACHE_MAX_BYTES = 2 << 30
+
+# Alerts
+RULES = [
+    Comparison(COLUMN, "<", "sma_21d"),
+    CrossBelow(COLUMN, "sma_200d"),
+    Comparison("rsi_14d", ">", 70, name="rsi_14d overbought"),
+    Comparison("rsi_14d", "<", 30, name="rsi_14d oversold"),
+]
+ALERT_STATE = "data/alerts/state.parquet"
+ALERT_COOLDOWN = timedelta(days=5)
 
 # Exporters
 REPORTS_DIR = "reports"
+RUN_REPORT = f"{REPORTS_DIR}/run_report.json"
+RUN_METRICS = f"{REPORTS_DIR}/run_metrics.prom"
+STREAM_METRICS = f"{REPORTS_DIR}/stream_metrics.json"
+STREAM_PROMETHEUS = f"{REPORTS_DIR}/stream_metrics.prom"
+
+# Streaming
+STREAM_MAX_BATCH_SIZE = 1000
+STREAM_MAX_BATCH_DELAY = 0.1  # seconds
+STREAM_COMPACTION_INTERVAL = 300  # seconds
 
 # General
 MASTER_TABLE_CACHE = "data/transformed"
+BATCH_SIZE = 100
 
 
 #---------------------## End ##---------------------#
 
-if __name__ == "__main__":
-    # Initialize fetcher
-    fetcher = YFinanceFetcher(
-        identifiers=TICKERS,
+def make_fetcher(identifiers: list[str]) -> YFinanceFetcher:
+    return YFinanceFetcher(
+        identifiers=identifiers,
         period=PERIOD,
-        cache_dir="data/ingested"
+        cache_dir="data/ingested",
+        max_workers=MAX_WORKERS,
+        incremental=INCREMENTAL
     )
 
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch the tickers, compute their features and evaluate the alerts.")
+    parser.add_argument("--shards", type=int, help="Run N hash shards of the tickers in a process pool")
+    parser.add_argument("--shard", type=Shard.parse, help="Only run shard i/N, e.g. as one of N independent workers")
+    parser.add_argument("--merge", action="store_true", help="Only merge the shards of --shards N, once all succeeded")
+    parser.add_argument("--stream", metavar="PATH", help="Stream the intraday bars appended to PATH as JSON lines")
+    args = parser.parse_args()
+    if args.merge and not args.shards:
+        parser.error("--merge requires --shards N, the number of shards to merge")
+    if args.shard and args.merge:
+        parser.error("--shard runs a single shard, merge the shards in a separate run with --merge --shards N")
+    if args.shard and args.shards and args.shards != args.shard.count:
+        parser.error(f"--shard {args.shard} does not match --shards {args.shards}")
+
     # Initialize Feature Engine with multiple features
     features_to_copute = [
         MovingAverage(column=COLUMN, window_days=21, sort_by=SORT_BY, group_by=IDENTIFIER),
@@ -42,9 +94,70 @@ if __name__ == "__main__":
         Volatility(column=COLUMN, window_days=100, sort_by=SORT_BY, group_by=IDENTIFIER),
         RelativeStrengthIndex(column=COLUMN, window_days=14, sort_by=SORT_BY, group_by=IDENTIFIER)
     ]
-    feature_engine = FeatureEngine(features=features_to_copute)
+    feature_engine = FeatureEngine(
+        features=features_to_copute,
+        cache=FeatureCache(FEATURE_CACHE, max_bytes=FEATURE_CACHE_MAX_BYTES) if FEATURE_CACHE else None,
+    )
+
+    pipeline_options = dict(
+        master_table_directory=MASTER_TABLE_CACHE,
+        incremental=INCREMENTAL,
+        batch_size=BATCH_SIZE,
+        report_path=RUN_REPORT,
+        prometheus_path=RUN_METRICS,
+        # Overbought/oversold bands of the dashboard, next to the master table
+        regime_bands=RegimeBands(column="rsi_14d", identifier_column=IDENTIFIER, date_column=SORT_BY),
+        # Columns derived from the features in the same query
+        transformers=[
+            Difference(COLUMN, "sma_200d"),
+            Difference(COLUMN, "sma_200d", percent=True),
+            ZScore(COLUMN, mean="sma_21d", std="volatility_21d"),
+        ],
+        # Float32 prices and features, no corporate actions, sorted row groups with statistics
+        schema=MasterSchema(identifier_column=IDENTIFIER, date_column=SORT_BY),
+    )
+
+    # Evaluate the alert rules on the latest rows, only alerting on new conditions
+    alert_engine = AlertEngine(RULES, state_store=AlertStateStore(ALERT_STATE), cooldown=ALERT_COOLDOWN)
+
+    if args.stream:
+        # Continues the master table of the last batch run until interrupted
+        stream = StreamingPipeline(
+            FileTailSource(args.stream, date_column=SORT_BY, from_end=True),
+            features_to_copute,
+            MASTER_TABLE_CACHE,
+            alert_engine=alert_engine,
+            transformers=pipeline_options["transformers"],
+            max_batch_size=STREAM_MAX_BATCH_SIZE,
+            max_batch_delay=STREAM_MAX_BATCH_DELAY,
+            compaction_interval=STREAM_COMPACTION_INTERVAL,
+            metrics_path=STREAM_METRICS,
+            prometheus_path=STREAM_PROMETHEUS,
+            identifier_column=IDENTIFIER,
+            date_column=SORT_BY,
+            schema=pipeline_options["schema"],
+        )
+        stream.run()
+        raise SystemExit(0)
 
     # Initialize and run pipeline
-    pipeline = DataPipeline(fetcher, feature_engine, master_table_directory=MASTER_TABLE_CACHE)
-    pipeline.run()
+    n_shards = args.shard.count if args.shard else args.shards
+    if n_shards:
+        pipeline = ShardedPipeline(make_fetcher, TICKERS, feature_engine, n_shards=n_shards, **pipeline_options)
+        if args.shard:
+            # Independent worker: the shard is merged by a later run with --merge
+            pipeline.run_shard(args.shard.index)
+            logger.info(f"✅ Shard {args.shard} Completed!")
+            raise SystemExit(0)
+        if args.merge:
+            pipeline.merge()
+        else:
+            pipeline.run()
+    else:
+        pipeline = DataPipeline(make_fetcher(TICKERS), feature_engine, **pipeline_options)
+        pipeline.run()
     logger.info("✅ Pipeline Completed!")
+
+    alerts = alert_engine.evaluate(pl.scan_parquet(Path(MASTER_TABLE_CACHE) / "master_table.parquet"))
+    for alert in alerts.iter_rows(named=True):
+        logger.warning(f"🚨 {alert['identifier']} on {alert['Date']}: {alert['rule']}")
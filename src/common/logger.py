@@ -1,8 +1,9 @@
 import os
+import sys
+import atexit
 import logging
-import inspect
-
-from colorlog import ColoredFormatter
+import logging.handlers
+import queue
 
 # Log format string defining the structure of each log message
 _LOG_FORMAT = "%(log_color)s%(asctime)-16s [%(levelname)-8s]%(reset)s %(name)s.%(funcName)s:%(lineno)d - %(message)s"
@@ -19,19 +20,53 @@ _LOG_COLORS = {
 
 log_level = os.getenv("LOG_LEVEL", "INFO").upper()
 
-def _get_caller_module_name() -> str:
+# Levels of the logging methods, checked before a call is forwarded to the logger
+_METHOD_LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+    "exception": logging.ERROR,
+    "critical": logging.CRITICAL,
+}
+
+# Loggers already set up, by module name
+_loggers: dict[str, logging.Logger] = {}
+
+def _create_handler() -> logging.Handler:
+    """Stream handler writing colored records to the standard error stream."""
+    # Imported on first use, to keep importing this module cheap
+    from colorlog import ColoredFormatter
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(ColoredFormatter(
+        _LOG_FORMAT,
+        datefmt=_DATE_FORMAT,
+        log_colors=_LOG_COLORS,
+    ))
+    return handler
+
+# Handler shared by all loggers, created with the first logger; a QueueHandler in queue mode
+_handler: logging.Handler | None = None
+_listener: logging.handlers.QueueListener | None = None
+
+def _get_caller_module_name(depth: int = 2) -> str:
     """Determine the name of the module that called the logger.
 
+    Reads the globals of the calling frame instead of inspecting the whole
+    stack, which makes it cheap enough to run on every log call.
+
+    Args:
+        depth: Number of frames between the caller and this function.
+
     Returns:
         str: The fully qualified module name of the caller. Returns the logger module name as fallback
              if no valid caller is found in the stack.
     """
-    stack = inspect.stack()
-    for frame_info in stack:
-        module = inspect.getmodule(frame_info.frame)
-        if module and module.__name__ != __name__:
-            return module.__name__
-    return __name__
+    try:
+        return sys._getframe(depth).f_globals.get("__name__", __name__)
+    except ValueError:
+        return __name__
 
 def _setup_logger(name: str) -> logging.Logger:
     """Create and configure a logger instance with standard formatting.
@@ -52,25 +87,62 @@ def _setup_logger(name: str) -> logging.Logger:
         - Attaches a StreamHandler and ColoredFormatter if not already present
         - Logs are written to the standard error stream
     """
+    global _handler
     log = logging.getLogger(name)
     if not log.handlers:
+        if _handler is None:
+            _handler = _create_handler()
         log.setLevel(getattr(logging, log_level, logging.INFO))
-        handler = logging.StreamHandler()
-        formatter = ColoredFormatter(
-            _LOG_FORMAT,
-            datefmt=_DATE_FORMAT,
-            log_colors=_LOG_COLORS,
-        )
-        handler.setFormatter(formatter)
-        log.addHandler(handler)
+        log.addHandler(_handler)
     return log
 
+def _noop(*args, **kwargs) -> None:
+    """Stands in for the logging methods of disabled levels."""
+
+def enable_queue_logging() -> None:
+    """Hand log records over to a background thread instead of writing them on the caller's thread.
+
+    Records are put on an unbounded queue by a QueueHandler and written by a
+    QueueListener, so logging never blocks on the output stream. The queue
+    is flushed at exit. Also enabled by setting the LOG_QUEUE environment
+    variable.
+    """
+    global _handler, _listener
+    if _listener is not None:
+        return
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    stream_handler = _create_handler()
+    _listener = logging.handlers.QueueListener(records, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    queue_handler = logging.handlers.QueueHandler(records)
+    for log in _loggers.values():
+        log.removeHandler(_handler)
+        log.addHandler(queue_handler)
+    _handler = queue_handler
+
 class _LoggerProxy():
+    """Forwards attribute access to the logger of the calling module.
+
+    Loggers are set up once per module and cached. Logging methods of
+    disabled levels resolve to a no-op, without formatting a record.
+    """
 
     def __getattr__(self, name: str):
         caller_module = _get_caller_module_name()
-        actual_logger = _setup_logger(caller_module)
+        actual_logger = _loggers.get(caller_module)
+        if actual_logger is None:
+            actual_logger = _loggers[caller_module] = _setup_logger(caller_module)
+
+        level = _METHOD_LEVELS.get(name)
+        if level is not None and not actual_logger.isEnabledFor(level):
+            return _noop
         return getattr(actual_logger, name)
 
 
-logger = _LoggerProxy()
\ No newline at end of file
+logger = _LoggerProxy()
+
+if os.getenv("LOG_QUEUE"):
+    enable_queue_logging()
\ No newline at end of file
@@ -0,0 +1,269 @@
+"""Query layer of the dashboard over the master table.
+
+The master table is scanned lazily, so only the rows of the selected tickers
+and horizon (and only the needed columns) are read from disk. Results are
+computed for all tickers at once with Polars group-bys and cached per
+(tickers, horizon), until the master table is rewritten.
+"""
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+import polars as pl
+from stock_alert.regimes import RegimeBands
+from stock_alert.storage import date_literal
+
+HORIZONS = ["1 Month", "3 Months", "6 Months", "YTD", "1 Year", "5 Years"]
+
+_HORIZON_DAYS = {
+    "1 Month": 30,
+    "3 Months": 90,
+    "6 Months": 180,
+    "1 Year": 365,
+    "5 Years": 365 * 5,
+}
+
+
+@dataclass(frozen=True)
+class PeerView:
+    """Peer comparison of a set of tickers over a horizon.
+
+    Attributes:
+        normalized: identifier, Date, Close and "Normalized Price", the close
+            divided by the first close of the ticker in the horizon.
+        peer_average: Date, the average normalized price of the tickers
+            ("Peer Average") and its 21-day moving average ("Peer Average MA").
+        performance: identifier and its performance over the horizon in
+            percent, best first.
+    """
+    normalized: pl.DataFrame
+    peer_average: pl.DataFrame
+    performance: pl.DataFrame
+
+
+class DashboardDataService:
+    """Cached queries of the dashboard over the master table.
+
+    Args:
+        path: Path of master_table.parquet.
+        cache_size: Number of (tickers, horizon) results kept, least recently used first out.
+        identifier_column: Column identifying each asset.
+        date_column: Column ordering the rows of an asset.
+        regime_bands: Regime bands, read from the table the pipeline saves next to the master table.
+    """
+    def __init__(self,
+                 path: str,
+                 cache_size: int = 64,
+                 identifier_column: str = "identifier",
+                 date_column: str = "Date",
+                 regime_bands: RegimeBands | None = None) -> None:
+        self.path = Path(path)
+        self.identifier_column = identifier_column
+        self.date_column = date_column
+        self.regime_bands = regime_bands or RegimeBands(identifier_column=identifier_column, date_column=date_column)
+        # Cached per instance, keyed by the version of the master table as well
+        self._cached_identifiers = lru_cache(maxsize=1)(self._identifiers)
+        self._cached_last_date = lru_cache(maxsize=1)(self._last_date)
+        self._cached_history = lru_cache(maxsize=cache_size)(self._history)
+        self._cached_peer_view = lru_cache(maxsize=cache_size)(self._peer_view)
+        self._cached_regimes = lru_cache(maxsize=cache_size)(self._regimes)
+
+    def version(self) -> int:
+        """Modification time of the master table, changes whenever it is rewritten."""
+        return self.path.stat().st_mtime_ns
+
+    def scan(self) -> pl.LazyFrame:
+        return pl.scan_parquet(self.path)
+
+    def identifiers(self) -> list[str]:
+        """Sorted identifiers of the master table."""
+        return self._cached_identifiers(self.version())
+
+    def last_date(self) -> datetime:
+        """Latest date of the master table, at midnight if the dates are stored as `pl.Date`."""
+        return self._cached_last_date(self.version())
+
+    def start_date(self, horizon: str) -> datetime:
+        """First date of a horizon ending on the latest date, see `HORIZONS`."""
+        end_date = self.last_date()
+        if horizon == "YTD":
+            return datetime(end_date.year, 1, 1, tzinfo=end_date.tzinfo)
+        if horizon not in _HORIZON_DAYS:
+            raise ValueError(f"Unknown horizon '{horizon}', expected one of {HORIZONS}")
+        return end_date - timedelta(days=_HORIZON_DAYS[horizon])
+
+    def history(self, tickers: list[str], horizon: str, columns: tuple[str, ...] = ("Close",)) -> pl.DataFrame:
+        """Rows of the tickers within the horizon, sorted by identifier and date.
+
+        Args:
+            tickers: Identifiers to read.
+            horizon: One of `HORIZONS`.
+            columns: Columns to read besides the identifier and date.
+        """
+        return self._cached_history(self._key(tickers), horizon, tuple(columns), self.version())
+
+    def peer_view(self, tickers: list[str], horizon: str) -> PeerView:
+        """Normalized prices, peer average and performance of the tickers within the horizon."""
+        return self._cached_peer_view(self._key(tickers), horizon, self.version())
+
+    def regimes(self, tickers: list[str], horizon: str) -> pl.DataFrame:
+        """Regime bands of the tickers overlapping the horizon, clipped to it.
+
+        Read from the derived table of the pipeline, or computed from the master
+        table if the pipeline did not save it.
+        """
+        return self._cached_regimes(self._key(tickers), horizon, self.version())
+
+    def cache_info(self) -> dict[str, object]:
+        """Hits and misses of the per (tickers, horizon) caches."""
+        return {
+            "history": self._cached_history.cache_info(),
+            "peer_view": self._cached_peer_view.cache_info(),
+            "regimes": self._cached_regimes.cache_info(),
+        }
+
+    @staticmethod
+    def _key(tickers: list[str]) -> tuple[str, ...]:
+        # The order of the selection does not change the result
+        return tuple(sorted(set(tickers)))
+
+    def _identifiers(self, version: int) -> list[str]:
+        column = pl.col(self.identifier_column)
+        return self.scan().select(column.unique().sort()).collect().to_series().to_list()
+
+    def _last_date(self, version: int) -> datetime:
+        last = self.scan().select(pl.col(self.date_column).max()).collect().item()
+        if not isinstance(last, datetime):
+            # Daily bars stored as pl.Date
+            last = datetime(last.year, last.month, last.day)
+        return last
+
+    def _filtered(self, tickers: tuple[str, ...], horizon: str, columns: tuple[str, ...]) -> pl.LazyFrame:
+        """Scan of the tickers within the horizon, both predicates pushed down to the reader."""
+        identifier, date = pl.col(self.identifier_column), pl.col(self.date_column)
+        scan = self.scan()
+        dtype = scan.collect_schema()[self.date_column]
+        return (
+            scan.select(self.identifier_column, self.date_column, *columns)
+            .filter(
+                identifier.is_in(list(tickers)),
+                date >= date_literal(self.start_date(horizon), dtype),
+                date <= date_literal(self.last_date(), dtype),
+            )
+            .sort(self.identifier_column, self.date_column)
+        )
+
+    def _regimes(self, tickers: tuple[str, ...], horizon: str, version: int) -> pl.DataFrame:
+        start_date = self.start_date(horizon)
+        table = self.path.parent / self.regime_bands.table_name
+        if table.exists():
+            bands = pl.scan_parquet(table).filter(pl.col(self.identifier_column).is_in(list(tickers)))
+        else:
+            bands = self.regime_bands.compute(self._filtered(tickers, horizon, (self.regime_bands.column,)))
+
+        dtype = bands.collect_schema()["start"]
+        start = date_literal(start_date, dtype)
+        return (
+            bands.filter(pl.col("end") >= start)
+            .with_columns(pl.max_horizontal("start", start).alias("start"))
+            .collect()
+        )
+
+    def _history(self, tickers: tuple[str, ...], horizon: str, columns: tuple[str, ...], version: int) -> pl.DataFrame:
+        return self._filtered(tickers, horizon, columns).collect()
+
+    def _peer_view(self, tickers: tuple[str, ...], horizon: str, version: int) -> PeerView:
+        identifier, date = self.identifier_column, self.date_column
+        normalized = self._filtered(tickers, horizon, ("Close",)).with_columns(
+            (pl.col("Close") / pl.col("Close").first().over(identifier)).alias("Normalized Price")
+        )
+        peer_average = (
+            normalized.group_by(date)
+            .agg(pl.col("Normalized Price").mean().alias("Peer Average"))
+            .sort(date)
+            .with_columns(pl.col("Peer Average").rolling_mean(window_size=21, min_samples=1).alias("Peer Average MA"))
+        )
+        performance = (
+            normalized.group_by(identifier)
+            .agg(((pl.col("Normalized Price").last() - 1) * 100).alias("Performance"))
+            .sort("Performance", descending=True)
+        )
+        # One scan of the master table for the three results
+        return PeerView(*pl.collect_all([normalized, peer_average, performance]))
+
+
+def band_polygons(bands: pl.DataFrame,
+                  low: float,
+                  high: float,
+                  start: Any = None,
+                  end: Any = None) -> tuple[list, list]:
+    """Outline of every band as one polygon trace, bands separated by gaps.
+
+    Args:
+        bands: Bands with start and end columns.
+        low: Bottom of the bands on the y axis.
+        high: Top of the bands on the y axis.
+        start: First visible date, e.g. of a zoomed chart, in the dtype of the band bounds.
+        end: Last visible date, likewise; the bands are clipped to both.
+
+    Returns:
+        tuple: x and y values for a single Scatter trace with fill="toself".
+    """
+    dtype = bands.schema["start"]
+    if start is not None:
+        start = pl.lit(start, dtype=dtype)
+        bands = bands.filter(pl.col("end") >= start).with_columns(pl.max_horizontal("start", start).alias("start"))
+    if end is not None:
+        end = pl.lit(end, dtype=dtype)
+        bands = bands.filter(pl.col("start") <= end).with_columns(pl.min_horizontal("end", end).alias("end"))
+
+    x, y = [], []
+    for start, end in bands.select("start", "end").iter_rows():
+        x += [start, start, end, end, None]
+        y += [low, high, high, low, None]
+    return x, y
+
+
+def downsample(data: pl.DataFrame,
+               n_points: int,
+               y_columns: Sequence[str],
+               group_by: Sequence[str] = ()) -> pl.DataFrame:
+    """Reduces every group to about `n_points` rows by min/max bucketing.
+
+    The rows of a group are split into equally sized buckets, of which the
+    first, last, minimum and maximum rows (of every y column) are kept, so
+    the extremes and the shape of the lines are preserved. Groups with at
+    most `n_points` rows are left untouched.
+
+    Args:
+        data: Rows sorted by group and x.
+        n_points: Target number of points per group, i.e. per trace.
+        y_columns: Plotted columns, rows sharing the x axis are kept together.
+        group_by: Columns identifying a trace, e.g. the identifier.
+
+    Returns:
+        pl.DataFrame: Subset of the rows of `data`, in the same order.
+    """
+    group_by = list(group_by)
+    index = pl.col("__index")
+
+    def per_group(expression: pl.Expr) -> pl.Expr:
+        return expression.over(group_by) if group_by else expression
+
+    # Up to 2 rows per y column, plus the first and last row of every bucket
+    n_buckets = max(n_points // (2 * len(y_columns) + 2), 1)
+    bucket_over = [*group_by, "__bucket"]
+
+    keep = (index == index.first().over(bucket_over)) | (index == index.last().over(bucket_over))
+    for column in y_columns:
+        keep = keep | (index == index.get(pl.col(column).arg_min()).over(bucket_over)).fill_null(False)
+        keep = keep | (index == index.get(pl.col(column).arg_max()).over(bucket_over)).fill_null(False)
+
+    return (
+        data.with_columns(per_group(pl.int_range(pl.len())).alias("__index"))
+        .with_columns((index * n_buckets // per_group(pl.len())).alias("__bucket"))
+        .filter((per_group(pl.len()) <= n_points) | keep)
+        .drop("__index", "__bucket")
+    )
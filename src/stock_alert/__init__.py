@@ -1,14 +1,59 @@
-from .fetcher import BaseFetcher, YFinanceFetcher
-from .features import Feature, FeatureEngine, MovingAverage
-from .pipeline import DataPipeline
+"""Stock alert package.
+
+The public classes are imported lazily on first access (PEP 562), so that
+`import stock_alert` does not pull in yfinance, pandas or polars until they
+are needed.
+"""
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .fetcher import BaseFetcher, ReplayFetcher, SyntheticFetcher, YFinanceFetcher
+    from .features import Feature, FeatureEngine, MovingAverage
+    from .pipeline import DataPipeline
+    from .intraday import StreamingPipeline
+    from .sharding import ShardedPipeline
 
 __version__ = "0.1.0"
 
+# Public name -> submodule defining it
+_EXPORTS = {
+    "BaseFetcher": "fetcher",
+    "YFinanceFetcher": "fetcher",
+    "ReplayFetcher": "fetcher",
+    "SyntheticFetcher": "fetcher",
+    "Feature": "features",
+    "FeatureEngine": "features",
+    "MovingAverage": "features",
+    "DataPipeline": "pipeline",
+    "ShardedPipeline": "sharding",
+    "StreamingPipeline": "intraday",
+}
+
+# Literal, so linters see the names imported for type checkers as exported
 __all__ = [
     "BaseFetcher",
     "YFinanceFetcher",
+    "ReplayFetcher",
+    "SyntheticFetcher",
     "Feature",
     "FeatureEngine",
     "MovingAverage",
     "DataPipeline",
-]
\ No newline at end of file
+    "ShardedPipeline",
+    "StreamingPipeline",
+]
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    # Cache it, later accesses do not go through __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted([*globals(), *_EXPORTS])
@@ -0,0 +1,43 @@
+"""Alert rules on the master table, imported lazily on first access (PEP 562)."""
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .rule_base import AlertEngine, Rule, previous
+    from .rules import Comparison, CrossAbove, CrossBelow
+    from .state import AlertStateStore
+
+# Public name -> submodule defining it
+_EXPORTS = {
+    "AlertEngine": "rule_base",
+    "Rule": "rule_base",
+    "previous": "rule_base",
+    "AlertStateStore": "state",
+    "Comparison": "rules",
+    "CrossAbove": "rules",
+    "CrossBelow": "rules",
+}
+
+# Literal, so linters see the names imported for type checkers as exported
+__all__ = [
+    "AlertEngine",
+    "Rule",
+    "previous",
+    "AlertStateStore",
+    "Comparison",
+    "CrossAbove",
+    "CrossBelow",
+]
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted([*globals(), *_EXPORTS])
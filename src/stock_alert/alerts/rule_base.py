@@ -0,0 +1,196 @@
+from abc import ABC, abstractmethod
+from collections.abc import Sequence
+from typing import Any
+import polars as pl
+from common.logger import logger
+from .state import AlertStateStore
+
+# Prefix of the columns holding the values of the row before the latest one
+_PREVIOUS = "__previous_"
+
+
+def previous(column: str) -> pl.Expr:
+    """Value of `column` in the row before the latest one, for rules with a look-back."""
+    return pl.col(f"{_PREVIOUS}{column}")
+
+
+class Rule(ABC):
+    """Abstract base class for alert rules
+
+    A rule is a condition on the latest row of an identifier, written as a
+    boolean Polars expression over a frame holding one row per identifier.
+    Rules with a `lookback` may also read the preceding row through
+    `previous`. Null conditions (e.g. a missing SMA) do not trigger.
+    """
+
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        """Get the name of the rule, unique within an AlertEngine.
+
+        Returns:
+            str: Name of the rule.
+        """
+        pass
+
+    @property
+    def lookback(self) -> int:
+        """Number of rows before the latest one the condition reads."""
+        return 0
+
+    @abstractmethod
+    def condition(self) -> pl.Expr:
+        """Returns the boolean Polars expression of the rule."""
+        pass
+
+
+class AlertEngine:
+    """Evaluates rules on the latest rows of all identifiers in one pass.
+
+    Only the last rows of every identifier are read from the data, and all
+    rules are evaluated as a single `select` on them, so the cost grows with
+    the number of identifiers and rules rather than with the history.
+
+    Without a `state_store` an alert is triggered on every run its condition
+    holds. With one, alerts are edge-triggered: an alert fires only when its
+    condition starts to hold, i.e. it did not hold on the last row evaluated
+    by the previous run, and at least `cooldown` after it last fired. Rows
+    that are not newer than the saved state are ignored, so rerunning on the
+    same data does not fire again. On the first run every condition that
+    holds fires.
+
+    Args:
+        rules: Non-empty sequence of rules with unique names.
+        identifier_column: Column identifying each asset.
+        date_column: Column ordering the rows of an asset.
+        state_store: Store of the last state of every alert, for edge triggering.
+        cooldown: Minimum difference of the date column between two firings of
+            an alert, e.g. a timedelta for datetime dates. No cooldown if None.
+    """
+    def __init__(self,
+                 rules: Sequence[Rule],
+                 identifier_column: str = "identifier",
+                 date_column: str = "Date",
+                 state_store: AlertStateStore | None = None,
+                 cooldown: Any = None) -> None:
+        if not rules:
+            raise ValueError("AlertEngine requires at least one rule")
+        names = [rule.name for rule in rules]
+        duplicated = sorted({name for name in names if names.count(name) > 1})
+        if duplicated:
+            raise ValueError(f"Duplicated rule names: {duplicated}")
+        self.rules = rules
+        self.identifier_column = identifier_column
+        self.date_column = date_column
+        self.state_store = state_store
+        self.cooldown = cooldown
+
+    def latest(self, data: pl.LazyFrame) -> pl.LazyFrame:
+        """One row per identifier: its latest row, plus the values of the row before it.
+
+        The dates of every identifier are read first, to find the earliest
+        date any identifier needs; only the rows from that date on are then
+        read in full and ranked, instead of the whole history.
+
+        Args:
+            data: Master table, in any row order.
+        """
+        identifier, date = self.identifier_column, self.date_column
+        n_rows = 1 + max(rule.lookback for rule in self.rules)
+
+        start = (
+            data.group_by(identifier)
+            .agg(pl.col(date).top_k(n_rows).min())
+            .select(pl.col(date).min())
+            .collect()
+            .item()
+        )
+        if start is not None:
+            # Typed literal, so the bound is checked against row group statistics
+            data = data.filter(pl.col(date) >= pl.lit(start, dtype=data.collect_schema()[date]))
+        recent = (
+            data.filter(pl.col(date).rank("ordinal", descending=True).over(identifier) <= n_rows)
+            .sort(identifier, date)
+        )
+        aggregations = [pl.all().last()]
+        if n_rows > 1:
+            aggregations.append(pl.all().exclude(date).shift(1).last().name.prefix(_PREVIOUS))
+        return recent.group_by(identifier, maintain_order=True).agg(aggregations)
+
+    def evaluate(self, data: pl.LazyFrame) -> pl.DataFrame:
+        """Evaluates every rule on the latest row of every identifier.
+
+        Args:
+            data: Master table, in any row order.
+
+        Returns:
+            pl.DataFrame: One row (identifier, date, rule) per triggered alert.
+        """
+        identifier, date = self.identifier_column, self.date_column
+
+        # Rows where each rule holds, instead of the whole identifiers x rules matrix
+        latest = self.latest(data).collect()
+        rows = latest.select(
+            rule.condition().fill_null(False).arg_true().implode().alias(rule.name) for rule in self.rules
+        )
+        triggered = rows.unpivot(variable_name="rule", value_name="__row").explode("__row", empty_as_null=False)
+        evaluated = latest.select(identifier, date)
+        active = evaluated.select(pl.all().gather(triggered["__row"])).with_columns(triggered["rule"])
+
+        if self.state_store is None:
+            alerts = active
+        else:
+            alerts = self._edges(evaluated, active)
+
+        logger.info(
+            f"Evaluated {len(self.rules)} rules on {evaluated.height} identifiers: "
+            f"{alerts.height} alerts triggered"
+        )
+        return alerts
+
+    def _edges(self, latest: pl.DataFrame, active: pl.DataFrame) -> pl.DataFrame:
+        """Alerts whose condition started to hold, updating the saved state.
+
+        Only the active alerts and the alerts active in the saved state are
+        compared: an alert that is neither holds no state to update.
+
+        Args:
+            latest: identifier and date of the evaluated rows.
+            active: identifier, date and rule of the conditions that hold.
+        """
+        identifier, date = self.identifier_column, self.date_column
+        keys = [identifier, "rule"]
+
+        active = active.with_columns(pl.lit(True).alias("active"))
+        state = self.state_store.load()
+        if state is None:
+            state = active.select(*keys, "active", date, pl.col(date).alias("last_fired")).clear()
+
+        # Alerts active in the saved state but not anymore, on the evaluated rows
+        ended = (
+            state.filter("active").select(keys)
+            .join(latest, on=identifier)
+            .join(active, on=keys, how="anti")
+            .select(identifier, date, "rule", pl.lit(False).alias("active"))
+        )
+        current = pl.concat([active, ended])
+
+        joined = current.join(state, on=keys, how="left", suffix="__state")
+        is_new = pl.col(f"{date}__state").is_null() | (pl.col(date) > pl.col(f"{date}__state"))
+        rising = pl.col("active") & ~pl.col("active__state").fill_null(False)
+        cooled_down = pl.lit(True)
+        if self.cooldown is not None:
+            cooled_down = pl.col("last_fired").is_null() | (pl.col(date) - pl.col("last_fired") >= self.cooldown)
+        joined = joined.with_columns((is_new & rising & cooled_down).alias("__fires"))
+
+        updated = joined.filter(is_new).select(
+            *keys,
+            "active",
+            date,
+            pl.when("__fires").then(pl.col(date)).otherwise(pl.col("last_fired")).alias("last_fired"),
+        )
+        # Alerts that were not evaluated (or had no new row) keep their state
+        kept = state.join(updated, on=keys, how="anti")
+        self.state_store.save(pl.concat([kept, updated]))
+
+        return joined.filter("__fires").select(identifier, date, "rule")
@@ -0,0 +1,81 @@
+"""Module with rules comparing columns of the master table, e.g. `Close < sma_21d`."""
+
+import operator
+import polars as pl
+from .rule_base import Rule, previous
+
+_OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
+def _operand(value: str | float, before: bool = False) -> pl.Expr:
+    """A column (in the latest row, or the row before it) or a constant."""
+    if isinstance(value, str):
+        return previous(value) if before else pl.col(value)
+    return pl.lit(value)
+
+class Comparison(Rule):
+    """Triggers while a column compares to another column or a threshold.
+    E.g. Comparison("Close", "<", "sma_21d") or Comparison("rsi_14d", ">", 70).
+    """
+    def __init__(self, left: str, op: str, right: str | float, name: str | None = None) -> None:
+        if op not in _OPERATORS:
+            raise ValueError(f"Unknown operator '{op}', expected one of {list(_OPERATORS)}")
+        self.left = left
+        self.op = op
+        self.right = right
+        self._name = name
+
+    @property
+    def name(self) -> str:
+        return self._name or f"{self.left} {self.op} {self.right}"
+
+    def condition(self) -> pl.Expr:
+        return _OPERATORS[self.op](_operand(self.left), _operand(self.right))
+
+class CrossAbove(Rule):
+    """Triggers on the row a column moves from below or at another column (or threshold) to above it.
+    E.g. CrossAbove("sma_21d", "sma_200d") for a golden cross.
+    """
+    def __init__(self, left: str, right: str | float, name: str | None = None) -> None:
+        self.left = left
+        self.right = right
+        self._name = name
+
+    @property
+    def name(self) -> str:
+        return self._name or f"{self.left} crosses above {self.right}"
+
+    @property
+    def lookback(self) -> int:
+        return 1
+
+    def condition(self) -> pl.Expr:
+        was_below = _operand(self.left, before=True) <= _operand(self.right, before=True)
+        return was_below & (_operand(self.left) > _operand(self.right))
+
+class CrossBelow(Rule):
+    """Triggers on the row a column moves from above or at another column (or threshold) to below it.
+    E.g. CrossBelow("Close", "sma_21d").
+    """
+    def __init__(self, left: str, right: str | float, name: str | None = None) -> None:
+        self.left = left
+        self.right = right
+        self._name = name
+
+    @property
+    def name(self) -> str:
+        return self._name or f"{self.left} crosses below {self.right}"
+
+    @property
+    def lookback(self) -> int:
+        return 1
+
+    def condition(self) -> pl.Expr:
+        was_above = _operand(self.left, before=True) >= _operand(self.right, before=True)
+        return was_above & (_operand(self.left) < _operand(self.right))
@@ -0,0 +1,33 @@
+"""Persistent state of edge-triggered alerts."""
+import os
+from pathlib import Path
+import polars as pl
+from common.logger import logger
+
+
+class AlertStateStore:
+    """Last state of every (identifier, rule) pair, kept in one parquet file.
+
+    A state row holds whether the condition held on the last evaluated row
+    (`active`), the date of that row and the date the alert last fired, which
+    is all an edge-triggered run needs besides the new rows.
+
+    Args:
+        path: Parquet file holding the state.
+    """
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+
+    def load(self) -> pl.DataFrame | None:
+        """Returns the saved state, None before the first run."""
+        if not self.path.exists():
+            return None
+        return pl.read_parquet(self.path)
+
+    def save(self, state: pl.DataFrame) -> None:
+        """Replaces the saved state atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        state.write_parquet(tmp_path)
+        os.replace(tmp_path, self.path)
+        logger.debug(f"Saved the state of {state.height} alerts to {self.path}")
@@ -1,8 +1,37 @@
-from .feature_base import Feature, FeatureEngine
-from .moving_average import MovingAverage
+"""Features of the master table, imported lazily on first access (PEP 562)."""
+import importlib
+from typing import TYPE_CHECKING
 
+if TYPE_CHECKING:
+    from .cache import FeatureCache
+    from .feature_base import Feature, FeatureEngine
+    from .moving_average import MovingAverage
+
+# Public name -> submodule defining it
+_EXPORTS = {
+    "Feature": "feature_base",
+    "FeatureCache": "cache",
+    "FeatureEngine": "feature_base",
+    "MovingAverage": "moving_average",
+}
+
+# Literal, so linters see the names imported for type checkers as exported
 __all__ = [
     "Feature",
+    "FeatureCache",
     "FeatureEngine",
     "MovingAverage",
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted([*globals(), *_EXPORTS])
@@ -1,99 +1,221 @@
 """Module that create features that capture Momentum, Risk, and Memory."""
 
+from collections.abc import Iterable, Mapping
 import polars as pl
 from .feature_base import Feature
+from .streaming import DistanceState, FeatureState, RollingStdState, RSIState, ShiftState
 
 class Returns(Feature):
     """Calculates percentage change over N days.
     Reveals Momentum: How fast is the asset grwoing?
     """
     def __init__(self, 
-                column: str, 
+                column: str | Feature, 
                 n_days: int,
                 sort_by: str,
                 group_by: str | None
     ) -> None:
-        self.column = column
+        self.column = self._read(column)
         self.n_days = n_days
         self.sort_by = sort_by
         self.group_by = group_by
 
     @property
     def name(self) -> str:
-        return f"returns_{self.n_days}d"
+        return self._named(f"returns_{self.n_days}d")
     
-    def compute(self) -> pl.Expr:
+    @property
+    def lookback(self) -> int:
+        return self.n_days
+
+    def shared(self) -> dict[str, pl.Expr]:
+        return {f"__shift_{self.n_days}_{self.column}": pl.col(self.column).shift(self.n_days)}
+
+    def expression(self, shared: Mapping[str, pl.Expr]) -> pl.Expr:
         # (Current / Previous) - 1
-        expr = (pl.col(self.column) / pl.col(self.column).shift(self.n_days)) - 1
-        return expr.over(
-            partition_by=self.group_by,
-            order_by=self.sort_by
-        ).alias(self.name)
+        return (pl.col(self.column) / shared[f"__shift_{self.n_days}_{self.column}"]) - 1
+
+    def state(self) -> FeatureState:
+        return ShiftState(self.column, self.n_days, returns=True)
     
 class Volatility(Feature):
     """Calculates Rolling Standard Deviation.
     Reveals Risk: How stable or panicky is the market?
+
+    The window is a number of rows, or a duration of `sort_by` such as "21d".
     """
-    def __init__(self, column: str, window_days: int, sort_by: str, group_by: str | None = None):
-        self.column = column
+    def __init__(self,
+                 column: str | Feature,
+                 window_days: int | str,
+                 sort_by: str,
+                 group_by: str | None = None,
+                 min_periods: int | None = None):
+        self.column = self._read(column)
         self.window_days = window_days
         self.sort_by = sort_by
         self.group_by = group_by
+        self.min_periods = min_periods
+
+    @classmethod
+    def sweep(cls,
+              column: str | Feature,
+              windows: Iterable[int],
+              sort_by: str,
+              group_by: str | None = None,
+              min_periods: int | None = None) -> list["Volatility"]:
+        """One rolling volatility per window.
+
+        Unlike the means of `MovingAverage.sweep`, the windows do not share
+        running sums: a variance taken from running sums of squares is not
+        accurate once prices move far from where they started.
+        """
+        return [cls(column, window, sort_by, group_by, min_periods) for window in windows]
 
     @property
     def name(self) -> str:
-        return f"volatility_{self.window_days}d"
+        return self._window_name("volatility", self.window_days, self.min_periods)
+
+    @property
+    def lookback(self) -> int | None:
+        return self._window_lookback(self.window_days)
 
-    def compute(self) -> pl.Expr:
-        expr = pl.col(self.column).rolling_std(window_size=self.window_days)
-        return expr.over(partition_by=self.group_by, order_by=self.sort_by).alias(self.name)
+    def expression(self, shared: Mapping[str, pl.Expr]) -> pl.Expr:
+        return self._rolling(pl.col(self.column), "std", self.window_days, self.min_periods)
+
+    def state(self) -> FeatureState | None:
+        if not isinstance(self.window_days, int):
+            return None
+        return RollingStdState(self.column, self.window_days, self.min_periods)
     
 class Lag(Feature):
     """Shifts the data back by N days.
     Reveals Memory: What was the value 'then' compared to 'now'?
     """
-    def __init__(self, column: str, n_days: int, sort_by: str, group_by: str | None = None):
-        self.column = column
+    def __init__(self, column: str | Feature, n_days: int, sort_by: str, group_by: str | None = None):
+        self.column = self._read(column)
         self.n_days = n_days
         self.sort_by = sort_by
         self.group_by = group_by
 
     @property
     def name(self) -> str:
-        return f"lag_{self.n_days}d"
+        return self._named(f"lag_{self.n_days}d")
+
+    @property
+    def lookback(self) -> int:
+        return self.n_days
+
+    def shared(self) -> dict[str, pl.Expr]:
+        return {f"__shift_{self.n_days}_{self.column}": pl.col(self.column).shift(self.n_days)}
+
+    def expression(self, shared: Mapping[str, pl.Expr]) -> pl.Expr:
+        return shared[f"__shift_{self.n_days}_{self.column}"]
 
-    def compute(self) -> pl.Expr:
-        expr = pl.col(self.column).shift(self.n_days)
-        return expr.over(partition_by=self.group_by, order_by=self.sort_by).alias(self.name)
+    def state(self) -> FeatureState:
+        return ShiftState(self.column, self.n_days)
     
 class RelativeStrengthIndex(Feature):
     """RSI (Relative Strength Index) - 14 day standard.
     Reveals Exhaustion: Is the world 'Overbought' or 'Oversold'?
+
+    The window is a number of rows, or a duration of `sort_by` such as "14d".
+    With `cumulative` the average gains and losses are derived from running
+    sums, shared by all windows of a `sweep`.
     """
-    def __init__(self, column: str, window_days: int = 14, sort_by: str = "date", group_by: str | None = None):
-        self.column = column
+    def __init__(self,
+                 column: str | Feature,
+                 window_days: int | str = 14,
+                 sort_by: str = "date",
+                 group_by: str | None = None,
+                 min_periods: int | None = None,
+                 cumulative: bool = False):
+        if cumulative and not isinstance(window_days, int):
+            raise ValueError("Cumulative RSI requires a window in rows")
+        self.column = self._read(column)
         self.window_days = window_days
         self.sort_by = sort_by
         self.group_by = group_by
+        self.min_periods = min_periods
+        self.cumulative = cumulative
+        self.partitioned = not cumulative
+
+    @classmethod
+    def sweep(cls,
+              column: str | Feature,
+              windows: Iterable[int],
+              sort_by: str,
+              group_by: str | None = None,
+              min_periods: int | None = None) -> list["RelativeStrengthIndex"]:
+        """One RSI per window, all derived from single running sums of the gains and losses per partition."""
+        return [cls(column, window, sort_by, group_by, min_periods, cumulative=True) for window in windows]
 
     @property
     def name(self) -> str:
-        return f"rsi_{self.window_days}d"
+        return self._window_name("rsi", self.window_days, self.min_periods)
+
+    @property
+    def lookback(self) -> int | None:
+        lookback = self._window_lookback(self.window_days)
+        # One extra row for the first price change of the window
+        return None if lookback is None else lookback + 1
 
-    def compute(self) -> pl.Expr:
+    def _gains_losses(self) -> tuple[pl.Expr, pl.Expr]:
         # Calculate price changes
         diff = pl.col(self.column).diff()
-        
+
         # Get gains (positive changes) and losses (negative changes)
-        gain = pl.when(diff > 0).then(diff).otherwise(0)
-        loss = pl.when(diff < 0).then(-diff).otherwise(0)
-        
+        return pl.when(diff > 0).then(diff).otherwise(0), pl.when(diff < 0).then(-diff).otherwise(0)
+
+    def shared(self) -> dict[str, pl.Expr]:
+        gain, loss = self._gains_losses()
+        if self.cumulative:
+            return {
+                **self._running_sums(gain, f"_gain_{self.column}"),
+                **self._running_sums(loss, f"_loss_{self.column}"),
+            }
+        return {f"__gain_{self.column}": gain, f"__loss_{self.column}": loss}
+
+    def expression(self, shared: Mapping[str, pl.Expr]) -> pl.Expr:
+        if self.cumulative:
+            args = (self.window_days, self.min_periods)
+            avg_gain = self._window_mean(shared, f"_gain_{self.column}", *args)
+            avg_loss = self._window_mean(shared, f"_loss_{self.column}", *args)
+            return 100 - (100 / (1 + avg_gain / avg_loss))
+
         # Average gains and losses
-        avg_gain = gain.rolling_mean(window_size=self.window_days)
-        avg_loss = loss.rolling_mean(window_size=self.window_days)
-        
+        avg_gain = self._rolling(shared[f"__gain_{self.column}"], "mean", self.window_days, self.min_periods)
+        avg_loss = self._rolling(shared[f"__loss_{self.column}"], "mean", self.window_days, self.min_periods)
+
         # RS and RSI formula
         rs = avg_gain / avg_loss
-        rsi = 100 - (100 / (1 + rs))
-        
-        return rsi.over(partition_by=self.group_by, order_by=self.sort_by).alias(self.name)
\ No newline at end of file
+        return 100 - (100 / (1 + rs))
+
+    def state(self) -> FeatureState | None:
+        if not isinstance(self.window_days, int):
+            return None
+        return RSIState(self.column, self.window_days, self.min_periods)
+
+class Distance(Feature):
+    """Relative distance of a column from a reference, e.g. from the SMA200.
+    Reveals Trend: How stretched is the price away from its average?
+    """
+    def __init__(self, column: str | Feature, reference: str | Feature, sort_by: str, group_by: str | None = None):
+        self.column = self._read(column)
+        self.reference = self._read(reference)
+        self.sort_by = sort_by
+        self.group_by = group_by
+
+    @property
+    def name(self) -> str:
+        return f"distance_{self.column}_{self.reference}"
+
+    @property
+    def lookback(self) -> int:
+        return 0
+
+    def expression(self, shared: Mapping[str, pl.Expr]) -> pl.Expr:
+        # (Current / Reference) - 1
+        return (pl.col(self.column) / pl.col(self.reference)) - 1
+
+    def state(self) -> FeatureState:
+        return DistanceState(self.column, self.reference)
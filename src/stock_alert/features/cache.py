@@ -0,0 +1,95 @@
+"""On-disk cache of computed feature columns."""
+import hashlib
+import os
+from collections.abc import Sequence
+from pathlib import Path
+from typing import TYPE_CHECKING
+import polars as pl
+from common.logger import logger
+
+if TYPE_CHECKING:
+    from .feature_base import Feature
+
+
+class FeatureCache:
+    """Stores feature columns keyed by the feature and the data it was computed on.
+
+    A feature is fingerprinted by its class, name and Polars expression, which
+    captures its parameters (column, window, group_by, sort_by), and by the
+    fingerprints of its inputs. The data is fingerprinted by its schema and
+    the hash of every row, in order. A column is reused only if both match:
+    changing one feature only recomputes that feature (and the features
+    reading it), while any change of the data recomputes all of them.
+
+    Columns are stored one parquet file each. Once the cache outgrows
+    `max_bytes`, the least recently used files are evicted.
+
+    Args:
+        directory: Directory holding the cached columns.
+        max_bytes: Size the cache is trimmed down to after every write.
+    """
+    def __init__(self, directory: str, max_bytes: int = 1 << 30) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def data_key(data: pl.DataFrame) -> str:
+        """Fingerprint of the content and row order of `data`."""
+        digest = hashlib.sha256(str(data.schema).encode())
+        digest.update(data.hash_rows(seed=0).to_numpy().tobytes())
+        return digest.hexdigest()[:24]
+
+    @staticmethod
+    def feature_key(feature: "Feature", segment_by: Sequence[str] = ()) -> str:
+        """Fingerprint of the computation of `feature`."""
+        digest = hashlib.sha256(f"{type(feature).__module__}.{type(feature).__qualname__}:{feature.name}".encode())
+        digest.update(feature.compute(segment_by).meta.serialize(format="json").encode())
+        for source in feature.inputs:
+            digest.update(FeatureCache.feature_key(source, segment_by).encode())
+        return digest.hexdigest()[:24]
+
+    def load(self, feature_key: str, data_key: str) -> pl.Series | None:
+        """Returns the cached column, None on a miss."""
+        path = self._path(feature_key, data_key)
+        try:
+            column = pl.read_parquet(path).to_series()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        # Mark as recently used
+        os.utime(path)
+        self.hits += 1
+        return column
+
+    def store(self, feature_key: str, data_key: str, column: pl.Series) -> None:
+        """Writes a column to the cache, replacing it atomically."""
+        path = self._path(feature_key, data_key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        column.to_frame().write_parquet(tmp_path)
+        os.replace(tmp_path, path)
+
+    def evict(self) -> int:
+        """Deletes the least recently used columns until the cache fits `max_bytes`.
+
+        Returns:
+            int: Number of evicted columns.
+        """
+        files = sorted(self.directory.glob("*.parquet"), key=lambda path: path.stat().st_mtime)
+        size = sum(path.stat().st_size for path in files)
+        evicted = 0
+        for path in files:
+            if size <= self.max_bytes:
+                break
+            size -= path.stat().st_size
+            path.unlink(missing_ok=True)
+            evicted += 1
+
+        if evicted:
+            logger.debug(f"Evicted {evicted} columns from the feature cache {self.directory}")
+        return evicted
+
+    def _path(self, feature_key: str, data_key: str) -> Path:
+        return self.directory / f"{feature_key}-{data_key}.parquet"
@@ -1,52 +1,410 @@
 from abc import ABC, abstractmethod
-from collections.abc import Sequence
+from collections import Counter
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass, field
 import polars as pl
 from common.logger import logger
+from .cache import FeatureCache
+from .streaming import FeatureState
+
+# Row position in the input data while computing features that missed the cache
+_ROW = "__row"
 
 
 class Feature(ABC):
     """Abstract base class for feature generators
-    
-    All concrete feature implementations must inherit from this class and 
-    implement the required abstract methods. Features are designed to be 
+
+    All concrete feature implementations must inherit from this class and
+    implement the required abstract methods. Features are designed to be
     composable and chainable within a FeatureEngine.
+
+    Concrete features describe their computation for a single group with
+    `expression`; `compute` places it in the window context given by
+    `group_by` and `sort_by`. Sub-expressions that other features may need as
+    well (e.g. the price changes of RSI) are declared in `shared` so that the
+    FeatureEngine computes them only once.
+
+    A feature may read the output of other features, which it declares in
+    `inputs` (see `_read`). The FeatureEngine computes the inputs first, each
+    of them once however many features read it.
     """
-    
+
+    group_by: str | None = None
+    sort_by: str | None = None
+    inputs: tuple["Feature", ...] = ()
+    _input_names: tuple[str, ...] = ()
+    # False if `expression` only reads `shared` columns and handles the
+    # partition boundaries itself: the FeatureEngine then evaluates it once over
+    # the whole sorted frame instead of partition by partition.
+    partitioned: bool = True
+
     @property
     @abstractmethod
     def name(self) -> str:
         """Get the name of the generated feature.
-        
+
         Returns:
             str: Name of the generated feture.
         """
         pass
-    
+
+    @property
+    def lookback(self) -> int | None:
+        """Number of preceding rows of the same group a value depends on.
+
+        Returns:
+            int | None: The look-back in rows, None if the value depends on the
+                whole history and can only be computed by a full recompute.
+        """
+        return None
+
+    def _read(self, column: "str | Feature") -> str:
+        """Declares `column` as an input if it is a Feature.
+
+        Returns:
+            str: Name of the column to read.
+        """
+        if isinstance(column, Feature):
+            self.inputs = (*self.inputs, column)
+            self._input_names = (*self._input_names, column.name)
+            return column.name
+        return column
+
+    def _named(self, name: str) -> str:
+        """Qualifies `name` with the inputs read, e.g. rsi_14d_of_returns_1d."""
+        return "_of_".join([name, *self._input_names])
+
+    def _window_name(self, prefix: str, window: int | str, min_periods: int | None = None) -> str:
+        """Name of a rolling feature, e.g. sma_21d for 21 rows, sma_4w_by_Date for 4 weeks of Date."""
+        name = f"{prefix}_{window}d" if isinstance(window, int) else f"{prefix}_{window}_by_{self.sort_by}"
+        if min_periods is not None:
+            name = f"{name}_min{min_periods}"
+        return self._named(name)
+
+    def _rolling(self, expr: pl.Expr, method: str, window: int | str, min_periods: int | None = None) -> pl.Expr:
+        """Rolls `expr` with the `method` aggregation, e.g. "mean", over a window.
+
+        Args:
+            expr: Expression to aggregate.
+            method: Rolling aggregation of Polars, e.g. "mean" or "std".
+            window: Number of rows, or a duration of `sort_by` such as "21d", "4w" or "1h".
+            min_periods: Values needed in a window for a result, the whole
+                window for row windows and one value for durations by default.
+        """
+        if isinstance(window, int):
+            return getattr(expr, f"rolling_{method}")(window_size=window, min_samples=min_periods)
+        if self.sort_by is None:
+            raise ValueError(f"Duration window '{window}' of {type(self).__name__} requires sort_by")
+        rolling = getattr(expr, f"rolling_{method}_by")
+        return rolling(self.sort_by, window_size=window, min_samples=1 if min_periods is None else min_periods)
+
+    @staticmethod
+    def _running_sums(expr: pl.Expr, key: str) -> dict[str, pl.Expr]:
+        """Shared running count and sum of `expr` per partition, see `_window_mean`.
+
+        Values are centered on the first one, which keeps the sums accurate
+        far away from zero, e.g. for prices. Sums of squares are not offered:
+        the variance of a short window, taken as the difference of two large
+        running sums of squares, loses most of its digits once the values
+        drift away from the first one (e.g. a price falling from 1000 to 1).
+        """
+        first = expr.drop_nulls().first()
+        return {
+            "__position": pl.int_range(pl.len()),
+            f"__first_{key}": first,
+            f"__count_{key}": expr.is_not_null().cum_sum(),
+            f"__sum_{key}": (expr - first).fill_null(0).cum_sum(),
+        }
+
+    @staticmethod
+    def _window_mean(
+            shared: Mapping[str, pl.Expr],
+            key: str,
+            window: int,
+            min_periods: int | None = None,
+    ) -> pl.Expr:
+        """Mean over the last `window` rows, from `_running_sums`.
+
+        Every window is the difference of two running sums, so any number of
+        windows costs a few vectorised operations each instead of a rolling
+        kernel each. Rows less than `window` rows into their partition only
+        subtract from the start of the partition, so the expression is
+        correct on the whole sorted frame as well as per partition. Like the
+        rolling kernels, nulls are skipped and the result is null with fewer
+        than `min_periods` (by default `window`) values.
+        """
+        def total(name: str) -> pl.Expr:
+            before = pl.when(shared["__position"] >= window).then(shared[name].shift(window)).otherwise(0)
+            return shared[name] - before
+
+        count = total(f"__count_{key}")
+        enough = count >= (window if min_periods is None else min_periods)
+        return pl.when(enough).then(total(f"__sum_{key}") / count + shared[f"__first_{key}"])
+
+    @staticmethod
+    def _window_lookback(window: int | str) -> int | None:
+        # Durations span an unknown number of rows, e.g. around gaps
+        return window if isinstance(window, int) else None
+
+    def shared(self) -> dict[str, pl.Expr]:
+        """Named sub-expressions of `expression` that other features may share.
+
+        Names must identify the computation, e.g. "__diff_Close": features
+        declaring the same name must declare the same expression.
+        """
+        return {}
+
     @abstractmethod
-    def compute(self) -> pl.Expr:
-        """Returns the Polars expression for this feature."""
+    def expression(self, shared: Mapping[str, pl.Expr]) -> pl.Expr:
+        """Returns the Polars expression for one group, sorted by `sort_by`.
+
+        Args:
+            shared: Expressions to use for the sub-expressions declared in `shared`.
+        """
         pass
 
+    def compute(self, segment_by: Sequence[str] = ()) -> pl.Expr:
+        """Returns the Polars expression for this feature.
+
+        Args:
+            segment_by: Extra columns splitting each group into segments that
+                are computed independently of each other.
+        """
+        # If there is nothing to partition by, .over(None) processes the whole column
+        expr = self.expression(self.shared()).over(
+            partition_by=self.partition_by(segment_by) or None,
+            order_by=self.sort_by
+        )
+        return expr.alias(self.name)
+
+    def state(self) -> FeatureState | None:
+        """Streaming state computing this feature bar by bar, see `.streaming`.
+
+        Returns:
+            FeatureState | None: A new state, None if the feature has no streaming form.
+        """
+        return None
+
+    def partition_by(self, segment_by: Sequence[str] = ()) -> list[str]:
+        """Columns whose groups are computed independently of each other."""
+        return [column for column in (self.group_by, *segment_by) if column is not None]
+
+
+@dataclass
+class _Window:
+    """Features evaluated in the same window: same partitions and sort order."""
+    partition_by: list[str]
+    sort_by: str | None
+    features: list[Feature] = field(default_factory=list)
+
+    def over(self, expr: pl.Expr) -> pl.Expr:
+        # The frame is already sorted, partitions only need to be kept apart
+        return expr.over(self.partition_by) if self.partition_by else expr
+
 
 class FeatureEngine:
     """Orchestrates the composition and execution of multiple features.
-    
+
+    Features are planned before they are applied. Features reading the output
+    of other features (`Feature.inputs`) form a dependency graph, which is
+    split into stages: every feature is computed in the first stage after all
+    of its inputs. Inputs that are not among `features` themselves are
+    computed as intermediates and dropped from the output.
+
+    Within a stage, features sharing the same `group_by`/`sort_by` form one
+    window, for which the data is sorted once and the features are evaluated
+    as per-partition expressions on the sorted frame instead of each sorting
+    its own partitions. Sub-expressions declared in `Feature.shared` by
+    several features of a window are computed once, and duplicated features
+    are dropped. Features that are not `partitioned` (e.g. the windows of a
+    `MovingAverage.sweep`) read only such shared columns, which are then always
+    computed, and are evaluated once over the whole sorted frame. Rows come
+    out sorted by the partition and sort columns of the last window.
+
+    With a `cache`, the data is collected and only the features missing from
+    the cache for this data are computed; the result is then a LazyFrame over
+    the collected data. The whole input is then held in memory instead of
+    streamed, and since the cache is keyed on a hash of all of it, any new
+    or changed row misses every feature: the cache pays off for repeated
+    runs over the same data (e.g. research), not for incremental runs.
+
     Attributes:
         features: Non-empty sequence of Feature objects to compose.
+        cache: Cache of computed feature columns, nothing is cached if None.
     """
-    
-    def __init__(self, features: Sequence[Feature]) -> None:
+
+    def __init__(self, features: Sequence[Feature], cache: FeatureCache | None = None) -> None:
         if not features:
             raise ValueError("FeatureEngine requires at least one feature")
         self.features = features
+        self.cache = cache
+
+    @property
+    def lookback(self) -> int | None:
+        """Largest look-back of all features, None if any needs the whole history.
+
+        The look-back of a feature reading other features adds up the
+        look-back of its inputs.
+        """
+        graph = self._graph()
+        total: dict[str, int | None] = {}
+        for stage in self._stages(graph):
+            for feature in stage:
+                lookbacks = [feature.lookback, *(total[f.name] for f in feature.inputs)]
+                total[feature.name] = None if None in lookbacks else feature.lookback + max(lookbacks[1:], default=0)
+
+        if any(lookback is None for lookback in total.values()):
+            return None
+        return max(total.values())
+
+    def transform(self, data: pl.LazyFrame, segment_by: Sequence[str] = ()) -> pl.LazyFrame:
+        """Applies all features, stage by stage, sorting once per window.
+
+        Args:
+            data: Data to compute the features on.
+            segment_by: Extra columns splitting every group into independent segments.
+        """
+        if self.cache is not None:
+            return self._transform_cached(data, segment_by)
+
+        graph = self._graph()
+        stages = [self._windows(stage, segment_by) for stage in self._stages(graph)]
+
+        sorted_by = None
+        for windows in stages:
+            for window in windows:
+                # A later stage in the same window finds the data already sorted
+                if window.sort_by is not None and sorted_by != (window.partition_by, window.sort_by):
+                    data = data.sort([*window.partition_by, window.sort_by], maintain_order=True)
+                    sorted_by = (window.partition_by, window.sort_by)
+                data = self._apply(data, window)
 
-    
-    def transform(self, data: pl.LazyFrame) -> pl.LazyFrame:
-        """Applies all features in a single optimized batch."""
-        # Create the expressions from the features
-        exprs = [f.compute() for f in self.features]
-        # Polars executes all of these in parallel 
+        requested = {feature.name for feature in self.features}
+        intermediates = [name for name in graph if name not in requested]
+        if intermediates:
+            data = data.drop(intermediates)
+
+        logger.info(
+            f"Applied {len(self.features)} features successfully "
+            f"({len(graph)} computed in {len(stages)} stages, "
+            f"{sum(len(windows) for windows in stages)} windows)"
+        )
+        return data
+
+    def _transform_cached(self, data: pl.LazyFrame, segment_by: Sequence[str]) -> pl.LazyFrame:
+        """Loads the features from the cache, computing and storing the missing ones."""
+        frame = data.collect()
+        data_key = self.cache.data_key(frame)
+
+        graph = self._graph()
+        stages = self._stages(graph)
+        requested = {feature.name for feature in self.features}
+        features = [feature for stage in stages for feature in stage if feature.name in requested]
+
+        columns: dict[str, pl.Series] = {}
+        missing = []
+        for feature in features:
+            column = self.cache.load(self.cache.feature_key(feature, segment_by), data_key)
+            if column is None:
+                missing.append(feature)
+            else:
+                columns[feature.name] = column
+
+        if missing:
+            computed = (
+                FeatureEngine(missing).transform(frame.lazy().with_row_index(_ROW), segment_by)
+                .sort(_ROW)
+                .collect()
+            )
+            for feature in missing:
+                columns[feature.name] = computed[feature.name]
+                self.cache.store(self.cache.feature_key(feature, segment_by), data_key, computed[feature.name])
+            self.cache.evict()
+
+        logger.info(f"Feature cache: {len(features) - len(missing)} hits, {len(missing)} misses")
+
+        result = frame.with_columns(columns[feature.name] for feature in features)
+        # Same row order as computing the features
+        last = self._windows(stages[-1], segment_by)[-1]
+        if last.sort_by is not None:
+            result = result.sort([*last.partition_by, last.sort_by], maintain_order=True)
+        return result.lazy()
+
+    def _apply(self, data: pl.LazyFrame, window: _Window) -> pl.LazyFrame:
+        """Computes the features of one window on data sorted for it."""
+        # Features evaluated on the whole frame need partitions in contiguous, sorted runs
+        whole_frame = [not f.partitioned and window.sort_by is not None for f in window.features]
+
+        # Shared sub-expressions used by several features become temporary columns
+        declared = [f.shared() for f in window.features]
+        counts = Counter(name for shared in declared for name in shared)
+        hoisted = {}
+        for shared, unpartitioned in zip(declared, whole_frame, strict=True):
+            hoisted.update({name: expr for name, expr in shared.items() if counts[name] > 1 or unpartitioned})
+        if hoisted:
+            data = data.with_columns(window.over(expr).alias(name) for name, expr in hoisted.items())
+
+        exprs = []
+        for feature, shared, unpartitioned in zip(window.features, declared, whole_frame, strict=True):
+            inputs = {name: pl.col(name) if name in hoisted else expr for name, expr in shared.items()}
+            expr = feature.expression(inputs)
+            exprs.append((expr if unpartitioned else window.over(expr)).alias(feature.name))
+        # Polars executes all of these in parallel
         data = data.with_columns(exprs)
-        
-        logger.info(f"Applied {len(self.features)} features successfully")
-        return data
\ No newline at end of file
+
+        if hoisted:
+            data = data.drop(list(hoisted))
+        return data
+
+    def _graph(self) -> dict[str, Feature]:
+        """Unique features by name, the requested ones and all of their inputs."""
+        graph: dict[str, Feature] = {}
+        shared: dict[str, pl.Expr] = {}
+
+        pending = list(self.features)
+        while pending:
+            feature = pending.pop(0)
+            if feature.name in graph:
+                if not feature.compute().meta.eq(graph[feature.name].compute()):
+                    raise ValueError(f"Features computing '{feature.name}' differently")
+                logger.debug(f"Skipping duplicated feature {feature.name}")
+                continue
+            graph[feature.name] = feature
+
+            for name, expr in feature.shared().items():
+                if name in shared and not expr.meta.eq(shared[name]):
+                    raise ValueError(f"Shared sub-expression '{name}' is declared differently")
+                shared[name] = expr
+
+            pending.extend(feature.inputs)
+
+        return graph
+
+    def _stages(self, graph: dict[str, Feature]) -> list[list[Feature]]:
+        """Splits the graph into stages, each feature following all of its inputs.
+
+        Raises:
+            ValueError: If features depend on each other in a cycle.
+        """
+        depends_on = {name: {f.name for f in feature.inputs} for name, feature in graph.items()}
+        stages = []
+        done: set[str] = set()
+        while len(done) < len(graph):
+            ready = [name for name in graph if name not in done and depends_on[name] <= done]
+            if not ready:
+                cycle = sorted(name for name in graph if name not in done)
+                raise ValueError(f"Cyclic dependencies between features: {cycle}")
+            stages.append([graph[name] for name in ready])
+            done.update(ready)
+        return stages
+
+    def _windows(self, features: Sequence[Feature], segment_by: Sequence[str]) -> list[_Window]:
+        """Group features by window, in order of first appearance."""
+        windows: dict[tuple, _Window] = {}
+        for feature in features:
+            partition_by = feature.partition_by(segment_by)
+            key = (tuple(partition_by), feature.sort_by)
+            if key not in windows:
+                windows[key] = _Window(partition_by=partition_by, sort_by=feature.sort_by)
+            windows[key].features.append(feature)
+        return list(windows.values())
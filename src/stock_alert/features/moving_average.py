@@ -1,50 +1,85 @@
 """Simple Moving Averages (SMAs) are crucial in economics and finance for 
 smoothing out volatile, short-term fluctuations (noise) in data
 """
+from collections.abc import Iterable, Mapping
 import polars as pl
 from .feature_base import Feature
+from .streaming import FeatureState, RollingMeanState
 
 class MovingAverage(Feature):
     """Simple Moving Average feature based on a window of x days
     
     Sorting is REQUIRED because rolling calculations depend on order.
     Always specify sort_by to ensure correct results
+
+    The window is either a number of rows or a duration of `sort_by` (e.g.
+    "21d", "4w" or "1h"), which stays correct across missing days and
+    calendars of different venues.
+
+    Many windows of the same column are best computed with `sweep`.
     """
 
     def __init__(
             self, 
-            column: str, 
-            window_days: int, 
+            column: str | Feature, 
+            window_days: int | str, 
             sort_by: str, 
             group_by: str | None = None,
+            min_periods: int | None = None,
+            cumulative: bool = False,
     ) -> None:
         """
         Args:
-            column: Column to compute SMA on.
-            window_days: Size of rolling window.
+            column: Column to compute SMA on, or a Feature whose output to use.
+            window_days: Size of rolling window, in rows or as a duration such as "21d".
             sort_by_column: Column to sort by before computing.
             group_by: Optional column to group by before computing.
+            min_periods: Values needed for a result, the whole window (or one value for durations) by default.
+            cumulative: Compute from running sums shared with the other windows of the column, see `sweep`.
         """
-        self.column = column
+        if cumulative and not isinstance(window_days, int):
+            raise ValueError("Cumulative moving averages require a window in rows")
+        self.column = self._read(column)
         self.window_days = window_days
         self.sort_by = sort_by
         self.group_by = group_by
+        self.min_periods = min_periods
+        self.cumulative = cumulative
+        self.partitioned = not cumulative
+
+    @classmethod
+    def sweep(
+            cls,
+            column: str | Feature,
+            windows: Iterable[int],
+            sort_by: str,
+            group_by: str | None = None,
+            min_periods: int | None = None,
+    ) -> list["MovingAverage"]:
+        """One SMA per window, all derived from a single running sum of `column` per partition."""
+        return [cls(column, window, sort_by, group_by, min_periods, cumulative=True) for window in windows]
         
     @property
     def name(self) -> str:
-        return f"sma_{self.window_days}d"
+        return self._window_name("sma", self.window_days, self.min_periods)
     
-    def compute(self) -> pl.Expr:
+    @property
+    def lookback(self) -> int | None:
+        return self._window_lookback(self.window_days)
+
+    def shared(self) -> dict[str, pl.Expr]:
+        if not self.cumulative:
+            return {}
+        return self._running_sums(pl.col(self.column), self.column)
+
+    def expression(self, shared: Mapping[str, pl.Expr]) -> pl.Expr:
         """Returns the rolling mean expression."""
-        # Create rolling mean logic
-        expr = pl.col(self.column).rolling_mean(window_size=self.window_days)
-
-        # Add the context (Grouping and Sorting)
-        # If group_by is None, .over(None) is valid and processes the whole column
-        expr = expr.over(
-            partition_by=self.group_by,
-            order_by=self.sort_by
-        )
- 
-        return expr.alias(self.name)
-    
+        if self.cumulative:
+            return self._window_mean(shared, self.column, self.window_days, self.min_periods)
+        return self._rolling(pl.col(self.column), "mean", self.window_days, self.min_periods)
+
+    def state(self) -> FeatureState | None:
+        if not isinstance(self.window_days, int):
+            # Durations would need the dates of the window as well
+            return None
+        return RollingMeanState(self.column, self.window_days, self.min_periods)
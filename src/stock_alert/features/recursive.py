@@ -0,0 +1,207 @@
+"""Recursive indicators: exponential and Wilder smoothing, MACD, ATR and Bollinger bands.
+
+Every indicator is a vectorised Polars expression for the history, and has a
+streaming state (see `Feature.state` and `.streaming`) that updates it in
+O(1) per new bar, e.g. intraday, without reloading the history. Both forms
+skip null values: a null bar yields null and leaves the state unchanged.
+"""
+from collections.abc import Mapping
+import polars as pl
+from .feature_base import Feature
+from .streaming import ATRState, BollingerState, EMAState, FeatureState, MACDState, WilderRSIState
+
+
+def wilder_smoothing(values: pl.Expr, window: int) -> pl.Expr:
+    """Wilder's moving average: the mean of the first `window` values, then
+    avg = (avg * (window - 1) + value) / window.
+
+    Equivalent to an EMA with alpha = 1 / window seeded with the simple mean,
+    which is how it is computed: values before the seed are nulled and the
+    seed row holds the mean of the first `window` values.
+    """
+    valid = values.is_not_null().cum_sum()
+    seeded = (
+        pl.when(valid < window).then(None)
+        .when((valid == window) & values.is_not_null()).then(values.cum_sum() / window)
+        .otherwise(values)
+    )
+    return seeded.ewm_mean(alpha=1 / window, adjust=False, ignore_nulls=True)
+
+
+def _previous(column: str) -> pl.Expr:
+    # Last non-null value before each row
+    return pl.col(column).forward_fill().shift(1)
+
+
+class ExponentialMovingAverage(Feature):
+    """Exponential Moving Average with alpha = 2 / (span + 1), seeded with the first value.
+    Reveals Trend: like the SMA, but reacting faster to recent prices.
+    """
+    def __init__(self, column: str | Feature, span: int, sort_by: str, group_by: str | None = None):
+        self.column = self._read(column)
+        self.span = span
+        self.sort_by = sort_by
+        self.group_by = group_by
+
+    @property
+    def name(self) -> str:
+        return self._named(f"ema_{self.span}d")
+
+    def shared(self) -> dict[str, pl.Expr]:
+        return {f"__ema_{self.span}_{self.column}": _ema(self.column, self.span)}
+
+    def expression(self, shared: Mapping[str, pl.Expr]) -> pl.Expr:
+        return shared[f"__ema_{self.span}_{self.column}"]
+
+    def state(self) -> FeatureState:
+        return EMAState(self.column, alpha=2 / (self.span + 1))
+
+
+def _ema(column: str, span: int) -> pl.Expr:
+    return pl.col(column).ewm_mean(span=span, adjust=False, ignore_nulls=True)
+
+
+class WilderRelativeStrengthIndex(Feature):
+    """RSI with Wilder's smoothing of the gains and losses, as originally defined.
+    Reveals Exhaustion: Is the world 'Overbought' or 'Oversold'?
+    """
+    def __init__(self, column: str | Feature, window_days: int = 14, sort_by: str = "date", group_by: str | None = None):
+        self.column = self._read(column)
+        self.window_days = window_days
+        self.sort_by = sort_by
+        self.group_by = group_by
+
+    @property
+    def name(self) -> str:
+        return self._named(f"rsi_wilder_{self.window_days}d")
+
+    def shared(self) -> dict[str, pl.Expr]:
+        # Changes from the previous valid price
+        diff = pl.col(self.column) - _previous(self.column)
+        return {
+            f"__wilder_gain_{self.column}": pl.when(diff > 0).then(diff).when(diff <= 0).then(0.0),
+            f"__wilder_loss_{self.column}": pl.when(diff < 0).then(-diff).when(diff >= 0).then(0.0),
+        }
+
+    def expression(self, shared: Mapping[str, pl.Expr]) -> pl.Expr:
+        avg_gain = wilder_smoothing(shared[f"__wilder_gain_{self.column}"], self.window_days)
+        avg_loss = wilder_smoothing(shared[f"__wilder_loss_{self.column}"], self.window_days)
+        return 100 - (100 / (1 + avg_gain / avg_loss))
+
+    def state(self) -> FeatureState:
+        return WilderRSIState(self.column, self.window_days)
+
+
+class MACD(Feature):
+    """MACD line: the fast EMA minus the slow EMA of a column.
+    Reveals Momentum: Is the short-term trend pulling away from the long-term one?
+
+    The signal line is an EMA of this feature, e.g.
+    `ExponentialMovingAverage(MACD("Close", ...), span=9, ...)`, and the
+    histogram the difference of both (see `transformer.Difference`).
+    """
+    def __init__(self,
+                 column: str | Feature,
+                 fast: int = 12,
+                 slow: int = 26,
+                 sort_by: str = "date",
+                 group_by: str | None = None):
+        self.column = self._read(column)
+        self.fast = fast
+        self.slow = slow
+        self.sort_by = sort_by
+        self.group_by = group_by
+
+    @property
+    def name(self) -> str:
+        return self._named(f"macd_{self.fast}_{self.slow}d")
+
+    def shared(self) -> dict[str, pl.Expr]:
+        return {f"__ema_{span}_{self.column}": _ema(self.column, span) for span in (self.fast, self.slow)}
+
+    def expression(self, shared: Mapping[str, pl.Expr]) -> pl.Expr:
+        return shared[f"__ema_{self.fast}_{self.column}"] - shared[f"__ema_{self.slow}_{self.column}"]
+
+    def state(self) -> FeatureState:
+        return MACDState(self.column, self.fast, self.slow)
+
+
+class AverageTrueRange(Feature):
+    """Average True Range: Wilder's smoothing of the true range of the bars.
+    Reveals Risk: How far does the price travel in a bar, gaps included?
+    """
+    def __init__(self,
+                 window_days: int = 14,
+                 sort_by: str = "date",
+                 group_by: str | None = None,
+                 high: str | Feature = "High",
+                 low: str | Feature = "Low",
+                 close: str | Feature = "Close"):
+        self.high = self._read(high)
+        self.low = self._read(low)
+        self.close = self._read(close)
+        self.window_days = window_days
+        self.sort_by = sort_by
+        self.group_by = group_by
+
+    @property
+    def name(self) -> str:
+        return self._named(f"atr_{self.window_days}d")
+
+    def expression(self, shared: Mapping[str, pl.Expr]) -> pl.Expr:
+        high, low, close = pl.col(self.high), pl.col(self.low), pl.col(self.close)
+        previous = _previous(self.close)
+        # The gap from the previous close counts as well, the first bar only has its range
+        true_range = pl.max_horizontal(high - low, (high - previous).abs(), (low - previous).abs())
+        complete = high.is_not_null() & low.is_not_null() & close.is_not_null()
+        return wilder_smoothing(pl.when(complete).then(true_range), self.window_days)
+
+    def state(self) -> FeatureState:
+        return ATRState(self.high, self.low, self.close, self.window_days)
+
+
+class BollingerBand(Feature):
+    """Upper or lower Bollinger band: the SMA plus or minus `num_std` standard deviations.
+    Reveals Extremes: Is the price unusually far from its average?
+
+    The standard deviation is the population one (ddof=0), as defined by
+    Bollinger; the middle band is `MovingAverage` of the same window.
+    """
+    def __init__(self,
+                 column: str | Feature,
+                 window_days: int = 20,
+                 num_std: float = 2.0,
+                 band: str = "upper",
+                 sort_by: str = "date",
+                 group_by: str | None = None):
+        if band not in ("upper", "lower"):
+            raise ValueError(f"Unknown Bollinger band '{band}', expected 'upper' or 'lower'")
+        self.column = self._read(column)
+        self.window_days = window_days
+        self.num_std = num_std
+        self.band = band
+        self.sort_by = sort_by
+        self.group_by = group_by
+
+    @property
+    def name(self) -> str:
+        return self._named(f"bollinger_{self.band}_{self.window_days}d_{self.num_std:g}sd")
+
+    @property
+    def lookback(self) -> int:
+        return self.window_days
+
+    def shared(self) -> dict[str, pl.Expr]:
+        value = pl.col(self.column)
+        return {
+            f"__mean_{self.window_days}_{self.column}": value.rolling_mean(window_size=self.window_days),
+            f"__std0_{self.window_days}_{self.column}": value.rolling_std(window_size=self.window_days, ddof=0),
+        }
+
+    def expression(self, shared: Mapping[str, pl.Expr]) -> pl.Expr:
+        sign = 1 if self.band == "upper" else -1
+        mean = shared[f"__mean_{self.window_days}_{self.column}"]
+        return mean + sign * self.num_std * shared[f"__std0_{self.window_days}_{self.column}"]
+
+    def state(self) -> FeatureState:
+        return BollingerState(self.column, self.window_days, self.num_std, self.band)
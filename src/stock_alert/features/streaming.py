@@ -0,0 +1,302 @@
+"""Streaming states of features: O(1) updates per new bar.
+
+A state holds what a feature needs from the history of one identifier (e.g.
+the last EMA value) and updates it bar by bar, returning the same values as
+the vectorised feature over the whole history. `StreamingEngine` keeps the
+states of a set of features for every identifier.
+"""
+import math
+from abc import ABC, abstractmethod
+from collections import deque
+from collections.abc import Mapping, Sequence
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .feature_base import Feature
+
+
+class FeatureState(ABC):
+    """State of a feature for one identifier."""
+
+    @abstractmethod
+    def update(self, row: Mapping[str, Any]) -> float | None:
+        """Adds the next bar and returns the value of the feature on it.
+
+        Args:
+            row: Columns of the bar, including the outputs of the features read.
+        """
+        pass
+
+
+class _Smoothing:
+    """Exponential smoothing seeded with the first value, or with the mean of the first `seed` values."""
+    def __init__(self, alpha: float, seed: int = 1) -> None:
+        self.alpha = alpha
+        self.seed = seed
+        self.count = 0
+        self.total = 0.0
+        self.value: float | None = None
+
+    def update(self, x: float | None) -> float | None:
+        if x is None:
+            return None
+        self.count += 1
+        if self.count < self.seed:
+            self.total += x
+            return None
+        if self.count == self.seed:
+            self.total += x
+            self.value = self.total / self.seed
+        else:
+            self.value = (1 - self.alpha) * self.value + self.alpha * x
+        return self.value
+
+
+def _rsi(avg_gain: float, avg_loss: float) -> float:
+    if avg_loss == 0:
+        return 100.0 if avg_gain > 0 else math.nan
+    return 100 - (100 / (1 + avg_gain / avg_loss))
+
+
+class EMAState(FeatureState):
+    """Exponential moving average of `column`."""
+    def __init__(self, column: str, alpha: float) -> None:
+        self.column = column
+        self.ema = _Smoothing(alpha)
+
+    def update(self, row: Mapping[str, Any]) -> float | None:
+        return self.ema.update(row[self.column])
+
+
+class WilderRSIState(FeatureState):
+    """RSI of `column` with Wilder's smoothing of the gains and losses."""
+    def __init__(self, column: str, window: int) -> None:
+        self.column = column
+        self.previous: float | None = None
+        self.gain = _Smoothing(1 / window, seed=window)
+        self.loss = _Smoothing(1 / window, seed=window)
+
+    def update(self, row: Mapping[str, Any]) -> float | None:
+        price = row[self.column]
+        if price is None:
+            return None
+        previous, self.previous = self.previous, price
+        if previous is None:
+            return None
+        diff = price - previous
+        avg_gain, avg_loss = self.gain.update(max(diff, 0.0)), self.loss.update(max(-diff, 0.0))
+        return None if avg_gain is None else _rsi(avg_gain, avg_loss)
+
+
+class MACDState(FeatureState):
+    """Fast minus slow EMA of `column`."""
+    def __init__(self, column: str, fast: int, slow: int) -> None:
+        self.column = column
+        self.fast = _Smoothing(2 / (fast + 1))
+        self.slow = _Smoothing(2 / (slow + 1))
+
+    def update(self, row: Mapping[str, Any]) -> float | None:
+        price = row[self.column]
+        fast, slow = self.fast.update(price), self.slow.update(price)
+        return None if price is None else fast - slow
+
+
+class ATRState(FeatureState):
+    """Average true range of the high, low and close columns."""
+    def __init__(self, high: str, low: str, close: str, window: int) -> None:
+        self.columns = (high, low, close)
+        self.previous: float | None = None
+        self.atr = _Smoothing(1 / window, seed=window)
+
+    def update(self, row: Mapping[str, Any]) -> float | None:
+        high, low, close = (row[column] for column in self.columns)
+        previous = self.previous
+        if close is not None:
+            self.previous = close
+        if high is None or low is None or close is None:
+            return None
+        true_range = high - low
+        if previous is not None:
+            true_range = max(true_range, abs(high - previous), abs(low - previous))
+        return self.atr.update(true_range)
+
+
+class _Window:
+    """Count and sum of the non-null values among the last `size` rows.
+
+    The sum is updated as values enter and leave the window, centered on the
+    first value seen to keep it accurate for prices. The variance is taken
+    from the values themselves: a running sum of squares loses most of its
+    digits once prices drift far from the first one.
+    """
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.values: deque[float | None] = deque(maxlen=size)
+        self.center: float | None = None
+        self.count = 0
+        self.total = 0.0
+
+    @property
+    def full(self) -> bool:
+        return len(self.values) == self.size
+
+    def push(self, value: float | None) -> None:
+        if self.center is None and value is not None:
+            self.center = value
+        if self.full:
+            self._add(self.values[0], -1)
+        self.values.append(value)
+        self._add(value, 1)
+
+    def mean(self) -> float:
+        return self.center + self.total / self.count
+
+    def variance(self, ddof: int) -> float:
+        values = [value for value in self.values if value is not None]
+        mean = sum(values) / len(values)
+        return sum((value - mean) ** 2 for value in values) / (len(values) - ddof)
+
+    def _add(self, value: float | None, sign: int) -> None:
+        if value is None:
+            return
+        self.count += sign
+        self.total += sign * (value - self.center)
+
+
+class RollingMeanState(FeatureState):
+    """Mean of the last `window` rows of `column`, once `min_periods` of them are not null."""
+    def __init__(self, column: str, window: int, min_periods: int | None = None) -> None:
+        self.column = column
+        self.window = _Window(window)
+        self.min_periods = window if min_periods is None else min_periods
+
+    def update(self, row: Mapping[str, Any]) -> float | None:
+        self.window.push(row[self.column])
+        return self.window.mean() if self.window.count >= max(self.min_periods, 1) else None
+
+
+class RollingStdState(FeatureState):
+    """Sample standard deviation of the last `window` rows of `column`, see `RollingMeanState`."""
+    def __init__(self, column: str, window: int, min_periods: int | None = None) -> None:
+        self.column = column
+        self.window = _Window(window)
+        self.min_periods = window if min_periods is None else min_periods
+
+    def update(self, row: Mapping[str, Any]) -> float | None:
+        self.window.push(row[self.column])
+        if self.window.count < max(self.min_periods, 2):
+            return None
+        return math.sqrt(self.window.variance(ddof=1))
+
+
+class RSIState(FeatureState):
+    """RSI of `column` from the mean gains and losses of the last `window` rows.
+
+    Like the vectorised feature, the change from a missing price counts as
+    neither a gain nor a loss.
+    """
+    def __init__(self, column: str, window: int, min_periods: int | None = None) -> None:
+        self.column = column
+        self.previous: float | None = None
+        self.gains = _Window(window)
+        self.losses = _Window(window)
+        self.min_periods = window if min_periods is None else min_periods
+
+    def update(self, row: Mapping[str, Any]) -> float | None:
+        price = row[self.column]
+        previous, self.previous = self.previous, price
+        diff = 0.0 if price is None or previous is None else price - previous
+        self.gains.push(max(diff, 0.0))
+        self.losses.push(max(-diff, 0.0))
+        if self.gains.count < max(self.min_periods, 1):
+            return None
+        return _rsi(self.gains.mean(), self.losses.mean())
+
+
+class ShiftState(FeatureState):
+    """Value of `column` `n` rows before, or the ratio of the current value to it minus 1 with `returns`."""
+    def __init__(self, column: str, n: int, returns: bool = False) -> None:
+        self.column = column
+        self.returns = returns
+        self.values: deque[float | None] = deque(maxlen=n + 1)
+
+    def update(self, row: Mapping[str, Any]) -> float | None:
+        value = row[self.column]
+        self.values.append(value)
+        shifted = self.values[0] if len(self.values) == self.values.maxlen else None
+        if not self.returns:
+            return shifted
+        if value is None or shifted is None:
+            return None
+        if shifted == 0:
+            # Float division as in Polars
+            return math.copysign(math.inf, value) if value else math.nan
+        return value / shifted - 1
+
+
+class DistanceState(FeatureState):
+    """Relative distance of `column` from `reference` on the same bar, no history needed."""
+    def __init__(self, column: str, reference: str) -> None:
+        self.column = column
+        self.reference = reference
+
+    def update(self, row: Mapping[str, Any]) -> float | None:
+        value, reference = row[self.column], row[self.reference]
+        if value is None or reference is None:
+            return None
+        if reference == 0:
+            # Float division as in Polars
+            return math.copysign(math.inf, value) if value else math.nan
+        return value / reference - 1
+
+
+class BollingerState(FeatureState):
+    """Bollinger band of `column`, over a sliding window of its last values."""
+    def __init__(self, column: str, window: int, num_std: float, band: str) -> None:
+        self.column = column
+        self.window = _Window(window)
+        self.sign = num_std if band == "upper" else -num_std
+
+    def update(self, row: Mapping[str, Any]) -> float | None:
+        self.window.push(row[self.column])
+        if self.window.count < self.window.size:
+            return None
+        return self.window.mean() + self.sign * math.sqrt(self.window.variance(ddof=0))
+
+
+class StreamingEngine:
+    """Keeps the streaming states of features for every identifier.
+
+    Features are updated in dependency order, so a feature reading another
+    feature (e.g. the signal line, an EMA of the MACD) sees its value on the
+    same bar.
+
+    Args:
+        features: Features that all provide a `Feature.state`, as do their inputs.
+
+    Raises:
+        ValueError: If a feature, or a feature it reads, has no streaming state.
+    """
+    def __init__(self, features: Sequence["Feature"]) -> None:
+        from .feature_base import FeatureEngine
+
+        engine = FeatureEngine(features)
+        graph = engine._graph()
+        self.features = [feature for stage in engine._stages(graph) for feature in stage]
+        self.requested = {feature.name for feature in features}
+        # Fails on construction rather than on the first bar
+        missing = [feature.name for feature in self.features if feature.state() is None]
+        if missing:
+            raise ValueError(f"Features without a streaming state cannot be streamed: {missing}")
+        self.states: dict[Any, list[FeatureState]] = {}
+
+    def update(self, identifier: Any, row: Mapping[str, Any]) -> dict[str, float | None]:
+        """Adds the next bar of an identifier and returns the values of the features on it."""
+        states = self.states.get(identifier)
+        if states is None:
+            states = self.states[identifier] = [feature.state() for feature in self.features]
+
+        values = dict(row)
+        for feature, state in zip(self.features, states, strict=True):
+            values[feature.name] = state.update(values)
+        return {name: value for name, value in values.items() if name in self.requested}
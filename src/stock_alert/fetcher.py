@@ -1,11 +1,101 @@
+import time
 from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date, datetime
 from pathlib import Path
+from typing import Protocol
+import numpy as np
 import pandas as pd
-import yfinance as yf
+import polars as pl
 from common.logger import logger
+from stock_alert.storage import PartitionedStore, date_literal
+
+class HistoryProvider(Protocol):
+    """Returns the daily history of one identifier, indexed by Date.
+
+    Either `period` (full history) or `start` (inclusive delta) is set.
+    """
+    def __call__(
+            self,
+            identifier: str,
+            period: str | None,
+            start: pd.Timestamp | None,
+            timeout: float,
+    ) -> pd.DataFrame:
+        ...
+
+
+def yfinance_history(
+        identifier: str,
+        period: str | None,
+        start: pd.Timestamp | None,
+        timeout: float,
+) -> pd.DataFrame:
+    """Default history provider backed by Yahoo Finance.
+
+    Errors are raised instead of being swallowed by yfinance so that the
+    fetcher can retry and report them.
+    """
+    # Imported on first use, it is slow to import and only needed online
+    import yfinance as yf
+
+    tk = yf.Ticker(identifier)
+    return tk.history(
+        period=period, start=start, interval="1d", rounding=True, timeout=timeout, raise_errors=True
+    )
+
+
+@dataclass
+class FetchFailure:
+    """A single identifier that could not be fetched after all retries."""
+    identifier: str
+    error: str
+    attempts: int
+
+
+@dataclass
+class FetchResult:
+    """Outcome of fetching a universe of identifiers.
+
+    Attributes:
+        data: Lazy scan over every identifier that succeeded, None if all failed.
+        failures: Identifiers that failed, with the last error seen.
+        latencies: Wall time in seconds spent on each identifier (retries included).
+        full_refreshes: Identifiers whose full history was fetched in incremental
+            mode, because they were new or their cached history was restated.
+        rows_fetched: Number of rows downloaded from the provider.
+    """
+    data: pl.LazyFrame | None
+    failures: list[FetchFailure] = field(default_factory=list)
+    latencies: dict[str, float] = field(default_factory=dict)
+    full_refreshes: list[str] = field(default_factory=list)
+    rows_fetched: int = 0
+
+    @property
+    def failed_identifiers(self) -> list[str]:
+        return [failure.identifier for failure in self.failures]
+
+
+@dataclass
+class _Outcome:
+    """Result of fetching a single identifier, data is None once written to the cache."""
+    data: pl.DataFrame | None
+    failure: FetchFailure | None
+    latency: float
+    rows_fetched: int
+    full_refresh: bool
+
 
 class BaseFetcher(ABC):
-    """Generic base class defining the fetching contract"""
+    """Generic base class defining the fetching contract
+
+    `scan` is the native contract used by the pipeline: a lazy Polars frame,
+    ideally scanned from the cache so that downstream queries stream it
+    instead of holding the whole universe in memory. `fetch` returns the same
+    data as a pandas DataFrame.
+    """
     def __init__(self, cache_dir: str | None) -> None:
         self.cache_dir = cache_dir
 
@@ -13,56 +103,449 @@ class BaseFetcher(ABC):
     def fetch(self) -> pd.DataFrame:
         pass
 
-    def _write_data(self, data:pd.DataFrame, source_name: str) -> None:
-        """Save fetched data to a specific path"""
+    def scan(self) -> pl.LazyFrame:
+        """Fetch the data and return it as a lazy Polars frame.
+
+        Fetchers that only implement `fetch` are converted from pandas.
+        """
+        return pl.from_pandas(self.fetch()).lazy()
+
+    def scan_batches(self, batch_size: int) -> Iterator[pl.LazyFrame]:
+        """Fetch the data and yield it in batches of `batch_size` identifiers, in identifier order."""
+        data = self.scan()
+        identifiers = data.select(pl.col("identifier").unique().sort()).collect().to_series()
+        for offset in range(0, identifiers.len(), batch_size):
+            batch = identifiers.slice(offset, batch_size)
+            yield data.filter(pl.col("identifier").is_in(batch.implode()))
+
+    def _store(self, source_name: str) -> PartitionedStore | None:
+        """Partitioned store of a source, None if caching is disabled"""
         if not self.cache_dir:
-            return  
-        
-        save_path = Path(self.cache_dir) / source_name / "data.parquet"
-        save_path.parent.mkdir(parents=True, exist_ok=True)
-        data.to_parquet(save_path)
-        logger.info(f"Write data to {save_path}")
+            return None
+        return PartitionedStore(Path(self.cache_dir) / source_name)
+
+    def _write_data(self, data: pl.DataFrame, source_name: str) -> None:
+        """Save fetched data to a specific path, replacing the history of its identifiers"""
+        store = self._store(source_name)
+        if store is None:
+            return
+
+        store.replace(data)
+        logger.info(f"Write data to {store.root}")
 
 class YFinanceFetcher(BaseFetcher):
-    """Fetcher to retrieve stock data from Yahoo Finance"""
+    """Fetcher to retrieve stock data from Yahoo Finance
+
+    Identifiers are fetched concurrently on a thread pool, since each request
+    is dominated by network latency rather than CPU.
+
+    In incremental mode only the days after the last cached date of each
+    identifier are requested, overlapping by two days, and merged into the
+    cache. The last cached bar may have been cached during the trading day,
+    so it is refetched and replaced. The full `period` is fetched for
+    identifiers that are not cached yet, and for identifiers whose history
+    was restated: the bar before the last cached one no longer matches the
+    cache, or a dividend/split arrived, which makes Yahoo re-adjust the
+    whole history.
 
-    def __init__(self, identifiers: list[str], period: str = "2y", cache_dir: str | None = None) -> None:
+    Args:
+        identifiers: Tickers to fetch.
+        period: History period understood by yfinance (e.g. "5y").
+        cache_dir: Optional directory of the partitioned cache, see `PartitionedStore`.
+        max_workers: Maximum number of identifiers fetched at the same time.
+        timeout: Per request timeout in seconds, passed to the history provider.
+        max_retries: Number of retries per identifier after the first attempt.
+        backoff: Base delay in seconds between retries, doubled on every retry.
+        history_provider: Callable returning the history of one identifier.
+            Defaults to Yahoo Finance; can be stubbed for offline runs.
+        incremental: Only fetch missing days on top of the cache in `cache_dir`.
+        restatement_tolerance: Relative difference on the Close of the bar
+            before the last cached one above which the cached history is
+            considered restated.
+    """
+
+    def __init__(
+            self,
+            identifiers: list[str],
+            period: str = "2y",
+            cache_dir: str | None = None,
+            max_workers: int = 1,
+            timeout: float = 10.0,
+            max_retries: int = 2,
+            backoff: float = 0.5,
+            history_provider: HistoryProvider = yfinance_history,
+            incremental: bool = False,
+            restatement_tolerance: float = 1e-4,
+    ) -> None:
         super().__init__(cache_dir)
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if incremental and not cache_dir:
+            raise ValueError("incremental mode requires a cache_dir")
         self.identifiers=identifiers
         self.period = period
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.history_provider = history_provider
+        self.incremental = incremental
+        self.restatement_tolerance = restatement_tolerance
+        self.last_result: FetchResult | None = None
 
     def fetch(self) -> pd.DataFrame:
-        """Fetch data for all identifiers and return combined DataFrame"""    
-        logger.info(f"Fetching data for {self.identifiers} (period={self.period})")
+        """Fetch data for all identifiers and return combined DataFrame
+
+        Per identifier failures are available afterwards in `last_result`.
+        """
+        return self.scan().collect().to_pandas()
+
+    def scan(self) -> pl.LazyFrame:
+        """Fetch data for all identifiers and return it as a lazy frame
+
+        With a cache the frame is scanned from the partitioned store.
+        """
+        result = self.fetch_all()
+
+        if result.data is None:
+            raise ValueError("No data fethed for any identifier")
+
+        return result.data
+
+    def scan_batches(self, batch_size: int) -> Iterator[pl.LazyFrame]:
+        """Fetch data for all identifiers and yield scans of `batch_size` identifiers, in identifier order
+
+        With a cache each batch only opens the partitions of its identifiers.
+        """
+        result = self.fetch_all()
+        if result.data is None:
+            raise ValueError("No data fethed for any identifier")
+
+        store = self._store("stocks")
+        if store is None:
+            yield from super().scan_batches(batch_size)
+            return
+
+        succeeded = sorted(i for i in self.identifiers if i not in result.failed_identifiers)
+        for offset in range(0, len(succeeded), batch_size):
+            yield store.scan(succeeded[offset:offset + batch_size])
+
+    def fetch_all(self) -> FetchResult:
+        """Fetch every identifier concurrently and collect a structured result.
+
+        Each identifier is written to the cache as soon as it arrives, so only
+        the identifiers in flight are held in memory.
+
+        Returns:
+            FetchResult: Scan of the combined data (in the order of `identifiers`), failures and latencies.
+        """
+        store = self._store("stocks")
+        anchors = self._last_cached_rows(store) if self.incremental else {}
+
+        logger.info(
+            f"Fetching data for {len(self.identifiers)} identifiers "
+            f"(period={self.period}, max_workers={self.max_workers}, "
+            f"incremental={self.incremental}, cached={len(anchors)})"
+        )
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            outcomes = list(pool.map(lambda i: self._fetch_one(i, anchors.get(i), store), self.identifiers))
 
-        # Start to load consecutevely each stock data
-        all_data = []
+        result = FetchResult(data=None)
+        succeeded = []
+        for identifier, outcome in zip(self.identifiers, outcomes, strict=True):
+            result.latencies[identifier] = outcome.latency
+            result.rows_fetched += outcome.rows_fetched
+            if outcome.failure is not None:
+                result.failures.append(outcome.failure)
+                continue
+            if outcome.full_refresh and self.incremental:
+                result.full_refreshes.append(identifier)
+            succeeded.append(identifier)
 
-        for identifier in self.identifiers:
+        if result.failures:
+            logger.warning(f"Failed to fetch {len(result.failures)} identifiers: {result.failed_identifiers}")
+
+        if succeeded:
+            logger.info(
+                f"Fetched {result.rows_fetched} rows from {len(succeeded)} assets "
+                f"({len(result.full_refreshes)} full refreshes)"
+            )
+            if store is not None:
+                result.data = store.scan(succeeded)
+            else:
+                frames = [outcome.data for outcome in outcomes if outcome.data is not None]
+                result.data = pl.concat(frames, how="diagonal_relaxed").lazy()
+
+        self.last_result = result
+        return result
+
+    def _last_cached_rows(self, store: PartitionedStore) -> dict[str, pd.DataFrame]:
+        """Last two cached rows (by Date) of every requested identifier in the cache, oldest first."""
+        last = store.last_rows(self.identifiers, n=2)
+        if last.is_empty():
+            return {}
+        return {
+            identifier: rows.reset_index(drop=True)
+            for identifier, rows in last.to_pandas().groupby("identifier", sort=False)
+        }
+
+    def _fetch_one(
+            self,
+            identifier: str,
+            anchor: pd.DataFrame | None,
+            store: PartitionedStore | None,
+    ) -> _Outcome:
+        """Fetch a single identifier and write it to the cache."""
+        start = time.perf_counter()
+        df, failure, rows, full_refresh = self._download(identifier, anchor)
+        if df is None:
+            return _Outcome(None, failure, time.perf_counter() - start, rows, full_refresh)
+
+        frame = pl.from_pandas(df.reset_index())
+        if store is not None:
+            if full_refresh:
+                store.replace(frame)
+            else:
+                store.append(frame)
+            frame = None
+        return _Outcome(frame, None, time.perf_counter() - start, rows, full_refresh)
+
+    def _download(
+            self,
+            identifier: str,
+            anchor: pd.DataFrame | None,
+    ) -> tuple[pd.DataFrame | None, FetchFailure | None, int, bool]:
+        """Download an identifier, as a delta from the first of the `anchor` rows if given.
+
+        Returns:
+            tuple: The data, the failure, the number of rows downloaded and
+                whether the data is the full history.
+        """
+        if anchor is None:
+            df, failure = self._fetch_with_retries(identifier, period=self.period, start=None)
+            return df, failure, 0 if df is None else len(df), True
+
+        df, failure = self._fetch_with_retries(identifier, period=None, start=anchor["Date"].iloc[0])
+        rows = 0 if df is None else len(df)
+        if df is None or not self._is_restated(df, anchor):
+            return df, failure, rows, False
+
+        logger.info(f"History of {identifier} was restated, fetching full period")
+        df, failure = self._fetch_with_retries(identifier, period=self.period, start=None)
+        rows += 0 if df is None else len(df)
+        return df, failure, rows, True
+
+    def _is_restated(self, delta: pd.DataFrame, anchor: pd.DataFrame) -> bool:
+        """Check whether a delta invalidates the cached history before it.
+
+        Only the bars before the last cached one are compared: the last one
+        may be a partial bar, cached during the trading day, which the delta
+        replaces.
+
+        Args:
+            delta: Fetched rows starting at the first anchor date.
+            anchor: Last cached rows of the identifier, oldest first.
+        """
+        for _, cached in anchor.iloc[:-1].iterrows():
+            overlap = delta[delta.index == cached["Date"]]
+            if overlap.empty:
+                return True
+            fetched_close = overlap["Close"].iloc[0]
+            if abs(fetched_close - cached["Close"]) > self.restatement_tolerance * abs(cached["Close"]):
+                return True
+
+        last = anchor.iloc[-1]
+        actions = [c for c in ("Dividends", "Stock Splits") if c in delta.columns]
+        new_rows = delta[delta.index > last["Date"]]
+        if (new_rows[actions] != 0).any().any():
+            return True
+        # An action that showed up on the last cached bar after it was cached
+        refetched = delta[delta.index == last["Date"]]
+        return any((refetched[c] != last.get(c, 0.0)).any() for c in actions)
+
+    def _fetch_with_retries(
+            self,
+            identifier: str,
+            period: str | None,
+            start: pd.Timestamp | None,
+    ) -> tuple[pd.DataFrame | None, FetchFailure | None]:
+        """Call the history provider, retrying with exponential backoff."""
+        attempts = self.max_retries + 1
+
+        attempt = 0
+        while True:
+            attempt += 1
             try:
-                logger.debug(f"Fetching {identifier}...")
-                tk = yf.Ticker(identifier)
-                df = tk.history(period=self.period, interval="1d", rounding=True)
+                logger.debug(f"Fetching {identifier} (attempt {attempt}/{attempts})...")
+                df = self.history_provider(identifier, period, start, self.timeout)
 
                 # Add identifier column to distinguish stocks
                 df["identifier"] = identifier
-                all_data.append(df)
                 logger.debug(f"Fetched {identifier}: {len(df)} rows")
+                return df, None
 
             except Exception as e:
-                logger.error(f"Failed to fetch {identifier}: {e}")
-            
-        if not all_data:
-            raise ValueError("No data fethed for any identifier")
-        
-        # Combine all data into one DataFrame
-        combined_df = pd.concat(all_data, ignore_index=False)
-        combined_df = combined_df.reset_index()
+                if attempt == attempts:
+                    logger.error(f"Failed to fetch {identifier} after {attempts} attempts: {e}")
+                    return None, FetchFailure(identifier=identifier, error=str(e), attempts=attempts)
+                logger.warning(f"Failed to fetch {identifier} (attempt {attempt}/{attempts}), retrying: {e}")
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+
+
+class ReplayFetcher(BaseFetcher):
+    """Fetcher replaying previously stored data, e.g. for offline runs and benchmarks
+
+    The source can be a `PartitionedStore` directory (such as the cache of
+    YFinanceFetcher), a parquet file, directory or glob, or a CSV file. It is
+    scanned lazily, so identifier and date filters are pushed down to the
+    reader. Replaying up to an `end` date reproduces the data as it was on
+    that day.
+
+    Args:
+        path: Source of the data.
+        identifiers: Identifiers to replay, all of them if None.
+        start: Inclusive lower bound on the Date column.
+        end: Inclusive upper bound on the Date column.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            identifiers: list[str] | None = None,
+            start: date | datetime | None = None,
+            end: date | datetime | None = None,
+    ) -> None:
+        super().__init__(cache_dir=None)
+        self.path = path
+        self.identifiers = identifiers
+        self.start = start
+        self.end = end
+
+    def fetch(self) -> pd.DataFrame:
+        return self.scan().collect().to_pandas()
+
+    def scan(self) -> pl.LazyFrame:
+        path = Path(self.path)
+        store = PartitionedStore(path)
+        if path.is_dir() and store.identifiers():
+            return store.scan(self.identifiers, self.start, self.end)
+
+        if path.suffix == ".csv":
+            data = pl.scan_csv(path, try_parse_dates=True)
+        else:
+            data = pl.scan_parquet(path / "*.parquet" if path.is_dir() else path)
+
+        if self.identifiers is not None:
+            data = data.filter(pl.col("identifier").is_in(self.identifiers))
+        dtype = data.collect_schema()["Date"]
+        if self.start is not None:
+            data = data.filter(pl.col("Date") >= date_literal(self.start, dtype))
+        if self.end is not None:
+            data = data.filter(pl.col("Date") <= date_literal(self.end, dtype))
+        return data
+
+
+class SyntheticFetcher(BaseFetcher):
+    """Fetcher generating a deterministic universe of daily OHLCV bars
+
+    Produces the same columns as YFinanceFetcher, for benchmarking and load
+    testing without network access. Prices follow a geometric random walk
+    with a drift and volatility drawn per identifier. Bars fall on business
+    days minus market holidays shared by all identifiers; some identifiers
+    are listed after the start, and single days are randomly missing (e.g.
+    trading halts).
+
+    Every identifier is generated from its own seed, so an identifier's bars
+    do not depend on the size of the universe or on the batch it is in.
+
+    Args:
+        n_identifiers: Number of identifiers, named SYN00000, SYN00001, ...
+        n_days: Number of business days in the calendar.
+        start: First day of the calendar.
+        seed: Seed of the whole universe.
+        holidays_per_year: Number of market holidays per year.
+        missing_rate: Probability of a single bar missing.
+        late_listing_rate: Share of identifiers listed after the start of the calendar.
+    """
+
+    def __init__(
+            self,
+            n_identifiers: int,
+            n_days: int,
+            start: str = "2015-01-02",
+            seed: int = 0,
+            holidays_per_year: int = 9,
+            missing_rate: float = 0.002,
+            late_listing_rate: float = 0.1,
+    ) -> None:
+        super().__init__(cache_dir=None)
+        self.n_identifiers = n_identifiers
+        self.n_days = n_days
+        self.start = start
+        self.seed = seed
+        self.holidays_per_year = holidays_per_year
+        self.missing_rate = missing_rate
+        self.late_listing_rate = late_listing_rate
+
+    @property
+    def identifiers(self) -> list[str]:
+        return [f"SYN{i:05d}" for i in range(self.n_identifiers)]
+
+    def fetch(self) -> pd.DataFrame:
+        return self.scan().collect().to_pandas()
+
+    def scan(self) -> pl.LazyFrame:
+        return self.generate(range(self.n_identifiers)).lazy()
+
+    def scan_batches(self, batch_size: int) -> Iterator[pl.LazyFrame]:
+        """Generate `batch_size` identifiers at a time, so only one batch is held in memory."""
+        for offset in range(0, self.n_identifiers, batch_size):
+            yield self.generate(range(offset, min(offset + batch_size, self.n_identifiers))).lazy()
+
+    def calendar(self) -> pd.DatetimeIndex:
+        """Trading days: business days without the market holidays."""
+        days = pd.bdate_range(self.start, periods=self.n_days, name="Date", tz="America/New_York")
+        rng = np.random.default_rng([self.seed, 0])
+        n_holidays = round(self.holidays_per_year * self.n_days / 252)
+        holidays = rng.choice(self.n_days, size=min(n_holidays, self.n_days - 1), replace=False)
+        return days.delete(holidays)
+
+    def generate(self, indices: range) -> pl.DataFrame:
+        """Bars of the identifiers at `indices`, sorted by identifier and date."""
+        calendar = pl.Series("Date", self.calendar())
+        frames = [self._generate_one(index, calendar) for index in indices]
+        return pl.concat(frames) if frames else pl.DataFrame()
+
+    def _generate_one(self, index: int, calendar: pl.Series) -> pl.DataFrame:
+        rng = np.random.default_rng([self.seed, 1, index])
+        n_days = len(calendar)
 
-        logger.info(f"Combined data: {len(combined_df)} rows from {len(all_data)} assets")
+        # Listing day and bars missing from then on
+        listed = 0
+        if rng.random() < self.late_listing_rate:
+            listed = int(rng.integers(0, n_days - 1))
+        keep = rng.random(n_days) >= self.missing_rate
+        keep[:listed] = False
+        keep[listed] = True
 
-        # Write data
-        self._write_data(data=combined_df, source_name="stocks")
+        volatility = rng.uniform(0.01, 0.04)
+        drift = rng.normal(0.0003, 0.0005)
+        returns = rng.normal(drift - volatility ** 2 / 2, volatility, n_days)
+        close = rng.uniform(10, 500) * np.exp(np.cumsum(returns))
+        open_ = close * np.exp(-returns + rng.normal(0, volatility / 4, n_days))
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, volatility / 2, n_days)))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, volatility / 2, n_days)))
+        volume = rng.lognormal(14, 1, n_days).astype(np.int64)
 
-        return combined_df
-    
\ No newline at end of file
+        return pl.DataFrame({
+            "Date": calendar.filter(keep),
+            "Open": np.round(open_[keep], 2),
+            "High": np.round(high[keep], 2),
+            "Low": np.round(low[keep], 2),
+            "Close": np.round(close[keep], 2),
+            "Volume": volume[keep],
+            "Dividends": 0.0,
+            "Stock Splits": 0.0,
+            "identifier": f"SYN{index:05d}",
+        })
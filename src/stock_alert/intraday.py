@@ -0,0 +1,424 @@
+"""Intraday streaming mode: bars are consumed as they arrive, in micro-batches.
+
+A `StreamingPipeline` polls a `BarSource` for new bars, groups them into
+micro-batches bounded in size and delay, updates the features of every bar
+from their streaming states (see `stock_alert.features.streaming`) and
+evaluates the alert rules on the identifiers of the batch. Every batch is
+written to its own parquet file next to the master table, and the batch
+files are periodically compacted into master_table.parquet.
+"""
+import json
+import os
+import time
+from collections.abc import Mapping, Sequence
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Protocol
+import polars as pl
+from common.logger import logger
+from stock_alert.features.feature_base import FeatureEngine
+from stock_alert.features.streaming import StreamingEngine
+from stock_alert.metrics import StreamMetrics
+from stock_alert.schema import MasterSchema
+from stock_alert.transformer import Transformer
+
+if TYPE_CHECKING:
+    from stock_alert.alerts import AlertEngine
+    from stock_alert.features import Feature
+
+_PARTS_DIRECTORY = ".stream"
+
+
+class BarSource(Protocol):
+    """Source of bars, e.g. a feed handler, a socket or a file being appended to."""
+    def poll(self, timeout: float, limit: int) -> list[dict[str, Any]]:
+        """Returns up to `limit` new bars, waiting up to `timeout` seconds for the first one.
+
+        Every bar maps column names (identifier, date, OHLCV, ...) to values;
+        an empty list means no bar arrived in time.
+        """
+        ...
+
+
+class FileTailSource:
+    """Bars appended to a file as JSON lines, e.g. {"identifier": "AAPL", "Date": "...", "Close": 1.0}.
+
+    The file is tailed from the start (or from its current end with
+    `from_end`); a line is only read once complete. Dates are parsed from
+    ISO 8601 strings.
+
+    Args:
+        path: File the bars are appended to, may not exist yet.
+        date_column: Column holding the date of a bar.
+        poll_interval: Seconds between two reads while waiting for new lines.
+        from_end: Skip the bars already in the file.
+    """
+    def __init__(self,
+                 path: str,
+                 date_column: str = "Date",
+                 poll_interval: float = 0.01,
+                 from_end: bool = False) -> None:
+        self.path = Path(path)
+        self.date_column = date_column
+        self.poll_interval = poll_interval
+        self.offset = self.path.stat().st_size if from_end and self.path.exists() else 0
+
+    def poll(self, timeout: float, limit: int) -> list[dict[str, Any]]:
+        deadline = time.monotonic() + timeout
+        while True:
+            bars = self._read(limit)
+            remaining = deadline - time.monotonic()
+            if bars or remaining <= 0:
+                return bars
+            time.sleep(min(self.poll_interval, remaining))
+
+    def _read(self, limit: int) -> list[dict[str, Any]]:
+        if not self.path.exists():
+            return []
+        if self.path.stat().st_size < self.offset:
+            logger.warning(f"{self.path} was truncated, reading it from the start")
+            self.offset = 0
+
+        bars = []
+        with self.path.open("rb") as file:
+            file.seek(self.offset)
+            while len(bars) < limit:
+                line = file.readline()
+                # A line without its newline is still being written
+                if not line.endswith(b"\n"):
+                    break
+                self.offset += len(line)
+                if line.strip():
+                    bars.append(self._parse(line))
+        return bars
+
+    def _parse(self, line: bytes) -> dict[str, Any]:
+        bar = json.loads(line)
+        if isinstance(bar.get(self.date_column), str):
+            bar[self.date_column] = datetime.fromisoformat(bar[self.date_column])
+        return bar
+
+
+class StreamingPipeline:
+    """Long-running pipeline updating the features and alerts of every new bar.
+
+    On start, the streaming states of the features are warmed up by
+    replaying the last `FeatureEngine.lookback` rows of every identifier in
+    the master table (and in the batches not compacted yet), or its whole
+    history if a feature depends on all of it (e.g. an exponential moving
+    average), so the features of new bars continue that history. Bars
+    are then read from the source and processed in micro-batches of up to
+    `max_batch_size` bars, a batch being closed at most `max_batch_delay`
+    seconds after its first bar arrived: the end-to-end latency of a bar is
+    bounded by that delay plus the processing time of its batch.
+
+    Bars that are not newer than the last bar of their identifier (e.g.
+    replayed or out of order) are dropped. Only features with a streaming
+    state are computed; other feature columns of the master table are null
+    on streamed rows until the next batch run recomputes them.
+
+    With an `alert_engine`, the rules are evaluated on the latest bars of the
+    identifiers in each batch, e.g. edge-triggered with its state store.
+
+    A compaction only sorts and deduplicates the rows of the identifiers
+    found in the batches; the rows of the other identifiers are copied from
+    the master table as they are, although the file is still rewritten.
+
+    Args:
+        source: Source of the bars.
+        features: Features to compute, all providing a `Feature.state`.
+        master_table_directory: Directory of master_table.parquet.
+        alert_engine: Rules evaluated after every batch.
+        transformers: Row-wise transforms applied to the features, in order.
+        max_batch_size: Maximum number of bars per micro-batch.
+        max_batch_delay: Seconds a micro-batch waits for more bars after its first one.
+        compaction_interval: Seconds between two compactions of the batches into the master table.
+        metrics_path: JSON file the counters are written to after every compaction.
+        prometheus_path: File the counters are written to in the Prometheus text format.
+        identifier_column: Column identifying each asset.
+        date_column: Column ordering the rows of an asset.
+        schema: Stored dtypes and parquet layout of the compacted master table.
+    """
+    def __init__(self,
+                 source: BarSource,
+                 features: Sequence["Feature"],
+                 master_table_directory: str,
+                 alert_engine: "AlertEngine | None" = None,
+                 transformers: Sequence[Transformer] = (),
+                 max_batch_size: int = 1000,
+                 max_batch_delay: float = 0.1,
+                 compaction_interval: float = 300.0,
+                 metrics_path: str | None = None,
+                 prometheus_path: str | None = None,
+                 identifier_column: str = "identifier",
+                 date_column: str = "Date",
+                 schema: MasterSchema | None = None) -> None:
+        self.source = source
+        self.engine = StreamingEngine(features)
+        # Rows of history every state needs to continue it, all of them if None
+        self.lookback = FeatureEngine(features).lookback
+        self.feature_names = [feature.name for feature in features]
+        self.master_table_directory = Path(master_table_directory)
+        self.alert_engine = alert_engine
+        self.transformers = list(transformers)
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+        self.compaction_interval = compaction_interval
+        self.metrics_path = metrics_path
+        self.prometheus_path = prometheus_path
+        self.identifier_column = identifier_column
+        self.date_column = date_column
+        self.master_schema = schema
+        self.metrics = StreamMetrics()
+        # Dtypes of the stored history, which the bars are cast to
+        self.schema: pl.Schema | None = None
+        # Latest rows of every identifier, read by the alert rules
+        self.recent: pl.DataFrame | None = None
+        self.last_dates: dict[Any, Any] = {}
+        self._next_part = 0
+        self._started: float | None = None
+
+    @property
+    def master_table_path(self) -> Path:
+        return self.master_table_directory / "master_table.parquet"
+
+    @property
+    def parts_directory(self) -> Path:
+        return self.master_table_directory / _PARTS_DIRECTORY
+
+    def start(self) -> None:
+        """Warm up the feature states from the stored history, once before the first batch."""
+        if self._started is not None:
+            return
+        self._started = time.perf_counter()
+        identifier, date = self.identifier_column, self.date_column
+
+        parts = self._parts()
+        self._next_part = int(parts[-1].stem.split("-")[1]) + 1 if parts else 0
+        history = self._history(parts)
+        if history is None:
+            logger.info("No history to warm up from, starting the stream from scratch")
+            return
+
+        history = history.sort(identifier, date)
+        if self.lookback is not None:
+            n_rows = max(self.lookback, self._recent_rows(), 1)
+            history = history.group_by(identifier, maintain_order=True).tail(n_rows)
+        history = history.collect()
+        self.schema = history.schema
+        self.last_dates = dict(history.group_by(identifier).agg(pl.col(date).last()).iter_rows())
+        self.recent = self._latest(history)
+
+        # The states are rebuilt from the inputs, not from the stored feature values
+        inputs = history.drop([name for name in self.feature_names if name in history.columns])
+        if self.lookback is not None:
+            inputs = inputs.group_by(identifier, maintain_order=True).tail(self.lookback)
+        for row in inputs.iter_rows(named=True):
+            self.engine.update(row[identifier], row)
+        logger.info(f"Warmed up the features of {len(self.last_dates)} identifiers from {inputs.height} rows")
+
+    def run(self, duration: float | None = None) -> None:
+        """Process bars until `duration` seconds elapsed (forever if None) or the run is interrupted.
+
+        The batches are compacted every `compaction_interval` seconds and once more on exit.
+        """
+        self.start()
+        end = None if duration is None else time.perf_counter() + duration
+        last_compaction = time.perf_counter()
+        try:
+            while end is None or time.perf_counter() < end:
+                alerts = self.step()
+                for alert in alerts.iter_rows(named=True):
+                    logger.warning(
+                        f"🚨 {alert[self.identifier_column]} on {alert[self.date_column]}: {alert['rule']}"
+                    )
+                if time.perf_counter() - last_compaction >= self.compaction_interval:
+                    self.compact()
+                    last_compaction = time.perf_counter()
+        except KeyboardInterrupt:
+            logger.info("Stream interrupted")
+        finally:
+            self.compact()
+
+    def step(self) -> pl.DataFrame:
+        """Read and process one micro-batch, empty if no bar arrived within `max_batch_delay`.
+
+        Returns:
+            pl.DataFrame: The alerts triggered by the batch, see `AlertEngine.evaluate`.
+        """
+        self.start()
+        bars, received = [], []
+        deadline = None
+        while len(bars) < self.max_batch_size:
+            timeout = self.max_batch_delay if deadline is None else deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            new = self.source.poll(timeout, self.max_batch_size - len(bars))
+            now = time.perf_counter()
+            if not new:
+                break
+            if deadline is None:
+                deadline = now + self.max_batch_delay
+            bars += new
+            received += [now] * len(new)
+        return self.process(bars, received)
+
+    def process(self, bars: Sequence[Mapping[str, Any]], received: Sequence[float] | None = None) -> pl.DataFrame:
+        """Compute the features of a micro-batch, save it and evaluate the alerts on it.
+
+        Args:
+            bars: Bars in arrival order.
+            received: `time.perf_counter` at which each bar was read, for the latency counters.
+
+        Returns:
+            pl.DataFrame: The alerts triggered by the batch.
+        """
+        self.start()
+        if not bars:
+            self._update_seconds()
+            return pl.DataFrame()
+
+        identifier, date = self.identifier_column, self.date_column
+        rows = self._conform(pl.from_dicts(bars, infer_schema_length=None))
+
+        kept, values = [], {name: [] for name in self.feature_names}
+        for row in rows.iter_rows(named=True):
+            last = self.last_dates.get(row[identifier])
+            if last is not None and row[date] <= last:
+                kept.append(False)
+                continue
+            self.last_dates[row[identifier]] = row[date]
+            kept.append(True)
+            for name, value in self.engine.update(row[identifier], row).items():
+                values[name].append(value)
+
+        batch = rows.filter(pl.Series(kept, dtype=pl.Boolean)).with_columns(
+            pl.Series(name, column, dtype=pl.Float64) for name, column in values.items()
+        )
+        batch = self._conform(self._apply_transformers(batch.lazy()).collect())
+        alerts = pl.DataFrame()
+        if batch.height:
+            self._save_part(batch)
+            alerts = self._evaluate(batch)
+
+        done = time.perf_counter()
+        self.metrics.bars += batch.height
+        self.metrics.late_bars += rows.height - batch.height
+        self.metrics.batches += 1
+        self.metrics.alerts += alerts.height
+        if received is not None:
+            self.metrics.record_latencies(done - start for start in received)
+        self._update_seconds()
+        return alerts
+
+    def compact(self) -> None:
+        """Merge the saved batches into the master table, which is replaced atomically."""
+        parts = self._parts()
+        if parts:
+            data = self._merged(parts)
+            if self.master_schema is not None:
+                self.master_schema.write(data, self.master_table_path, sort=False)
+            else:
+                self.master_table_directory.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.master_table_path.with_suffix(".tmp")
+                data.sink_parquet(tmp_path)
+                os.replace(tmp_path, self.master_table_path)
+            for part in parts:
+                part.unlink()
+            self.metrics.compactions += 1
+            logger.info(f"Compacted {len(parts)} batches into {self.master_table_path}")
+
+        self._update_seconds()
+        logger.info(
+            f"Stream: {self.metrics.bars} bars in {self.metrics.batches} batches, "
+            f"{self.metrics.throughput:.1f} bars/s, latency p50={self.metrics.latency(0.5)} "
+            f"p99={self.metrics.latency(0.99)}"
+        )
+        if self.metrics_path:
+            self.metrics.write_json(self.metrics_path)
+        if self.prometheus_path:
+            self.metrics.write_prometheus(self.prometheus_path)
+
+    def _parts(self) -> list[Path]:
+        return sorted(self.parts_directory.glob("part-*.parquet"))
+
+    def _history(self, parts: Sequence[Path]) -> pl.LazyFrame | None:
+        """The master table followed by the saved batches, None if there is neither."""
+        frames = [pl.scan_parquet(path) for path in [self.master_table_path, *parts] if path.exists()]
+        if not frames:
+            return None
+        # A batch compacted already (e.g. on a crash during compaction) replaces its rows
+        return (
+            pl.concat(frames, how="diagonal_relaxed")
+            .unique([self.identifier_column, self.date_column], keep="last", maintain_order=True)
+        )
+
+    def _merged(self, parts: Sequence[Path]) -> pl.LazyFrame:
+        """The master table with the saved batches merged in, sorted by identifier and date.
+
+        Only the identifiers of the batches are deduplicated and sorted; the
+        other rows are merged in from the sorted master table as they are.
+        The whole history is sorted again if the batches changed the columns.
+        """
+        identifier, date = self.identifier_column, self.date_column
+        history = self._history(parts)
+        if not self.master_table_path.exists():
+            return history.sort(identifier, date)
+
+        master = pl.scan_parquet(self.master_table_path)
+        batches = pl.concat([pl.scan_parquet(part) for part in parts], how="diagonal_relaxed")
+        if batches.collect_schema() != master.collect_schema():
+            return history.sort(identifier, date)
+
+        touched = batches.select(pl.col(identifier).unique()).collect().to_series().implode()
+        updated = (
+            pl.concat([master.filter(pl.col(identifier).is_in(touched)), batches])
+            .unique([identifier, date], keep="last", maintain_order=True)
+            .sort(identifier, date)
+        )
+        return master.filter(~pl.col(identifier).is_in(touched)).merge_sorted(updated, identifier)
+
+    def _conform(self, data: pl.DataFrame) -> pl.DataFrame:
+        """Cast the columns of `data` to the dtypes of the stored history, e.g. dates to its time zone."""
+        if self.schema is None:
+            self.schema = data.schema
+            return data
+        return data.cast({column: dtype for column, dtype in self.schema.items() if column in data.columns})
+
+    def _apply_transformers(self, data: pl.LazyFrame) -> pl.LazyFrame:
+        for transformer in self.transformers:
+            data = transformer.transform(data)
+        return data
+
+    def _latest(self, data: pl.DataFrame) -> pl.DataFrame:
+        """Latest rows of every identifier that the alert rules may read."""
+        if self.alert_engine is None:
+            return data.clear()
+        return data.group_by(self.identifier_column, maintain_order=True).tail(self._recent_rows())
+
+    def _recent_rows(self) -> int:
+        """Rows per identifier the alert rules read, none without rules."""
+        if self.alert_engine is None:
+            return 0
+        return 1 + max(rule.lookback for rule in self.alert_engine.rules)
+
+    def _evaluate(self, batch: pl.DataFrame) -> pl.DataFrame:
+        """Evaluate the rules on the identifiers of the batch."""
+        if self.alert_engine is None:
+            return pl.DataFrame()
+        identifier, date = self.identifier_column, self.date_column
+        recent = batch if self.recent is None else pl.concat([self.recent, batch], how="diagonal_relaxed")
+        self.recent = self._latest(recent.sort(identifier, date))
+        updated = self.recent.filter(pl.col(identifier).is_in(batch[identifier].implode()))
+        return self.alert_engine.evaluate(updated.lazy())
+
+    def _save_part(self, batch: pl.DataFrame) -> None:
+        self.parts_directory.mkdir(parents=True, exist_ok=True)
+        path = self.parts_directory / f"part-{self._next_part:08d}.parquet"
+        tmp_path = path.with_suffix(".tmp")
+        batch.write_parquet(tmp_path)
+        os.replace(tmp_path, path)
+        self._next_part += 1
+
+    def _update_seconds(self) -> None:
+        self.metrics.seconds = time.perf_counter() - self._started
@@ -0,0 +1,228 @@
+"""Per-stage metrics of pipeline runs and counters of streaming runs, exported as JSON or Prometheus text."""
+import json
+import os
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def peak_rss_bytes() -> int | None:
+    """Peak resident memory of the process so far, None if unknown."""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@dataclass
+class StageMetrics:
+    """Measurements of one pipeline stage.
+
+    Attributes:
+        name: Name of the stage, e.g. "fetch".
+        seconds: Wall time of the stage.
+        rows: Rows produced by the stage, if known.
+        bytes_written: Bytes written to disk by the stage, if any.
+        peak_rss_bytes: Peak memory of the process at the end of the stage.
+    """
+    name: str
+    seconds: float = 0.0
+    rows: int | None = None
+    bytes_written: int | None = None
+    peak_rss_bytes: int | None = None
+
+
+@dataclass
+class RunReport:
+    """Machine-readable report of a pipeline run.
+
+    Attributes:
+        started_at: Start of the run, ISO 8601 in UTC.
+        status: "running", "succeeded" or "failed".
+        error: Error that failed the run.
+        seconds: Wall time of the whole run.
+        stages: Metrics of every stage, in order.
+        fetch_latencies: Seconds spent fetching each identifier, if the fetcher reports them.
+        fetch_failures: Identifiers that could not be fetched.
+        query_plan: Optimized Polars plan of the transformation, when profiling.
+        profile: Start and end (in microseconds) of every node of the plan, when profiling.
+    """
+    started_at: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    status: str = "running"
+    error: str | None = None
+    seconds: float = 0.0
+    stages: list[StageMetrics] = field(default_factory=list)
+    fetch_latencies: dict[str, float] = field(default_factory=dict)
+    fetch_failures: list[str] = field(default_factory=list)
+    query_plan: str | None = None
+    profile: list[dict] | None = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageMetrics]:
+        """Measures the stage run in the `with` block, also if it fails."""
+        metrics = StageMetrics(name=name)
+        self.stages.append(metrics)
+        start = time.perf_counter()
+        try:
+            yield metrics
+        finally:
+            metrics.seconds = time.perf_counter() - start
+            metrics.peak_rss_bytes = peak_rss_bytes()
+
+    def write_json(self, path: str) -> None:
+        """Writes the report as JSON."""
+        _write_atomically(Path(path), json.dumps(asdict(self), indent=2))
+
+    def write_prometheus(self, path: str) -> None:
+        """Writes the report in the Prometheus text format, e.g. for the node exporter textfile collector."""
+        _write_atomically(Path(path), self.to_prometheus())
+
+    def to_prometheus(self) -> str:
+        metrics = {
+            "stage_seconds": ("Wall time of a pipeline stage", "seconds"),
+            "stage_rows": ("Rows produced by a pipeline stage", "rows"),
+            "stage_bytes_written": ("Bytes written by a pipeline stage", "bytes_written"),
+            "stage_peak_rss_bytes": ("Peak memory of the process at the end of a pipeline stage", "peak_rss_bytes"),
+        }
+        lines = []
+        for metric, (description, attribute) in metrics.items():
+            lines += [f"# HELP stock_alert_{metric} {description}", f"# TYPE stock_alert_{metric} gauge"]
+            for stage in self.stages:
+                value = getattr(stage, attribute)
+                if value is not None:
+                    lines.append(f'stock_alert_{metric}{{stage="{_escape(stage.name)}"}} {value}')
+
+        lines += [
+            "# HELP stock_alert_fetch_latency_seconds Wall time spent fetching an identifier",
+            "# TYPE stock_alert_fetch_latency_seconds gauge",
+        ]
+        lines += [
+            f'stock_alert_fetch_latency_seconds{{identifier="{_escape(identifier)}"}} {latency}'
+            for identifier, latency in self.fetch_latencies.items()
+        ]
+        started_at = datetime.fromisoformat(self.started_at).timestamp()
+        lines += [
+            "# HELP stock_alert_fetch_failures Identifiers that could not be fetched",
+            "# TYPE stock_alert_fetch_failures gauge",
+            f"stock_alert_fetch_failures {len(self.fetch_failures)}",
+            "# HELP stock_alert_run_seconds Wall time of the pipeline run",
+            "# TYPE stock_alert_run_seconds gauge",
+            f"stock_alert_run_seconds {self.seconds}",
+            "# HELP stock_alert_run_success Whether the pipeline run succeeded",
+            "# TYPE stock_alert_run_success gauge",
+            f"stock_alert_run_success {int(self.status == 'succeeded')}",
+            "# HELP stock_alert_run_started_seconds Start of the pipeline run, as a Unix timestamp",
+            "# TYPE stock_alert_run_started_seconds gauge",
+            f"stock_alert_run_started_seconds {started_at}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+@dataclass
+class StreamMetrics:
+    """Counters of a streaming run, exported as JSON or Prometheus text.
+
+    Latencies are measured from the moment a bar is read from its source to
+    the end of the micro-batch it is in (features, alerts and write), over
+    the last `window` bars.
+
+    Attributes:
+        started_at: Start of the run, ISO 8601 in UTC.
+        bars: Bars processed.
+        late_bars: Bars dropped as not newer than the last bar of their identifier.
+        batches: Micro-batches processed.
+        alerts: Alerts triggered.
+        compactions: Compactions of the micro-batches into the master table.
+        seconds: Wall time of the run so far.
+        window: Number of recent bars the latency quantiles are computed over.
+    """
+    started_at: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    bars: int = 0
+    late_bars: int = 0
+    batches: int = 0
+    alerts: int = 0
+    compactions: int = 0
+    seconds: float = 0.0
+    window: int = 10_000
+    latencies: deque[float] = field(default_factory=deque, repr=False)
+
+    def __post_init__(self) -> None:
+        self.latencies = deque(self.latencies, maxlen=self.window)
+
+    def record_latencies(self, latencies: Iterable[float]) -> None:
+        self.latencies.extend(latencies)
+
+    @property
+    def throughput(self) -> float:
+        """Bars processed per second of the run."""
+        return self.bars / self.seconds if self.seconds else 0.0
+
+    def latency(self, quantile: float) -> float | None:
+        """Latency quantile (nearest rank) in seconds, e.g. 0.99, None before the first bar."""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(quantile * len(ordered)), len(ordered) - 1)]
+
+    def to_dict(self) -> dict:
+        counters = {name: value for name, value in asdict(self).items() if name != "latencies"}
+        return {
+            **counters,
+            "throughput_bars_per_second": self.throughput,
+            "latency_p50_seconds": self.latency(0.5),
+            "latency_p99_seconds": self.latency(0.99),
+        }
+
+    def write_json(self, path: str) -> None:
+        _write_atomically(Path(path), json.dumps(self.to_dict(), indent=2))
+
+    def write_prometheus(self, path: str) -> None:
+        _write_atomically(Path(path), self.to_prometheus())
+
+    def to_prometheus(self) -> str:
+        lines = []
+        counters = {
+            "bars": "Bars processed",
+            "late_bars": "Bars dropped as not newer than the last bar of their identifier",
+            "batches": "Micro-batches processed",
+            "alerts": "Alerts triggered",
+            "compactions": "Compactions into the master table",
+        }
+        for name, description in counters.items():
+            lines += [
+                f"# HELP stock_alert_stream_{name}_total {description}",
+                f"# TYPE stock_alert_stream_{name}_total counter",
+                f"stock_alert_stream_{name}_total {getattr(self, name)}",
+            ]
+        lines += [
+            "# HELP stock_alert_stream_throughput_bars_per_second Bars processed per second of the run",
+            "# TYPE stock_alert_stream_throughput_bars_per_second gauge",
+            f"stock_alert_stream_throughput_bars_per_second {self.throughput}",
+            "# HELP stock_alert_stream_latency_seconds End-to-end latency of the recent bars",
+            "# TYPE stock_alert_stream_latency_seconds gauge",
+        ]
+        for quantile in (0.5, 0.99):
+            latency = self.latency(quantile)
+            if latency is not None:
+                lines.append(f'stock_alert_stream_latency_seconds{{quantile="{quantile}"}} {latency}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write_atomically(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(text)
+    os.replace(tmp_path, path)
@@ -1,51 +1,355 @@
+import os
+import shutil
+import time
+import warnings
+from collections.abc import Iterable, Sequence
 import polars as pl
 from pathlib import Path
 from common.logger import logger
-from stock_alert.fetcher import BaseFetcher
-#from stock_alert.transformer import Transformer
-from stock_alert.features import FeatureEngine
+from typing import TYPE_CHECKING
+from stock_alert.metrics import RunReport, StageMetrics
+from stock_alert.regimes import RegimeBands
+from stock_alert.schema import MasterSchema
+from stock_alert.transformer import Transformer
+
+if TYPE_CHECKING:
+    from stock_alert.features import FeatureEngine
+    from stock_alert.fetcher import BaseFetcher
+
+# Helper columns of the blocked feature computation
+_BLOCK = "__block"
+_WARMUP = "__warmup"
 
 class DataPipeline:
-    """Class that is responsible for the ETL pipeline"""
-    def __init__(self, 
-                 fetcher: BaseFetcher, 
-                 feature_engine: FeatureEngine, 
-                 master_table_directory: str | None = None):
+    """Class that is responsible for the ETL pipeline
+
+    In incremental mode features are computed per (identifier, calendar year)
+    block, each block being warmed up with the `FeatureEngine.lookback` rows
+    that precede it. Once a master table exists, a run only loads the blocks
+    holding new rows (plus their warm-up) from it, computes the features of
+    the new rows and appends them. Rolling kernels thus always start on the
+    same row, which makes the appended values bit-for-bit identical to a full
+    recompute.
+
+    The raw data is read through `BaseFetcher.scan`, so the whole query from
+    the cache to the master table stays lazy. With `batch_size` full
+    recomputes run `batch_size` identifiers at a time: each batch is sunk to
+    its own file and the files are streamed into the master table, which keeps
+    peak memory bounded by the batch rather than by the universe.
+
+    Every run produces a `RunReport` (in `last_report`) with the wall time,
+    rows, bytes written and peak memory of each stage, and the per identifier
+    fetch latencies, optionally written as JSON and in the Prometheus text
+    format. As the query is lazy, the features are computed while the
+    "sink" stage streams them to disk. With `profile` the transformation is executed with
+    `LazyFrame.profile` instead of being streamed to disk, and its plan and
+    per node timings are added to the report.
+
+    `transformers` derive further columns from the features (e.g. the
+    difference of the price to its SMA) in the same lazy query, right after
+    the features of each block or batch.
+
+    With a `schema` the master table is written in explicit dtypes and
+    layout (see `MasterSchema`), and the features are computed from the
+    inputs as they are stored.
+
+    Args:
+        fetcher: Source of the raw data.
+        feature_engine: Features to compute.
+        master_table_directory: Directory of master_table.parquet, not saved if None.
+        incremental: Only compute the features of rows missing from the master table.
+        identifier_column: Column identifying each asset.
+        date_column: Column ordering the rows of an asset.
+        batch_size: Number of identifiers per batch of a full recompute, all at once if None.
+        report_path: JSON file the run report is written to, not written if None.
+        prometheus_path: File the run report is written to in the Prometheus text format.
+        profile: Profile the transformation query (not for batched runs).
+        regime_bands: Regime bands saved as a derived table next to the master table.
+        transformers: Row-wise transforms applied to the features, in order.
+        schema: Stored dtypes and parquet layout of the master table, as computed if None.
+    """
+    def __init__(self,
+                 fetcher: "BaseFetcher",
+                 feature_engine: "FeatureEngine",
+                 master_table_directory: str | None = None,
+                 incremental: bool = False,
+                 identifier_column: str = "identifier",
+                 date_column: str = "Date",
+                 batch_size: int | None = None,
+                 report_path: str | None = None,
+                 prometheus_path: str | None = None,
+                 profile: bool = False,
+                 regime_bands: RegimeBands | None = None,
+                 transformers: Sequence[Transformer] = (),
+                 schema: MasterSchema | None = None):
         self.fetcher = fetcher
         self.feature_engine = feature_engine
         self.master_table_directory = master_table_directory
+        self.incremental = incremental
+        self.identifier_column = identifier_column
+        self.date_column = date_column
+        self.batch_size = batch_size
+        self.report_path = report_path
+        self.prometheus_path = prometheus_path
+        self.profile = profile
+        self.regime_bands = regime_bands
+        self.transformers = list(transformers)
+        self.schema = schema
+        self.last_report: RunReport | None = None
 
     def run(self) -> None:
+        report = RunReport()
+        self.last_report = report
+        start = time.perf_counter()
         try:
             logger.info("Starting pipeline execution")
 
+            master_table_path = None
+            if self.master_table_directory:
+                master_table_path = Path(self.master_table_directory) / "master_table.parquet"
+
+            incremental = self.incremental and self.feature_engine.lookback is not None
+            if self.incremental and not incremental:
+                logger.warning("Some features need the whole history, falling back to a full recompute")
+            append = incremental and master_table_path is not None and master_table_path.exists()
+
+            if self.batch_size and master_table_path is not None and not append:
+                # Fetch Data, Transform (Feature Engineering) and save one batch of identifiers at a time
+                logger.info(f"Fetching data and generating features in batches of {self.batch_size} identifiers...")
+                batches = (self._normalize(batch) for batch in self.fetcher.scan_batches(self.batch_size))
+                self._save_batches((self._transform(batch, incremental) for batch in batches), master_table_path, report)
+                self._record_fetch(report)
+                self._save_derived(master_table_path, report)
+                report.status = "succeeded"
+                return
+
             # Fetch Data
             logger.info("Fetching data...")
-            data = self.fetcher.fetch()
-            if data.empty:
-                raise ValueError("No data fetched")
-            
+            with report.stage("fetch") as stage:
+                data = self.fetcher.scan()
+                if not data.collect_schema().names():
+                    raise ValueError("No data fetched")
+                data = self._normalize(data)
+                stage.rows = self._record_fetch(report)
+
             # Transform (Feature Engineering)
             logger.info("Generating features...")
-            data = pl.from_pandas(data).lazy()
-            transformed = self.feature_engine.transform(data)
+            with report.stage("transform"):
+                if append:
+                    master = self._normalize(pl.scan_parquet(master_table_path))
+                    transformed = self._transform_incremental(data, master)
+                    transformed = transformed.sort(self.identifier_column, self.date_column)
+                else:
+                    transformed = self._transform(data, incremental)
+
+            if self.profile:
+                report.query_plan = transformed.explain()
+                with report.stage("execute") as stage, warnings.catch_warnings():
+                    # Deprecated as misleading for the streaming engine; profiling runs in memory
+                    warnings.simplefilter("ignore", DeprecationWarning)
+                    result, profile = transformed.profile()
+                    stage.rows = result.height
+                report.profile = profile.to_dicts()
+                transformed = result.lazy()
+
+            if master_table_path is not None:
+                with report.stage("sink") as stage:
+                    self._save_data(transformed, master_table_path, stage)
+                self._save_derived(master_table_path, report)
+
+            report.status = "succeeded"
 
-            if self.master_table_directory:
-                master_table_path = Path(self.master_table_directory) / "master_table.parquet"
-                self._save_data(transformed, master_table_path)
-                
         except Exception as e:
+            report.status = "failed"
+            report.error = f"{type(e).__name__}: {e}"
             raise RuntimeError(f"Pipeline failed: {e}") from e
-        
-    def _save_data(self, data: pl.LazyFrame, path: Path) -> None:
+
+        finally:
+            report.seconds = time.perf_counter() - start
+            self._write_report(report)
+
+    def _save_derived(self, master_table_path: Path, report: RunReport) -> None:
+        """Save the tables derived from the master table next to it."""
+        if self.regime_bands is None:
+            return
+        with report.stage("regimes") as stage:
+            path = master_table_path.parent / self.regime_bands.table_name
+            stage.rows = self.regime_bands.save(pl.scan_parquet(master_table_path), path)
+            stage.bytes_written = path.stat().st_size
+
+    def _record_fetch(self, report: RunReport) -> int | None:
+        """Copy the fetch latencies and failures into the report.
+
+        Returns:
+            int | None: Number of rows fetched, None if the fetcher does not report it.
+        """
+        result = getattr(self.fetcher, "last_result", None)
+        if result is None:
+            return None
+        report.fetch_latencies = dict(result.latencies)
+        report.fetch_failures = result.failed_identifiers
+        return result.rows_fetched
+
+    def _write_report(self, report: RunReport) -> None:
+        for stage in report.stages:
+            logger.info(
+                f"Stage {stage.name}: {stage.seconds:.3f}s, rows={stage.rows}, "
+                f"bytes_written={stage.bytes_written}, peak_rss={stage.peak_rss_bytes}"
+            )
+        if self.report_path:
+            report.write_json(self.report_path)
+            logger.info(f"Saved run report to {self.report_path}")
+        if self.prometheus_path:
+            report.write_prometheus(self.prometheus_path)
+
+    def _normalize(self, data: pl.LazyFrame) -> pl.LazyFrame:
+        """Data as stored in the master table, see `MasterSchema.normalize`."""
+        return data if self.schema is None else self.schema.normalize(data)
+
+    def _transform(self, data: pl.LazyFrame, incremental: bool) -> pl.LazyFrame:
+        """Compute the features of every row."""
+        if not incremental:
+            return self._apply_transformers(self.feature_engine.transform(data))
+        # Same row order as the tables extended by incremental runs
+        return self._transform_blocked(data).sort(self.identifier_column, self.date_column)
+
+    def _transform_blocked(self, data: pl.LazyFrame) -> pl.LazyFrame:
+        """Compute features per (identifier, year) block, each warmed up with the rows before it.
+
+        Every row is kept once in its own block; rows that are among the
+        `lookback` rows before the start of a later block are copied into that
+        block as warm-up and dropped after the features are computed.
+        """
+        lookback = self.feature_engine.lookback
+        date = pl.col(self.date_column)
+
+        year = date.dt.year().cast(pl.Int64)
+        # Year of the row `lookback` rows ahead: every block up to it starts less than `lookback` rows later
+        warmed_until = (
+            date.shift(-lookback).over(self.identifier_column, order_by=self.date_column).dt.year()
+            .fill_null(year.max().over(self.identifier_column))
+        )
+
+        rows = data.with_columns(year.alias(_BLOCK), pl.lit(False).alias(_WARMUP))
+        warmup = (
+            data.with_columns(pl.int_ranges(year + 1, warmed_until + 1).alias(_BLOCK), pl.lit(True).alias(_WARMUP))
+            .explode(_BLOCK, empty_as_null=False)
+        )
+        expanded = pl.concat([rows, warmup.select(rows.collect_schema().names())])
+
+        transformed = self.feature_engine.transform(expanded, segment_by=[_BLOCK])
+        return self._apply_transformers(transformed.filter(~pl.col(_WARMUP)).drop(_BLOCK, _WARMUP))
+
+    def _apply_transformers(self, data: pl.LazyFrame) -> pl.LazyFrame:
+        for transformer in self.transformers:
+            data = transformer.transform(data)
+        return data
+
+    def _transform_incremental(self, data: pl.LazyFrame, master: pl.LazyFrame) -> pl.LazyFrame:
+        """Append the features of new rows to the master table.
+
+        Identifiers that are new, or whose history changed since the master
+        table was written (its last row no longer matches the fetched data),
+        are recomputed in full. For the others only the blocks holding new rows
+        are recomputed, from the tail of the master table, and only the new
+        rows are kept.
+        """
+        lookback = self.feature_engine.lookback
+        identifier, date = self.identifier_column, self.date_column
+        raw_columns = data.collect_schema().names()
+
+        last = master.select(raw_columns).filter(pl.col(date) == pl.col(date).max().over(identifier))
+        compared = [c for c in raw_columns if c not in (identifier, date)]
+        matched = last.join(data, on=[identifier, date], how="left", suffix="__fetched")
+        unchanged = pl.all_horizontal(pl.col(c).eq_missing(pl.col(f"{c}__fetched")) for c in compared)
+        status = matched.select(identifier, date, unchanged.alias("__unchanged")).collect()
+
+        fetched_identifiers = data.select(pl.col(identifier).unique()).collect().to_series()
+        kept = status.filter(pl.col("__unchanged"))
+        replaced = fetched_identifiers.filter(~fetched_identifiers.is_in(kept[identifier].implode()))
+        logger.info(f"Incremental run: {kept.height} identifiers extended, {replaced.len()} recomputed in full")
+
+        # Rows after the last master row of extended identifiers
+        new_rows = (
+            data.join(kept.lazy().select(identifier, pl.col(date).alias("__last")), on=identifier)
+            .filter(pl.col(date) > pl.col("__last"))
+            .drop("__last")
+        )
+        first_block = new_rows.group_by(identifier).agg(pl.col(date).min().dt.year().alias("__first_block"))
+
+        # Blocks holding new rows, plus the warm-up rows before them, from the master table
+        tail = master.select(raw_columns).join(first_block, on=identifier)
+        current = tail.filter(pl.col(date).dt.year() >= pl.col("__first_block"))
+        before = (
+            tail.filter(pl.col(date).dt.year() < pl.col("__first_block"))
+            .sort(identifier, date)
+            .group_by(identifier, maintain_order=True)
+            .tail(lookback)
+        )
+        context = pl.concat([frame.select(raw_columns) for frame in (before, current, new_rows)])
+
+        appended = (
+            self._transform_blocked(context)
+            .join(new_rows.select(identifier, date), on=[identifier, date], how="semi")
+        )
+        recomputed = self._transform_blocked(data.filter(pl.col(identifier).is_in(replaced.implode())))
+        retained = master.filter(~pl.col(identifier).is_in(replaced.implode()))
+
+        return pl.concat([retained, appended, recomputed], how="diagonal_relaxed")
+
+    def _save_data(self, data: pl.LazyFrame, path: Path, stage: StageMetrics | None = None) -> None:
         """Save data to a path.
-        
+
+        The data is written next to the target and moved into place once
+        complete, so a query may read the file it replaces.
+
         Args:
             data:  Lazy Polars Data to be saved.
             direcotry: The path of the file to be saved into.
+            stage: Metrics to record the rows and bytes written in.
         """
-        path.parent.mkdir(parents=True, exist_ok=True)  
-        data.sink_parquet(path)
+        if self.schema is not None:
+            self.schema.write(data, path)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            data.sink_parquet(tmp_path)
+            os.replace(tmp_path, path)
         logger.info(f"Saved raw data to {path}")
-        
 
+        if stage is not None:
+            # Read from the parquet metadata only
+            stage.rows = pl.scan_parquet(path).select(pl.len()).collect().item()
+            stage.bytes_written = path.stat().st_size
+
+    def _save_batches(self, batches: Iterable[pl.LazyFrame], path: Path, report: RunReport) -> None:
+        """Sink every batch to its own file, then stream the files into `path`.
+
+        Args:
+            batches: Lazy Polars Data of consecutive batches.
+            path: The path of the file to be saved into.
+            report: Report to record the "batches" and "sink" stages in.
+        """
+        parts_directory = path.parent / f".{path.stem}.parts"
+        shutil.rmtree(parts_directory, ignore_errors=True)
+        parts_directory.mkdir(parents=True)
+
+        try:
+            parts = []
+            # Fetching, transforming and sinking are interleaved batch by batch
+            with report.stage("batches") as stage:
+                for i, batch in enumerate(batches):
+                    part_path = parts_directory / f"part-{i:05d}.parquet"
+                    batch.sink_parquet(part_path)
+                    parts.append(part_path)
+                    logger.debug(f"Saved batch {i} to {part_path}")
+                stage.bytes_written = sum(part.stat().st_size for part in parts)
+
+            if not parts:
+                raise ValueError("No data fetched")
+
+            with report.stage("sink") as stage:
+                data = pl.concat([pl.scan_parquet(part) for part in parts], how="diagonal_relaxed")
+                self._save_data(data, path, stage)
+        finally:
+            shutil.rmtree(parts_directory, ignore_errors=True)
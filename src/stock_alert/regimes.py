@@ -0,0 +1,108 @@
+"""Regime bands: run-length encoded intervals where a feature stays within thresholds.
+
+E.g. the periods where the RSI is overbought (above 70) or oversold (below 30),
+computed once for all identifiers and stored next to the master table.
+"""
+import os
+from collections.abc import Mapping
+from pathlib import Path
+import polars as pl
+from common.logger import logger
+
+# Default RSI regimes: name -> (lower bound, upper bound), both exclusive, None for unbounded
+RSI_REGIMES = {
+    "overbought": (70.0, None),
+    "oversold": (None, 30.0),
+}
+
+
+class RegimeBands:
+    """Computes the regime intervals of a column for every identifier.
+
+    A band starts on the first row within the thresholds of a regime and
+    ends on the first row outside of them (or on the last row of the
+    identifier if the regime is ongoing), so that consecutive bands can be
+    drawn as adjacent intervals.
+
+    Args:
+        column: Column the regimes are defined on.
+        regimes: Regime name -> (lower, upper) exclusive bounds, None for unbounded.
+        identifier_column: Column identifying each asset.
+        date_column: Column ordering the rows of an asset.
+    """
+    def __init__(self,
+                 column: str = "rsi_14d",
+                 regimes: Mapping[str, tuple[float | None, float | None]] = RSI_REGIMES,
+                 identifier_column: str = "identifier",
+                 date_column: str = "Date") -> None:
+        if not regimes:
+            raise ValueError("RegimeBands requires at least one regime")
+        self.column = column
+        self.regimes = dict(regimes)
+        self.identifier_column = identifier_column
+        self.date_column = date_column
+
+    @property
+    def table_name(self) -> str:
+        """File name of the derived table, e.g. rsi_14d_regimes.parquet."""
+        return f"{self.column}_regimes.parquet"
+
+    def condition(self, regime: str) -> pl.Expr:
+        lower, upper = self.regimes[regime]
+        value = pl.col(self.column)
+        condition = pl.lit(True)
+        if lower is not None:
+            condition = condition & (value > lower)
+        if upper is not None:
+            condition = condition & (value < upper)
+        return condition.fill_null(False)
+
+    def compute(self, data: pl.LazyFrame) -> pl.LazyFrame:
+        """Bands of every regime: identifier, regime, start, end, rows and ongoing.
+
+        Args:
+            data: Rows holding the identifier, date and regime columns, in any order.
+        """
+        identifier, date = self.identifier_column, self.date_column
+        rows = (
+            data.select(identifier, date, self.column)
+            .sort(identifier, date)
+            .with_columns(
+                pl.col(date).shift(-1).over(identifier).alias("__next"),
+                *(self.condition(regime).alias(regime) for regime in self.regimes),
+            )
+        )
+
+        bands = []
+        for regime in self.regimes:
+            # Consecutive rows of the same state share a run number
+            run = (pl.col(regime) != pl.col(regime).shift(1)).fill_null(True).cum_sum().over(identifier)
+            bands.append(
+                rows.with_columns(run.alias("__run"))
+                .filter(regime)
+                .group_by(identifier, "__run")
+                .agg(
+                    pl.col(date).first().alias("start"),
+                    pl.col("__next").last().fill_null(pl.col(date).last()).alias("end"),
+                    pl.len().alias("rows"),
+                    pl.col("__next").last().is_null().alias("ongoing"),
+                )
+                .select(identifier, pl.lit(regime).alias("regime"), "start", "end", "rows", "ongoing")
+            )
+        return pl.concat(bands).sort(identifier, "regime", "start")
+
+    def save(self, master: pl.LazyFrame, path: str | Path) -> int:
+        """Compute the bands from the master table and write them to `path`.
+
+        The table is replaced atomically, so the dashboard never reads a partial file.
+
+        Returns:
+            int: Number of bands written.
+        """
+        path = Path(path)
+        bands = self.compute(master).collect()
+        tmp_path = path.with_suffix(".tmp")
+        bands.write_parquet(tmp_path)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved {bands.height} {self.column} regime bands to {path}")
+        return bands.height
@@ -0,0 +1,117 @@
+"""Explicit on-disk schema of the master table.
+
+The raw data comes out of pandas as float64 columns, with corporate-action
+columns that are almost always zero and rows in whatever order the fetcher
+produced them. `MasterSchema` fixes the stored dtypes and parquet layout
+instead: float32 prices and features, no corporate actions, rows sorted by
+identifier and date in row groups with statistics, so readers prune row
+groups on both.
+"""
+import os
+from collections.abc import Sequence
+from pathlib import Path
+import polars as pl
+
+# Columns of the raw data holding corporate actions, zero on nearly every row
+CORPORATE_ACTIONS = ("Dividends", "Stock Splits")
+
+
+class MasterSchema:
+    """Dtypes, columns and parquet layout of the master table.
+
+    Float columns are stored as float32 (about 7 significant digits, e.g.
+    prices in cents up to 100 000), unless listed in `float64_columns`.
+    Features are still computed in float64, from the inputs as stored (see
+    `normalize`), so incremental runs reading their inputs back from the
+    master table compute the same values as a full run.
+
+    The identifier is stored as a string by default: parquet dictionary
+    encodes it anyway, so a categorical does not make the file smaller, and
+    Polars cannot prune row groups on a categorical, which makes the
+    dashboard queries of a few tickers read the whole table.
+
+    Args:
+        identifier_column: Column identifying each asset.
+        date_column: Column ordering the rows of an asset.
+        identifier_dtype: Dtype of the identifier, e.g. `pl.Categorical` for in-memory use.
+        drop: Columns not stored, the corporate actions by default.
+        float64_columns: Float columns kept in double precision.
+        date_dtype: Dtype of the date column, e.g. `pl.Date` for daily bars; kept if None.
+        row_group_size: Rows per parquet row group, the unit readers skip using its statistics.
+        compression: Parquet compression codec.
+        compression_level: Level of the codec, its default if None.
+    """
+    def __init__(self,
+                 identifier_column: str = "identifier",
+                 date_column: str = "Date",
+                 identifier_dtype: pl.DataType = pl.String,
+                 drop: Sequence[str] = CORPORATE_ACTIONS,
+                 float64_columns: Sequence[str] = (),
+                 date_dtype: pl.DataType | None = None,
+                 row_group_size: int = 64_000,
+                 compression: str = "zstd",
+                 compression_level: int | None = None) -> None:
+        self.identifier_column = identifier_column
+        self.date_column = date_column
+        self.identifier_dtype = identifier_dtype
+        self.drop = list(drop)
+        self.float64_columns = set(float64_columns)
+        self.date_dtype = date_dtype
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.compression_level = compression_level
+
+    def normalize(self, data: pl.LazyFrame) -> pl.LazyFrame:
+        """Data with the values it has once stored, in the dtypes it is computed in.
+
+        Stored float32 columns are rounded to float32 and widened back to float64.
+        """
+        data = data.drop(self.drop, strict=False)
+        schema = data.collect_schema()
+        return data.with_columns(
+            self._identifier(),
+            *self._date(schema),
+            *(pl.col(column).cast(pl.Float32).cast(pl.Float64) for column in self._float32_columns(schema)),
+        )
+
+    def apply(self, data: pl.LazyFrame, sort: bool = True) -> pl.LazyFrame:
+        """Data in the stored dtypes, sorted by identifier and date unless already sorted (`sort=False`)."""
+        data = data.drop(self.drop, strict=False)
+        schema = data.collect_schema()
+        data = data.with_columns(
+            self._identifier(),
+            *self._date(schema),
+            *(pl.col(column).cast(pl.Float32) for column in self._float32_columns(schema)),
+        )
+        return data.sort(self.identifier_column, self.date_column) if sort else data
+
+    def write(self, data: pl.LazyFrame, path: Path, sort: bool = True) -> None:
+        """Stream `data` in the stored schema and layout to `path`, replaced atomically, see `apply`."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        self.apply(data, sort).sink_parquet(
+            tmp_path,
+            compression=self.compression,
+            compression_level=self.compression_level,
+            statistics=True,
+            row_group_size=self.row_group_size,
+        )
+        os.replace(tmp_path, path)
+
+    def _identifier(self) -> pl.Expr:
+        return pl.col(self.identifier_column).cast(self.identifier_dtype)
+
+    def _date(self, schema: pl.Schema) -> list[pl.Expr]:
+        if self.date_dtype is None or schema[self.date_column] == self.date_dtype:
+            return []
+        date = pl.col(self.date_column)
+        if self.date_dtype == pl.Date and isinstance(schema[self.date_column], pl.Datetime):
+            # The day in the time zone of the timestamps, not in UTC
+            return [date.dt.date()]
+        return [date.cast(self.date_dtype)]
+
+    def _float32_columns(self, schema: pl.Schema) -> list[str]:
+        return [
+            column for column, dtype in schema.items()
+            if dtype.is_float() and column not in self.float64_columns
+        ]
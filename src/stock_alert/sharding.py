@@ -0,0 +1,270 @@
+"""Sharded pipeline runs: the identifiers are split into shards, each run by its own process.
+
+Every shard is a `DataPipeline` over its own identifiers, with its own
+master table under ``<master_table_directory>/.shards/``. Shards are
+independent of each other: a failed shard is retried (or rerun later)
+alone, and incremental runs extend each shard table on its own. Once all
+shards succeeded, their tables are merged into master_table.parquet, which
+is replaced atomically.
+"""
+import os
+import time
+import zlib
+from collections.abc import Callable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import get_context
+from pathlib import Path
+from typing import TYPE_CHECKING
+import polars as pl
+from common.logger import logger
+from stock_alert.metrics import RunReport, StageMetrics
+from stock_alert.pipeline import DataPipeline
+from stock_alert.regimes import RegimeBands
+from stock_alert.schema import MasterSchema
+from stock_alert.transformer import Transformer
+
+if TYPE_CHECKING:
+    from stock_alert.features import FeatureEngine
+    from stock_alert.fetcher import BaseFetcher
+
+
+def shard_of(identifier: str, n_shards: int) -> int:
+    """Shard of an identifier, stable across processes, runs and machines."""
+    return zlib.crc32(identifier.encode()) % n_shards
+
+
+@dataclass(frozen=True)
+class Shard:
+    """Shard `index` of `count`, e.g. parsed from "2/8"."""
+    index: int
+    count: int
+
+    def __post_init__(self) -> None:
+        if not 0 <= self.index < self.count:
+            raise ValueError(f"Shard index {self.index} is not within 0..{self.count - 1}")
+
+    @classmethod
+    def parse(cls, value: str) -> "Shard":
+        index, _, count = value.partition("/")
+        try:
+            return cls(int(index), int(count))
+        except ValueError as e:
+            raise ValueError(f"Invalid shard '{value}', expected <index>/<count>, e.g. 0/4: {e}") from e
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+
+class ShardedPipeline:
+    """Runs the pipeline shard by shard in a process pool and merges the shard outputs.
+
+    Identifiers are assigned to shards by a stable hash, or explicitly with
+    `shards`. Every shard fetches and computes the features of its own
+    identifiers only, so it can also run as an independent worker (see
+    `run_shard`), e.g. one per machine, followed by a single `merge`.
+
+    Args:
+        make_fetcher: Creates the fetcher of the identifiers of a shard; must
+            be picklable (e.g. a module level function) to run in a process pool.
+        identifiers: Identifiers of the whole universe.
+        feature_engine: Features to compute.
+        master_table_directory: Directory of master_table.parquet and of the shard tables.
+        n_shards: Number of hash shards, ignored if `shards` is given.
+        shards: Explicit identifiers of every shard.
+        max_workers: Number of shards run at the same time, one per CPU by default.
+        retries: Number of times a failed shard is rerun before giving up.
+        report_path: JSON file the run report is written to, not written if None.
+        prometheus_path: File the run report is written to in the Prometheus text format.
+        regime_bands: Regime bands saved next to the merged master table.
+        identifier_column: Column identifying each asset.
+        date_column: Column ordering the rows of an asset.
+        transformers: Row-wise transforms applied to the features, in order.
+        schema: Stored dtypes and parquet layout of the shard and merged tables.
+        **pipeline_kwargs: Further arguments of every shard `DataPipeline`,
+            e.g. `incremental` or `batch_size`.
+    """
+    def __init__(self,
+                 make_fetcher: Callable[[list[str]], "BaseFetcher"],
+                 identifiers: Sequence[str],
+                 feature_engine: "FeatureEngine",
+                 master_table_directory: str,
+                 n_shards: int = 4,
+                 shards: Sequence[Sequence[str]] | None = None,
+                 max_workers: int | None = None,
+                 retries: int = 1,
+                 report_path: str | None = None,
+                 prometheus_path: str | None = None,
+                 regime_bands: RegimeBands | None = None,
+                 identifier_column: str = "identifier",
+                 date_column: str = "Date",
+                 transformers: Sequence[Transformer] = (),
+                 schema: MasterSchema | None = None,
+                 **pipeline_kwargs) -> None:
+        if shards is None:
+            if n_shards < 1:
+                raise ValueError("ShardedPipeline requires at least one shard")
+            shards = [[] for _ in range(n_shards)]
+            for identifier in identifiers:
+                shards[shard_of(identifier, n_shards)].append(identifier)
+        self.shards = [sorted(shard) for shard in shards]
+        self.make_fetcher = make_fetcher
+        self.feature_engine = feature_engine
+        self.master_table_directory = Path(master_table_directory)
+        self.max_workers = max_workers
+        self.retries = retries
+        self.report_path = report_path
+        self.prometheus_path = prometheus_path
+        self.regime_bands = regime_bands
+        self.identifier_column = identifier_column
+        self.date_column = date_column
+        self.transformers = list(transformers)
+        self.schema = schema
+        self.pipeline_kwargs = pipeline_kwargs
+        self.last_report: RunReport | None = None
+
+    @property
+    def master_table_path(self) -> Path:
+        return self.master_table_directory / "master_table.parquet"
+
+    def shard_directory(self, index: int) -> Path:
+        """Directory of the master table of a shard."""
+        return self.master_table_directory / ".shards" / f"shard-{index:04d}-of-{len(self.shards):04d}"
+
+    def run(self, indices: Sequence[int] | None = None) -> None:
+        """Run the shards (all of them by default) in a process pool, then merge them.
+
+        Raises:
+            RuntimeError: If a shard still fails after its retries; the other
+                shards are saved, so only the failed ones need to be rerun.
+        """
+        indices = range(len(self.shards)) if indices is None else indices
+        report = RunReport()
+        self.last_report = report
+        start = time.perf_counter()
+        try:
+            logger.info(f"Running {len(indices)} of {len(self.shards)} shards")
+            failed = {}
+            # Polars is not fork-safe, every worker starts a fresh interpreter
+            with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=get_context("spawn")) as pool:
+                futures = {index: pool.submit(self._run_with_retries, index) for index in indices}
+                for index, future in futures.items():
+                    error, shard_report = future.result()
+                    if error is not None:
+                        failed[index] = error
+                    report.stages.append(self._shard_metrics(index, shard_report))
+                    if shard_report is not None:
+                        report.fetch_latencies.update(shard_report.fetch_latencies)
+                        report.fetch_failures += shard_report.fetch_failures
+
+            if failed:
+                raise RuntimeError(f"Shards {list(failed)} failed, rerun them with run({list(failed)}): {failed}")
+            self._merge(report)
+            report.status = "succeeded"
+
+        except Exception as e:
+            report.status = "failed"
+            report.error = f"{type(e).__name__}: {e}"
+            raise RuntimeError(f"Sharded pipeline failed: {e}") from e
+
+        finally:
+            report.seconds = time.perf_counter() - start
+            if self.report_path:
+                report.write_json(self.report_path)
+            if self.prometheus_path:
+                report.write_prometheus(self.prometheus_path)
+
+    def run_shard(self, index: int) -> RunReport:
+        """Run one shard in this process, e.g. as an independent worker.
+
+        Returns:
+            RunReport: Report of the shard pipeline.
+        """
+        identifiers = self.shards[index]
+        logger.info(f"Running shard {index}/{len(self.shards)} of {len(identifiers)} identifiers")
+        # Marks the shard as done only once its table is complete
+        self._done_path(index).unlink(missing_ok=True)
+        self.shard_directory(index).mkdir(parents=True, exist_ok=True)
+        if not identifiers:
+            self._done_path(index).touch()
+            return RunReport(status="succeeded")
+
+        pipeline = DataPipeline(
+            self.make_fetcher(identifiers),
+            self.feature_engine,
+            str(self.shard_directory(index)),
+            identifier_column=self.identifier_column,
+            date_column=self.date_column,
+            transformers=self.transformers,
+            schema=self.schema,
+            **self.pipeline_kwargs,
+        )
+        pipeline.run()
+        self._done_path(index).touch()
+        return pipeline.last_report
+
+    def merge(self) -> None:
+        """Merge the tables of all shards into the master table.
+
+        Raises:
+            RuntimeError: If a shard has not succeeded yet.
+        """
+        report = RunReport()
+        self._merge(report)
+        report.status = "succeeded"
+        self.last_report = report
+
+    def _run_with_retries(self, index: int) -> tuple[str | None, RunReport | None]:
+        """Runs in a worker: returns the last error, if any, and the report of the shard."""
+        for attempt in range(self.retries + 1):
+            try:
+                return None, self.run_shard(index)
+            except Exception as e:
+                logger.warning(f"Shard {index}/{len(self.shards)} failed (attempt {attempt + 1}): {e}")
+                error = f"{type(e).__name__}: {e}"
+        return error, None
+
+    def _shard_metrics(self, index: int, shard_report: RunReport | None) -> StageMetrics:
+        """Metrics of a shard as a stage of the run, measured in its worker."""
+        metrics = StageMetrics(name=f"shard {index}/{len(self.shards)}")
+        if shard_report is not None:
+            metrics.seconds = shard_report.seconds
+            sinks = [stage for stage in shard_report.stages if stage.name == "sink"]
+            if sinks:
+                metrics.rows, metrics.bytes_written = sinks[-1].rows, sinks[-1].bytes_written
+            metrics.peak_rss_bytes = max((stage.peak_rss_bytes or 0 for stage in shard_report.stages), default=None)
+        return metrics
+
+    def _done_path(self, index: int) -> Path:
+        return self.shard_directory(index) / "_SUCCESS"
+
+    def _merge(self, report: RunReport) -> None:
+        pending = [index for index in range(len(self.shards)) if not self._done_path(index).exists()]
+        if pending:
+            raise RuntimeError(f"Cannot merge, shards {pending} have not succeeded")
+
+        with report.stage("merge") as stage:
+            parts = [
+                self.shard_directory(index) / "master_table.parquet"
+                for index, identifiers in enumerate(self.shards) if identifiers
+            ]
+            data = (
+                pl.concat([pl.scan_parquet(part) for part in parts], how="diagonal_relaxed")
+                .sort(self.identifier_column, self.date_column)
+            )
+            if self.schema is not None:
+                self.schema.write(data, self.master_table_path)
+            else:
+                self.master_table_directory.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.master_table_path.with_suffix(".tmp")
+                data.sink_parquet(tmp_path)
+                os.replace(tmp_path, self.master_table_path)
+            stage.rows = pl.scan_parquet(self.master_table_path).select(pl.len()).collect().item()
+            stage.bytes_written = self.master_table_path.stat().st_size
+        logger.info(f"Merged {len(parts)} shards into {self.master_table_path}")
+
+        if self.regime_bands is not None:
+            with report.stage("regimes") as stage:
+                path = self.master_table_directory / self.regime_bands.table_name
+                stage.rows = self.regime_bands.save(pl.scan_parquet(self.master_table_path), path)
+                stage.bytes_written = path.stat().st_size
@@ -0,0 +1,273 @@
+"""Hive-style partitioned parquet storage for raw market data.
+
+Data is laid out as ``root/identifier=<id>/year=<yyyy>/data.parquet`` so that
+readers only open the files of the identifiers and years they need, and
+writers only rewrite the partitions touched by new rows.
+"""
+import os
+from collections.abc import Iterable
+from datetime import date, datetime
+from pathlib import Path
+from urllib.parse import quote, unquote
+import polars as pl
+from common.logger import logger
+
+_FILE_NAME = "data.parquet"
+
+
+class PartitionedStore:
+    """Parquet store partitioned by identifier and year of the date column.
+
+    Every partition file is sorted by date and written with column statistics,
+    so date predicates are pushed down to row groups by the Polars scanner.
+
+    Args:
+        root: Directory holding the partitions.
+        identifier_column: Column used for the first partition level.
+        date_column: Column used for the year partition level and sorting.
+        row_group_size: Maximum number of rows per parquet row group.
+        compression: Parquet compression codec.
+    """
+
+    def __init__(
+            self,
+            root: str | Path,
+            identifier_column: str = "identifier",
+            date_column: str = "Date",
+            row_group_size: int = 64_000,
+            compression: str = "zstd",
+    ) -> None:
+        self.root = Path(root)
+        self.identifier_column = identifier_column
+        self.date_column = date_column
+        self.row_group_size = row_group_size
+        self.compression = compression
+
+    def identifiers(self) -> list[str]:
+        """List the identifiers present in the store."""
+        if not self.root.exists():
+            return []
+        return sorted(
+            unquote(path.name.split("=", 1)[1])
+            for path in self.root.iterdir()
+            if path.is_dir() and path.name.startswith(f"{self.identifier_column}=")
+        )
+
+    def files(
+            self,
+            identifiers: Iterable[str] | None = None,
+            start: date | datetime | None = None,
+            end: date | datetime | None = None,
+    ) -> list[Path]:
+        """List the partition files that may hold rows matching the predicates.
+
+        Args:
+            identifiers: Identifiers to keep, all of them if None.
+            start: Inclusive lower bound on the date column.
+            end: Inclusive upper bound on the date column.
+        """
+        if identifiers is None:
+            identifiers = self.identifiers()
+
+        files = []
+        for identifier in identifiers:
+            for year, path in self._partitions(identifier):
+                if start is not None and year < start.year:
+                    continue
+                if end is not None and year > end.year:
+                    continue
+                files.append(path)
+        return files
+
+    def scan(
+            self,
+            identifiers: Iterable[str] | None = None,
+            start: date | datetime | None = None,
+            end: date | datetime | None = None,
+    ) -> pl.LazyFrame:
+        """Lazily scan the store, pruning partitions and row groups.
+
+        Identifier and year predicates select the files to open; the date range
+        is pushed down to the parquet reader, which skips row groups using their
+        statistics. Rows are ordered by identifier (in the requested order) and date.
+
+        The files are read by a single scan, in the union of their schemas:
+        columns missing from a file are read as nulls, and numeric columns
+        stored in different dtypes (e.g. Float32 and Float64) are widened to
+        their supertype. The identifier is stored in the files, so the hive
+        partition columns are not added.
+
+        Raises:
+            ValueError: If a non-numeric column, e.g. the date with another
+                time unit or zone, is stored in different dtypes.
+
+        Args:
+            identifiers: Identifiers to read, all of them if None.
+            start: Inclusive lower bound on the date column.
+            end: Inclusive upper bound on the date column.
+        """
+        files = self.files(identifiers, start, end)
+        if not files:
+            return pl.LazyFrame()
+
+        data = pl.scan_parquet(
+            files,
+            schema=self._schema(files),
+            hive_partitioning=False,
+            missing_columns="insert",
+            cast_options=pl.ScanCastOptions(integer_cast=["upcast", "allow-float"], float_cast="upcast"),
+        )
+
+        dtype = data.collect_schema()[self.date_column]
+        if start is not None:
+            data = data.filter(pl.col(self.date_column) >= date_literal(start, dtype))
+        if end is not None:
+            data = data.filter(pl.col(self.date_column) <= date_literal(end, dtype))
+        return data
+
+    def read(
+            self,
+            identifiers: Iterable[str] | None = None,
+            start: date | datetime | None = None,
+            end: date | datetime | None = None,
+    ) -> pl.DataFrame:
+        """Eagerly read the store, see `scan`."""
+        return self.scan(identifiers, start, end).collect()
+
+    def last_rows(self, identifiers: Iterable[str] | None = None, n: int = 1) -> pl.DataFrame:
+        """Last `n` rows (by date) of each identifier, reading only its `n` newest partitions at most."""
+        if identifiers is None:
+            identifiers = self.identifiers()
+
+        frames = []
+        for identifier in identifiers:
+            partitions = self._partitions(identifier)
+            if not partitions:
+                continue
+            # Partitions are never empty, so the newest n hold the last n rows
+            newest = [path for _, path in partitions[-n:]]
+            frames.append(pl.scan_parquet(newest).sort(self.date_column).tail(n))
+
+        if not frames:
+            return pl.DataFrame()
+        return pl.concat(frames, how="diagonal_relaxed").collect()
+
+    def append(self, data: pl.DataFrame) -> list[Path]:
+        """Upsert rows, rewriting only the partitions they fall into.
+
+        Existing rows with the same identifier and date are replaced.
+
+        Returns:
+            list[Path]: The partition files that were written.
+        """
+        written = []
+        for (identifier, year), rows in self._split(data):
+            path = self._path(identifier, year)
+            if path.exists():
+                existing = pl.read_parquet(path)
+                rows = (
+                    pl.concat([existing, rows], how="diagonal_relaxed")
+                    .unique(subset=[self.date_column], keep="last", maintain_order=True)
+                )
+            self._write_partition(rows, path)
+            written.append(path)
+
+        logger.info(f"Appended {data.height} rows to {len(written)} partitions in {self.root}")
+        return written
+
+    def replace(self, data: pl.DataFrame) -> list[Path]:
+        """Replace the whole history of every identifier present in `data`.
+
+        Returns:
+            list[Path]: The partition files that were written.
+        """
+        for identifier in data[self.identifier_column].unique().to_list():
+            for _, path in self._partitions(identifier):
+                path.unlink()
+
+        written = []
+        for (identifier, year), rows in self._split(data):
+            path = self._path(identifier, year)
+            self._write_partition(rows, path)
+            written.append(path)
+
+        logger.info(f"Wrote {data.height} rows to {len(written)} partitions in {self.root}")
+        return written
+
+    @staticmethod
+    def _schema(files: list[Path]) -> pl.Schema:
+        """Union of the schemas of `files`, numeric columns in their supertype."""
+        # Partitions mostly share the same schema, which is then merged once
+        schemas: dict[tuple, Path] = {}
+        for path in files:
+            schemas.setdefault(tuple(pl.read_parquet_schema(path).items()), path)
+
+        dtypes: dict[str, dict[pl.DataType, Path]] = {}
+        for schema, path in schemas.items():
+            for column, dtype in schema:
+                dtypes.setdefault(column, {}).setdefault(dtype, path)
+        for column, found in dtypes.items():
+            if len(found) > 1 and not all(dtype.is_numeric() for dtype in found):
+                stored = ", ".join(f"{dtype} in {path}" for dtype, path in found.items())
+                raise ValueError(f"Column '{column}' is stored in different dtypes: {stored}")
+
+        return pl.concat([pl.DataFrame(schema=dict(schema)) for schema in schemas], how="diagonal_relaxed").schema
+
+    def _split(self, data: pl.DataFrame) -> list[tuple[tuple[str, int], pl.DataFrame]]:
+        """Split rows by (identifier, year) partition."""
+        year = pl.col(self.date_column).dt.year().alias("__year")
+        groups = data.with_columns(year).partition_by(
+            [self.identifier_column, "__year"], as_dict=True, maintain_order=True
+        )
+        return [(key, rows.drop("__year")) for key, rows in groups.items()]
+
+    def _write_partition(self, rows: pl.DataFrame, path: Path) -> None:
+        """Atomically write one sorted partition file."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        rows.sort(self.date_column).write_parquet(
+            tmp_path,
+            compression=self.compression,
+            statistics=True,
+            row_group_size=self.row_group_size,
+        )
+        os.replace(tmp_path, path)
+
+    def _path(self, identifier: str, year: int) -> Path:
+        return (
+            self.root
+            / f"{self.identifier_column}={quote(identifier, safe='')}"
+            / f"year={year}"
+            / _FILE_NAME
+        )
+
+    def _partitions(self, identifier: str) -> list[tuple[int, Path]]:
+        """Existing (year, file) partitions of one identifier, oldest first."""
+        directory = self.root / f"{self.identifier_column}={quote(identifier, safe='')}"
+        if not directory.exists():
+            return []
+        partitions = [
+            (int(path.parent.name.split("=", 1)[1]), path)
+            for path in directory.glob(f"year=*/{_FILE_NAME}")
+        ]
+        return sorted(partitions)
+
+
+def date_literal(value: date | datetime, dtype: pl.DataType) -> pl.Expr:
+    """Date bound as a constant of `dtype`, so it can be checked against row group statistics."""
+    if not isinstance(dtype, pl.Datetime):
+        expr = pl.lit(value).cast(dtype)
+    elif isinstance(value, datetime) and value.tzinfo is not None:
+        expr = pl.lit(value)
+        # A naive column holds wall times: compare with the wall time of the bound
+        if dtype.time_zone is None:
+            expr = expr.dt.replace_time_zone(None).cast(pl.Datetime(dtype.time_unit))
+        else:
+            expr = expr.dt.convert_time_zone(dtype.time_zone)
+    else:
+        expr = pl.lit(value).cast(pl.Datetime(dtype.time_unit))
+        if dtype.time_zone is not None:
+            expr = expr.dt.replace_time_zone(dtype.time_zone)
+
+    # Evaluate once so the scanner sees a plain literal
+    return pl.lit(pl.select(expr).item(), dtype=dtype)
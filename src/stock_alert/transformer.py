@@ -1,40 +1,74 @@
+"""Transforms applied to the features, e.g. the distance of the price to its SMA.
+
+Transformers run in the lazy query of the pipeline, right after the
+features, and derive their columns row by row: a value only depends on the
+columns of its own row, so a transform stays correct in incremental and
+batched runs, which only see part of the history.
+"""
 from typing import Protocol
-import pandas as pd
+import polars as pl
+from stock_alert.features.feature_base import Feature
+
 
 class Transformer(Protocol):
     """Protocol for data transformers"""
-    def transform(self, data: pd.DataFrame) -> pd.DataFrame:
+    def transform(self, data: pl.LazyFrame) -> pl.LazyFrame:
         ...
-class CreateMovingAverage:
-    """Transformer that creates a Moving Average of a certain column
-    
+
+
+def _column(column: str | Feature) -> str:
+    return column.name if isinstance(column, Feature) else column
+
+
+class Difference:
+    """Difference of a column to a reference, e.g. of the price to its SMA.
+
     Args:
-        window_size: Size of the rolling window
-        column: Column name to calculate SMA on
-        group_by: Optional column to group by 
+        column: Column to compare, or a Feature whose output to use.
+        reference: Column compared to, or a Feature whose output to use.
+        percent: Difference in percent of the reference instead of in units of the column.
+        name: Name of the created column, diff_{column}_{reference} (or diff_pct_...) by default.
     """
-    def __init__(self, window_size: int, column: str, group_by: str | None = None) -> None:
-        self.window_size = window_size
-        self.column = column
-        self.group_by = group_by
-
-    def transform(self, data: pd.DataFrame) -> pd.DataFrame:
-        df = data.copy()
-
-        ma_col_name = f"moving_average_{self.window_size}d"
-
-        # Calculate SMA wit optional grouping
-        if self.group_by and self.group_by in df.columns:
-            df[ma_col_name] = (df
-                                .groupby(self.group_by)[self.column]
-                                .rolling(window=self.window_size)
-                                .mean()
-                            )
-        else:
-            df[ma_col_name] = df[self.column].rolling(window=self.window_size).mean()
-
-        # This next part maybe shouldnt be here
-        df["Diff"] = df[self.column] - df[f"sma_{self.window_size}"].round(1)
-        df["Diff_pct"] = ((df["Diff"] / df[f"sma_{self.window_size}"]) * 100).round(1)
-
-        return df
\ No newline at end of file
+    def __init__(self,
+                 column: str | Feature,
+                 reference: str | Feature,
+                 percent: bool = False,
+                 name: str | None = None) -> None:
+        self.column = _column(column)
+        self.reference = _column(reference)
+        self.percent = percent
+        prefix = "diff_pct" if percent else "diff"
+        self.name = name or f"{prefix}_{self.column}_{self.reference}"
+
+    def transform(self, data: pl.LazyFrame) -> pl.LazyFrame:
+        difference = pl.col(self.column) - pl.col(self.reference)
+        if self.percent:
+            difference = difference / pl.col(self.reference) * 100
+        return data.with_columns(difference.alias(self.name))
+
+
+class ZScore:
+    """Number of standard deviations a column is away from its mean.
+
+    E.g. the z-score of the close to its 21-day SMA, with the 21-day
+    volatility of the close as the standard deviation.
+
+    Args:
+        column: Column to standardize, or a Feature whose output to use.
+        mean: Column holding the mean, or a Feature whose output to use.
+        std: Column holding the standard deviation, or a Feature whose output to use.
+        name: Name of the created column, zscore_{column}_{mean} by default.
+    """
+    def __init__(self,
+                 column: str | Feature,
+                 mean: str | Feature,
+                 std: str | Feature,
+                 name: str | None = None) -> None:
+        self.column = _column(column)
+        self.mean = _column(mean)
+        self.std = _column(std)
+        self.name = name or f"zscore_{self.column}_{self.mean}"
+
+    def transform(self, data: pl.LazyFrame) -> pl.LazyFrame:
+        zscore = (pl.col(self.column) - pl.col(self.mean)) / pl.col(self.std)
+        return data.with_columns(zscore.alias(self.name))
@@ -0,0 +1,52 @@
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+from stock_alert.alerts import AlertEngine, Comparison, CrossAbove, CrossBelow
+
+def make_master() -> pl.LazyFrame:
+    # Shuffled history; only the last two days of each identifier matter
+    return pl.LazyFrame({
+        "identifier": ["A"] * 3 + ["B"] * 3 + ["C"] * 1,
+        "Date": [1, 2, 3] * 2 + [3],
+        "Close": [9.0, 9.0, 11.0, 12.0, 12.0, 8.0, 5.0],
+        "sma_21d": [10.0, 10.0, 10.0, 10.0, 10.0, 10.0, None],
+        "rsi_14d": [50.0, 50.0, 75.0, 50.0, 50.0, 25.0, 90.0],
+    }).select(pl.all().reverse())
+
+def test_alert_engine_evaluates_latest_rows():
+    engine = AlertEngine([
+        Comparison("Close", "<", "sma_21d"),
+        Comparison("rsi_14d", ">", 70, name="overbought"),
+        CrossAbove("Close", "sma_21d"),
+        CrossBelow("Close", "sma_21d"),
+    ])
+
+    alerts = engine.evaluate(make_master()).sort("identifier", "rule")
+
+    expected = pl.DataFrame({
+        "identifier": ["A", "A", "B", "B", "C"],
+        "Date": [3, 3, 3, 3, 3],
+        "rule": ["Close crosses above sma_21d", "overbought", "Close < sma_21d", "Close crosses below sma_21d", "overbought"],
+    })
+    assert_frame_equal(alerts, expected)
+
+def test_alert_engine_ignores_history():
+    # Close was below the SMA for A two days ago, but not anymore
+    alerts = AlertEngine([Comparison("Close", "<=", 9.0)]).evaluate(make_master())
+
+    assert alerts["identifier"].to_list() == ["B", "C"]
+
+def test_alert_engine_reads_identifiers_that_stopped_earlier():
+    # D stopped trading on day 2, right after crossing below its SMA
+    stale = pl.LazyFrame({"identifier": ["D", "D"], "Date": [1, 2], "Close": [11.0, 9.0], "sma_21d": [10.0, 10.0]})
+    master = pl.concat([make_master(), stale], how="diagonal")
+
+    alerts = AlertEngine([CrossBelow("Close", "sma_21d")]).evaluate(master).sort("identifier")
+
+    assert alerts.select("identifier", "Date").rows() == [("B", 3), ("D", 2)]
+
+def test_alert_engine_rejects_invalid_rules():
+    with pytest.raises(ValueError):
+        AlertEngine([Comparison("Close", "<", "sma_21d"), Comparison("Close", "<", "sma_21d")])
+    with pytest.raises(ValueError):
+        Comparison("Close", "=<", "sma_21d")
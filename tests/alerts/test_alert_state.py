@@ -0,0 +1,69 @@
+from datetime import date, timedelta
+import numpy as np
+import polars as pl
+from stock_alert.alerts import AlertEngine, AlertStateStore, Comparison
+
+def make_path(close: list[float], identifier: str = "A") -> pl.DataFrame:
+    return pl.DataFrame({
+        "identifier": identifier,
+        "Date": pl.date_range(date(2026, 1, 1), date(2026, 1, 1) + timedelta(days=len(close) - 1), eager=True),
+        "Close": close,
+        "sma_21d": 100.0,
+    })
+
+def run_daily(master: pl.DataFrame, engine: AlertEngine) -> list[date]:
+    """Evaluates the engine once per day on the rows known that day, returns the firing dates."""
+    fired = []
+    for day in master["Date"].unique().sort():
+        alerts = engine.evaluate(master.lazy().filter(pl.col("Date") <= day))
+        fired.extend(alerts["Date"].to_list())
+    return fired
+
+def test_alerts_fire_on_crossings_only(tmp_path):
+    # Oscillates around the SMA with a period of 20 days
+    close = (100 + 5 * np.sin(2 * np.pi * (np.arange(60) + 0.5) / 20)).tolist()
+    master = make_path(close)
+    engine = AlertEngine([Comparison("Close", "<", "sma_21d")], state_store=AlertStateStore(tmp_path / "state.parquet"))
+
+    fired = run_daily(master, engine)
+
+    below = master["Close"] < 100
+    crossings = master.filter(below & ~below.shift(1, fill_value=False))["Date"].to_list()
+    assert fired == crossings
+    assert len(fired) == 3
+
+def test_alerts_do_not_fire_again_on_the_same_data(tmp_path):
+    master = make_path([101.0, 99.0, 98.0]).lazy()
+    engine = AlertEngine([Comparison("Close", "<", "sma_21d")], state_store=AlertStateStore(tmp_path / "state.parquet"))
+
+    assert engine.evaluate(master).height == 1
+    assert engine.evaluate(master).height == 0
+
+def test_alerts_respect_cooldown(tmp_path):
+    # Crosses below the SMA every other day
+    master = make_path([101.0, 99.0] * 6)
+    engine = AlertEngine(
+        [Comparison("Close", "<", "sma_21d")],
+        state_store=AlertStateStore(tmp_path / "state.parquet"),
+        cooldown=timedelta(days=3),
+    )
+
+    fired = run_daily(master, engine)
+
+    assert [d.day for d in fired] == [2, 6, 10]
+
+def test_state_is_kept_per_identifier_and_rule(tmp_path):
+    store = AlertStateStore(tmp_path / "state.parquet")
+    engine = AlertEngine([Comparison("Close", "<", "sma_21d"), Comparison("Close", ">", 100.5)], state_store=store)
+    master = pl.concat([make_path([101.0, 99.0], "A"), make_path([99.0, 101.0], "B")])
+
+    alerts = engine.evaluate(master.lazy())
+    # B lags one day behind, its state is kept while A moves on
+    engine.evaluate(make_path([101.0, 99.0, 101.0], "A").lazy())
+
+    assert alerts.sort("identifier")["rule"].to_list() == ["Close < sma_21d", "Close > 100.5"]
+    # Alerts that never held are not stored
+    state = store.load().sort("identifier", "rule")
+    assert state.select("identifier", "rule", "active").rows() == [
+        ("A", "Close < sma_21d", False), ("A", "Close > 100.5", True), ("B", "Close > 100.5", True),
+    ]
@@ -1,6 +1,7 @@
+import numpy as np
 import polars as pl
 import pytest
-from datetime import date
+from datetime import date, datetime, timedelta
 from polars.testing import assert_series_equal
 from stock_alert.features.atomic_features import Returns, Volatility, Lag, RelativeStrengthIndex
 
@@ -60,4 +61,34 @@ def test_rsi_overbought():
     
     # Once the window is full (index 2 and 3), RSI should be 100
     assert result[2] == 100.0
-    assert result[3] == 100.0
\ No newline at end of file
+    assert result[3] == 100.0
+
+def test_duration_windows_match_a_brute_force_computation():
+    rng = np.random.default_rng(0)
+    # Hourly bars with random gaps, of two symbols
+    times = sorted(datetime(2026, 1, 1) + timedelta(hours=int(h)) for h in rng.choice(500, 200, replace=False))
+    df = pl.DataFrame({
+        "date": times * 2,
+        "price": rng.normal(100, 5, 400),
+        "symbol": ["A"] * 200 + ["B"] * 200,
+    })
+
+    volatility = Volatility(column="price", window_days="1d", sort_by="date", group_by="symbol", min_periods=2)
+    rsi = RelativeStrengthIndex(column="price", window_days="12h", sort_by="date", group_by="symbol")
+    result = df.with_columns(volatility.compute(), rsi.compute())
+
+    for symbol in ["A", "B"]:
+        rows = result.filter(pl.col("symbol") == symbol)
+        prices, dates = rows["price"].to_numpy(), rows["date"].to_list()
+        changes = np.diff(prices, prepend=np.nan)
+        for i, end in enumerate(dates):
+            in_day = [j for j in range(i + 1) if dates[j] > end - timedelta(days=1)]
+            expected = np.std(prices[in_day], ddof=1) if len(in_day) >= 2 else None
+            assert rows["volatility_1d_by_date_min2"][i] == pytest.approx(expected)
+
+            in_half_day = [j for j in range(i + 1) if dates[j] > end - timedelta(hours=12)]
+            gains = np.nan_to_num(np.clip(changes[in_half_day], 0, None)).mean()
+            losses = np.nan_to_num(np.clip(-changes[in_half_day], 0, None)).mean()
+            if losses > 0:
+                assert rows["rsi_12h_by_date"][i] == pytest.approx(100 - 100 / (1 + gains / losses))
+    assert rsi.lookback is None
@@ -0,0 +1,58 @@
+import os
+import polars as pl
+from polars.testing import assert_frame_equal
+from stock_alert.features import FeatureCache, FeatureEngine, MovingAverage
+from stock_alert.features.atomic_features import Distance, RelativeStrengthIndex, Returns
+
+def make_data(n_days: int = 30) -> pl.LazyFrame:
+    return pl.LazyFrame({
+        "symbol": ["A"] * n_days + ["B"] * n_days,
+        "date": list(range(n_days)) * 2,
+        "price": [100.0 + (i * 7) % 11 for i in range(2 * n_days)],
+    }).select(pl.all().shuffle(seed=3))
+
+def make_features(window: int = 5) -> list:
+    sma = MovingAverage(column="price", window_days=window, sort_by="date", group_by="symbol")
+    return [
+        sma,
+        Returns(column="price", n_days=1, sort_by="date", group_by="symbol"),
+        RelativeStrengthIndex(column="price", window_days=3, sort_by="date", group_by="symbol"),
+        Distance(column="price", reference=sma, sort_by="date", group_by="symbol"),
+    ]
+
+def test_cached_transform_matches_plain_transform(tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    plain = FeatureEngine(make_features()).transform(make_data()).collect()
+
+    first = FeatureEngine(make_features(), cache=cache).transform(make_data()).collect()
+    second = FeatureEngine(make_features(), cache=cache).transform(make_data()).collect()
+
+    assert (cache.hits, cache.misses) == (4, 4)
+    assert_frame_equal(first, plain)
+    assert_frame_equal(second, plain)
+
+def test_cache_only_recomputes_changed_features(tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    FeatureEngine(make_features(window=5), cache=cache).transform(make_data()).collect()
+
+    # The SMA and the distance from it change, the other features are reused
+    FeatureEngine(make_features(window=6), cache=cache).transform(make_data()).collect()
+    assert (cache.hits, cache.misses) == (2, 6)
+
+    # New data misses every feature
+    FeatureEngine(make_features(window=6), cache=cache).transform(make_data(31)).collect()
+    assert (cache.hits, cache.misses) == (2, 10)
+
+def test_cache_evicts_least_recently_used_columns(tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    engine = FeatureEngine([MovingAverage(column="price", window_days=5, sort_by="date", group_by="symbol")], cache=cache)
+    engine.transform(make_data()).collect()
+    (older,) = tmp_path.glob("*.parquet")
+    os.utime(older, (0, 0))
+
+    # Room for one column only
+    cache.max_bytes = int(older.stat().st_size * 1.5)
+    engine.transform(make_data().reverse()).collect()
+
+    assert not older.exists()
+    assert len(list(tmp_path.glob("*.parquet"))) == 1
@@ -1,5 +1,8 @@
 # tests/features/test_feature_engine.py
 import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+from stock_alert.features.atomic_features import Distance, Lag, RelativeStrengthIndex, Returns, Volatility
 from stock_alert.features.feature_base import FeatureEngine
 from stock_alert.features.moving_average import MovingAverage
 
@@ -28,4 +31,98 @@ def test_feature_engine_adds_multiple_columns():
     assert "price" in result_df.columns 
     
     # Quick value check for the 2d SMA
-    assert result_df["sma_2d"][1] == 15.0
\ No newline at end of file
+    assert result_df["sma_2d"][1] == 15.0
+
+def make_universe() -> pl.LazyFrame:
+    # Shuffled rows of three symbols, so every window has to sort
+    prices = [100.0, 103.0, 101.0, 104.0, 108.0, 107.0, 111.0, 109.0]
+    return pl.LazyFrame({
+        "symbol": ["A"] * 8 + ["B"] * 8 + ["C"] * 8,
+        "date": list(range(8)) * 3,
+        "price": prices + [p * 2 for p in prices] + prices[::-1],
+    }).select(pl.all().shuffle(seed=7))
+
+def test_feature_engine_plan_matches_independent_windows():
+    features = [
+        MovingAverage(column="price", window_days=3, sort_by="date", group_by="symbol"),
+        Returns(column="price", n_days=2, sort_by="date", group_by="symbol"),
+        Lag(column="price", n_days=2, sort_by="date", group_by="symbol"),
+        RelativeStrengthIndex(column="price", window_days=3, sort_by="date", group_by="symbol"),
+        RelativeStrengthIndex(column="price", window_days=4, sort_by="date", group_by="symbol"),
+        Volatility(column="price", window_days=3, sort_by="date", group_by="symbol"),
+    ]
+    data = make_universe()
+
+    planned = FeatureEngine(features).transform(data).collect()
+    independent = data.with_columns(f.compute() for f in features).collect()
+
+    # Hoisted shared sub-expressions do not leak into the output
+    assert planned.columns == independent.columns
+    # Rows come out sorted by the window
+    assert_frame_equal(planned, independent.sort("symbol", "date"))
+
+def test_feature_engine_sorts_each_window_once():
+    features = [MovingAverage(column="price", window_days=w, sort_by="date", group_by="symbol") for w in (2, 3, 4)]
+
+    plan = FeatureEngine(features).transform(make_universe()).explain()
+
+    assert plan.count("SORT BY") == 1
+
+def test_feature_engine_drops_duplicated_features():
+    features = [
+        MovingAverage(column="price", window_days=2, sort_by="date", group_by="symbol"),
+        MovingAverage(column="price", window_days=2, sort_by="date", group_by="symbol"),
+    ]
+
+    result = FeatureEngine(features).transform(make_universe()).collect()
+
+    assert result.columns.count("sma_2d") == 1
+
+def test_feature_engine_rejects_conflicting_features():
+    features = [
+        MovingAverage(column="price", window_days=2, sort_by="date", group_by="symbol"),
+        MovingAverage(column="volume", window_days=2, sort_by="date", group_by="symbol"),
+    ]
+
+    with pytest.raises(ValueError):
+        FeatureEngine(features).transform(make_universe())
+
+
+def test_feature_engine_computes_features_of_features():
+    sma = MovingAverage(column="price", window_days=3, sort_by="date", group_by="symbol")
+    returns = Returns(column="price", n_days=1, sort_by="date", group_by="symbol")
+    features = [
+        Distance(column="price", reference=sma, sort_by="date", group_by="symbol"),
+        RelativeStrengthIndex(column=returns, window_days=3, sort_by="date", group_by="symbol"),
+        returns,
+    ]
+
+    result = FeatureEngine(features).transform(make_universe()).collect()
+
+    # Requested inputs are kept, intermediate ones are dropped
+    assert result.columns == ["symbol", "date", "price", "returns_1d", "distance_price_sma_3d", "rsi_3d_of_returns_1d"]
+    staged = make_universe().with_columns(sma.compute(), returns.compute())
+    expected = staged.with_columns(
+        (pl.col("price") / pl.col("sma_3d") - 1).alias("distance_price_sma_3d"),
+        RelativeStrengthIndex(column="returns_1d", window_days=3, sort_by="date", group_by="symbol")
+        .compute().alias("rsi_3d_of_returns_1d"),
+    ).drop("sma_3d").sort("symbol", "date").collect()
+    assert_frame_equal(result, expected.select(result.columns))
+
+def test_feature_engine_adds_up_lookback_of_inputs():
+    returns = Returns(column="price", n_days=1, sort_by="date", group_by="symbol")
+    sma = MovingAverage(column="price", window_days=20, sort_by="date", group_by="symbol")
+    engine = FeatureEngine([
+        RelativeStrengthIndex(column=returns, window_days=14, sort_by="date", group_by="symbol"),
+        Distance(column="price", reference=sma, sort_by="date", group_by="symbol"),
+    ])
+
+    assert engine.lookback == 20
+
+def test_feature_engine_rejects_cycles():
+    first = MovingAverage(column="price", window_days=2, sort_by="date", group_by="symbol")
+    second = MovingAverage(column=first, window_days=2, sort_by="date", group_by="symbol")
+    first.inputs = (second,)
+
+    with pytest.raises(ValueError, match="Cyclic"):
+        FeatureEngine([second]).transform(make_universe())
@@ -1,3 +1,4 @@
+from datetime import date
 import polars as pl
 from polars.testing import assert_series_equal
 from stock_alert.features.moving_average import MovingAverage
@@ -39,4 +40,23 @@ def test_moving_average_with_groups():
     
     expected = pl.Series("sma_2d", [None, 15.0, None, 150.0])
     
-    assert_series_equal(result, expected)
\ No newline at end of file
+    assert_series_equal(result, expected)
+
+def test_moving_average_duration_window_skips_missing_days():
+    df = pl.DataFrame({
+        "stock": ["A", "A", "A", "A", "B", "B"],
+        "date": [date(2026, 1, d) for d in (1, 2, 5, 6)] + [date(2026, 1, 1), date(2026, 1, 3)],
+        "price": [10.0, 20.0, 30.0, 40.0, 100.0, 200.0],
+    })
+
+    sma = MovingAverage(column="price", window_days="3d", sort_by="date", group_by="stock")
+    result = df.select(sma.compute()).to_series()
+
+    # The gap from the 2nd to the 5th empties the window instead of spanning it
+    expected = pl.Series("sma_3d_by_date", [10.0, 15.0, 30.0, 35.0, 100.0, 150.0])
+    assert_series_equal(result, expected)
+    assert sma.lookback is None
+
+    strict = MovingAverage(column="price", window_days="3d", sort_by="date", group_by="stock", min_periods=2)
+    assert df.select(strict.compute()).to_series().to_list() == [None, 15.0, None, 35.0, None, 150.0]
+    assert strict.name == "sma_3d_by_date_min2"
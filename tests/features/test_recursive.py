@@ -0,0 +1,110 @@
+import numpy as np
+import polars as pl
+import pytest
+from stock_alert.features.atomic_features import Distance, Lag, RelativeStrengthIndex, Returns, Volatility
+from stock_alert.features.feature_base import FeatureEngine
+from stock_alert.features.moving_average import MovingAverage
+from stock_alert.features.recursive import (
+    MACD, AverageTrueRange, BollingerBand, ExponentialMovingAverage, WilderRelativeStrengthIndex,
+)
+from stock_alert.features.streaming import StreamingEngine
+from stock_alert.fetcher import SyntheticFetcher
+
+def make_bars() -> pl.DataFrame:
+    data = SyntheticFetcher(n_identifiers=3, n_days=300, seed=5).scan().collect()
+    # A few missing bars, which both forms skip
+    rng = np.random.default_rng(0)
+    missing = pl.Series(rng.random(data.height) < 0.02)
+    return data.with_columns(
+        pl.when(missing).then(None).otherwise(pl.col(column)).alias(column) for column in ["High", "Close"]
+    )
+
+def make_features() -> list:
+    macd = MACD("Close", 12, 26, sort_by="Date", group_by="identifier")
+    return [
+        ExponentialMovingAverage("Close", 10, sort_by="Date", group_by="identifier"),
+        WilderRelativeStrengthIndex("Close", 14, sort_by="Date", group_by="identifier"),
+        macd,
+        # Signal line, fed by the MACD on the same bar
+        ExponentialMovingAverage(macd, 9, sort_by="Date", group_by="identifier"),
+        AverageTrueRange(14, sort_by="Date", group_by="identifier"),
+        BollingerBand("Close", 20, 2.0, "upper", sort_by="Date", group_by="identifier"),
+        BollingerBand("Close", 20, 2.0, "lower", sort_by="Date", group_by="identifier"),
+        # Rolling features keep their window
+        MovingAverage("Close", 21, sort_by="Date", group_by="identifier"),
+        MovingAverage("Close", 10, sort_by="Date", group_by="identifier", min_periods=3),
+        Volatility("Close", 21, sort_by="Date", group_by="identifier"),
+        RelativeStrengthIndex("Close", 14, sort_by="Date", group_by="identifier"),
+        Returns("Close", 1, sort_by="Date", group_by="identifier"),
+        Lag("Close", 2, sort_by="Date", group_by="identifier"),
+        # Row-wise, reading an intermediate EMA
+        Distance("Close", ExponentialMovingAverage("Close", 50, sort_by="Date", group_by="identifier"),
+                 sort_by="Date", group_by="identifier"),
+    ]
+
+def test_streaming_states_agree_with_the_vectorised_features():
+    bars = make_bars()
+    features = make_features()
+    expected = FeatureEngine(features).transform(bars.lazy()).collect()
+
+    engine = StreamingEngine(features)
+    streamed = [engine.update(row["identifier"], row) for row in expected.select(bars.columns).iter_rows(named=True)]
+
+    for feature in features:
+        values = [row[feature.name] for row in streamed]
+        column = expected[feature.name].to_list()
+        assert [v is None for v in values] == [v is None for v in column], feature.name
+        pairs = [(v, e) for v, e in zip(values, column) if v is not None]
+        assert [v for v, _ in pairs] == pytest.approx([e for _, e in pairs], rel=1e-7, abs=1e-9), feature.name
+    assert engine.states.keys() == set(bars["identifier"].unique())
+
+def test_wilder_rsi_matches_a_textbook_computation():
+    closes = [44.34, 44.09, 44.15, 43.61, 44.33, 44.83, 45.10, 45.42, 45.84, 46.08,
+              45.89, 46.03, 45.61, 46.28, 46.28, 46.00, 46.03, 46.41, 46.22, 45.64]
+    rsi = WilderRelativeStrengthIndex("price", 14, sort_by="t")
+    result = pl.DataFrame({"t": range(len(closes)), "price": closes}).select(rsi.compute()).to_series()
+
+    changes = np.diff(closes)
+    gain, loss = np.clip(changes, 0, None), np.clip(-changes, 0, None)
+    avg_gain, avg_loss = gain[:14].mean(), loss[:14].mean()
+    expected = [100 - 100 / (1 + avg_gain / avg_loss)]
+    for up, down in zip(gain[14:], loss[14:]):
+        avg_gain, avg_loss = (avg_gain * 13 + up) / 14, (avg_loss * 13 + down) / 14
+        expected.append(100 - 100 / (1 + avg_gain / avg_loss))
+
+    assert result[:14].null_count() == 14
+    assert result[14:].to_list() == pytest.approx(expected)
+    assert result[14] == pytest.approx(70.46, abs=0.01)
+
+def test_streamed_bollinger_band_is_accurate_on_a_crash():
+    # A crash from 1000 to 1 then flat, far from the first price the window saw
+    prices = [*np.geomspace(1000, 1, 100), *[1.0] * 30]
+    engine = StreamingEngine([BollingerBand("price", 5, 2.0, "upper", sort_by="t")])
+    name = engine.features[0].name
+    streamed = [engine.update("A", {"t": t, "price": float(price)})[name] for t, price in enumerate(prices)]
+    expected = pl.DataFrame({"t": range(len(prices)), "price": prices}).select(engine.features[0].compute()).to_series()
+
+    assert streamed[4:] == pytest.approx(expected[4:].to_list(), rel=1e-9)
+    assert streamed[-20:] == pytest.approx([1.0] * 20, rel=1e-9)
+
+def test_streamed_volatility_is_accurate_on_a_crash():
+    # A crash from 1000 to 1 then flat, far from the first price the window saw
+    prices = [*np.geomspace(1000, 1, 100), *[1.0] * 30]
+    engine = StreamingEngine([Volatility("price", 5, sort_by="t")])
+    name = engine.features[0].name
+    streamed = [engine.update("A", {"t": t, "price": float(price)})[name] for t, price in enumerate(prices)]
+    expected = pl.DataFrame({"t": range(len(prices)), "price": prices}).select(engine.features[0].compute()).to_series()
+
+    assert streamed[4:] == pytest.approx(expected[4:].to_list(), rel=1e-9)
+    assert streamed[-20:] == [0.0] * 20
+
+def test_features_without_state_are_rejected():
+    sma = MovingAverage("Close", "21d", sort_by="Date")
+    with pytest.raises(ValueError, match="sma_21d_by_Date"):
+        StreamingEngine([sma])
+    # Also when only read by a streamable feature
+    with pytest.raises(ValueError, match="sma_21d_by_Date"):
+        StreamingEngine([Distance("Close", sma, sort_by="Date")])
+    assert sma.state() is None
+    with pytest.raises(ValueError):
+        BollingerBand("Close", band="middle")
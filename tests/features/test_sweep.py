@@ -0,0 +1,81 @@
+import numpy as np
+import polars as pl
+import pytest
+from stock_alert.features.atomic_features import RelativeStrengthIndex, Volatility
+from stock_alert.features.feature_base import FeatureEngine
+from stock_alert.features.moving_average import MovingAverage
+
+WINDOWS = [2, 3, 5, 21, 60]
+
+def make_data(offset: float = 100.0, scale: float = 1.0, seed: int = 0) -> pl.LazyFrame:
+    """Random walks of three symbols, shuffled, with a few missing prices."""
+    rng = np.random.default_rng(seed)
+    n = 300
+    close = offset + scale * np.cumsum(rng.normal(0, 1, (3, n)), axis=1).ravel()
+    close[rng.choice(close.size, 10, replace=False)] = np.nan
+    return pl.LazyFrame({
+        "symbol": np.repeat(["A", "B", "C"], n),
+        "date": np.tile(np.arange(n), 3),
+        "price": close,
+    }).with_columns(pl.col("price").fill_nan(None)).select(pl.all().shuffle(seed=seed))
+
+def assert_sweep_matches(sweep, per_window, data, rtol):
+    expected = FeatureEngine(per_window).transform(data).collect()
+    result = FeatureEngine(sweep).transform(data).collect()
+    # Both come out sorted by symbol and date
+    assert result.select("symbol", "date").equals(expected.select("symbol", "date"))
+    for feature in per_window:
+        assert result[feature.name].is_null().equals(expected[feature.name].is_null()), feature.name
+        assert result[feature.name].to_numpy() == pytest.approx(expected[feature.name].to_numpy(), rel=rtol, nan_ok=True)
+
+@pytest.mark.parametrize("cls, rtol", [(MovingAverage, 1e-9), (Volatility, 1e-12), (RelativeStrengthIndex, 1e-9)])
+def test_sweep_matches_per_window_features(cls, rtol):
+    sweep = cls.sweep("price", WINDOWS, sort_by="date", group_by="symbol")
+    per_window = [cls("price", window, sort_by="date", group_by="symbol") for window in WINDOWS]
+    assert_sweep_matches(sweep, per_window, make_data(), rtol)
+
+def test_sweep_is_stable_far_from_zero():
+    # Running sums of raw prices around 1e6 would cancel out the digits of the small moves
+    data = make_data(offset=1e6, scale=0.01)
+    sweep = [*MovingAverage.sweep("price", WINDOWS, "date", "symbol"), *Volatility.sweep("price", WINDOWS, "date", "symbol")]
+    per_window = [cls("price", window, "date", "symbol") for cls in (MovingAverage, Volatility) for window in WINDOWS]
+    assert_sweep_matches(sweep, per_window, data, rtol=1e-5)
+
+def test_sweep_is_accurate_on_a_crash():
+    # A crash from 1000 to 1 then flat, and a noisy downtrend: the prices end far from where they started
+    rng = np.random.default_rng(1)
+    crash = np.concatenate([np.geomspace(1000, 1, 100), np.ones(200)])
+    downtrend = 1000 * np.exp(np.cumsum(rng.normal(-0.02, 0.03, 300)))
+    data = pl.LazyFrame({
+        "symbol": np.repeat(["crash", "downtrend"], 300),
+        "date": np.tile(np.arange(300), 2),
+        "price": np.concatenate([crash, downtrend]),
+    })
+    features = [MovingAverage, Volatility, RelativeStrengthIndex]
+    sweep = [feature for cls in features for feature in cls.sweep("price", WINDOWS, "date", "symbol")]
+    per_window = [cls("price", window, "date", "symbol") for cls in features for window in WINDOWS]
+    assert_sweep_matches(sweep, per_window, data, rtol=1e-9)
+
+    flat = FeatureEngine(sweep).transform(data).filter(pl.col("symbol") == "crash", pl.col("date") >= 160).collect()
+    for window in WINDOWS:
+        assert (flat[Volatility("price", window, "date").name] == 0).all()
+
+def test_sweep_with_min_periods_and_segments():
+    data = make_data().with_columns((pl.col("date") // 100).alias("segment"))
+    sweep = MovingAverage.sweep("price", WINDOWS, "date", "symbol", min_periods=2)
+    per_window = [MovingAverage("price", window, "date", "symbol", min_periods=2) for window in WINDOWS]
+
+    expected = FeatureEngine(per_window).transform(data, segment_by=["segment"]).collect()
+    result = FeatureEngine(sweep).transform(data, segment_by=["segment"]).collect()
+    for feature in per_window:
+        assert result[feature.name].to_numpy() == pytest.approx(expected[feature.name].to_numpy(), rel=1e-9, nan_ok=True)
+
+    # Evaluated on its own, partition by partition, a sweep feature gives the same values
+    alone = data.sort("symbol", "date").select(sweep[-1].compute()).collect().to_series()
+    assert alone.to_numpy() == pytest.approx(
+        data.sort("symbol", "date").select(per_window[-1].compute()).collect().to_series().to_numpy(), rel=1e-9, nan_ok=True
+    )
+
+def test_sweep_requires_row_windows():
+    with pytest.raises(ValueError):
+        MovingAverage("price", "21d", sort_by="date", cumulative=True)
@@ -0,0 +1,124 @@
+import os
+import pandas as pd
+import polars as pl
+import pytest
+from datetime import date, datetime
+from dashboard.data_service import DashboardDataService, band_polygons, downsample
+from stock_alert.fetcher import SyntheticFetcher
+
+@pytest.fixture
+def master_path(tmp_path):
+    path = tmp_path / "master_table.parquet"
+    SyntheticFetcher(n_identifiers=6, n_days=600, late_listing_rate=0).scan().collect().write_parquet(path)
+    return path
+
+def test_peer_view_matches_per_ticker_computation(master_path):
+    service = DashboardDataService(str(master_path))
+    tickers = ["SYN00003", "SYN00001"]
+
+    view = service.peer_view(tickers, "6 Months")
+
+    df = pd.read_parquet(master_path)
+    start = df["Date"].max() - pd.Timedelta(days=180)
+    df = df[df["identifier"].isin(tickers) & (df["Date"] >= start)].sort_values(["identifier", "Date"])
+    for ticker in tickers:
+        rows = df[df["identifier"] == ticker]
+        expected = (rows["Close"] / rows["Close"].iloc[0]).to_numpy()
+        normalized = view.normalized.filter(pl.col("identifier") == ticker)["Normalized Price"].to_numpy()
+        assert normalized == pytest.approx(expected)
+        performance = view.performance.filter(pl.col("identifier") == ticker)["Performance"].item()
+        assert performance == pytest.approx((expected[-1] - 1) * 100)
+
+    assert view.performance["Performance"].is_sorted(descending=True)
+    assert view.peer_average["Date"].is_sorted()
+
+def test_queries_push_predicates_down(master_path):
+    service = DashboardDataService(str(master_path))
+
+    plan = service._filtered(("SYN00001",), "1 Month", ("Close",)).explain()
+
+    # Filters and projection are applied by the parquet reader
+    scan = plan[plan.index("Parquet SCAN"):]
+    assert "SELECTION" in scan
+    assert "PROJECT 3/" in scan
+
+def test_results_are_cached_until_the_table_changes(master_path):
+    service = DashboardDataService(str(master_path), cache_size=2)
+
+    first = service.peer_view(["SYN00001", "SYN00002"], "YTD")
+    assert service.peer_view(["SYN00002", "SYN00001"], "YTD") is first
+    assert service.cache_info()["peer_view"].hits == 1
+
+    stat = master_path.stat()
+    os.utime(master_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert service.peer_view(["SYN00001", "SYN00002"], "YTD") is not first
+    with pytest.raises(ValueError):
+        service.start_date("2 Weeks")
+
+def test_regimes_are_clipped_to_the_horizon(master_path):
+    from stock_alert.features import FeatureEngine
+    from stock_alert.features.atomic_features import RelativeStrengthIndex
+    from stock_alert.regimes import RegimeBands
+
+    rsi = RelativeStrengthIndex(column="Close", window_days=14, sort_by="Date", group_by="identifier")
+    FeatureEngine([rsi]).transform(pl.scan_parquet(master_path)).collect().write_parquet(master_path)
+    service = DashboardDataService(str(master_path))
+    tickers = ["SYN00001", "SYN00004"]
+
+    # Computed from the master table without the derived table
+    computed = service.regimes(tickers, "1 Year")
+    RegimeBands().save(pl.scan_parquet(master_path), master_path.parent / "rsi_14d_regimes.parquet")
+    stored = DashboardDataService(str(master_path)).regimes(tickers, "1 Year")
+
+    start = service.start_date("1 Year")
+    assert stored.height > 0
+    assert stored["identifier"].unique().sort().to_list() == tickers
+    assert (stored["start"] >= start).all() and (stored["end"] >= start).all()
+    # Bands starting within the horizon are the same, whichever way they were computed
+    columns = ["identifier", "regime", "start", "end", "ongoing"]
+    assert computed.select(columns).filter(pl.col("start") > start).equals(
+        stored.select(columns).filter(pl.col("start") > start)
+    )
+
+def test_dates_stored_as_date(master_path):
+    from stock_alert.features import FeatureEngine
+    from stock_alert.features.atomic_features import RelativeStrengthIndex
+
+    rsi = RelativeStrengthIndex(column="Close", window_days=14, sort_by="Date", group_by="identifier")
+    data = FeatureEngine([rsi]).transform(pl.scan_parquet(master_path)).with_columns(pl.col("Date").dt.date())
+    data.collect().write_parquet(master_path)
+    service = DashboardDataService(str(master_path))
+
+    last = pl.read_parquet(master_path)["Date"].max()
+    assert service.last_date() == datetime(last.year, last.month, last.day)
+    assert service.start_date("YTD") == datetime(last.year, 1, 1)
+    history = service.history(["SYN00001"], "1 Month")
+    assert history["Date"].min() >= date.fromordinal(last.toordinal() - 30) and history["Date"].max() == last
+    assert (service.regimes(["SYN00001"], "1 Year")["start"] >= service.start_date("1 Year").date()).all()
+
+def test_band_polygons_are_clipped_to_the_visible_range():
+    bands = pl.DataFrame({"start": [date(2024, 1, 1), date(2024, 2, 1), date(2024, 3, 1)],
+                          "end": [date(2024, 1, 10), date(2024, 2, 20), date(2024, 3, 5)]})
+
+    x, y = band_polygons(bands, 0.0, 1.0, start=date(2024, 1, 5), end=date(2024, 2, 10))
+
+    # The first band starts at the visible start, the second ends at the visible end, the third is hidden
+    assert x[:5] == [date(2024, 1, 5), date(2024, 1, 5), date(2024, 1, 10), date(2024, 1, 10), None]
+    assert x[5:] == [date(2024, 2, 1), date(2024, 2, 1), date(2024, 2, 10), date(2024, 2, 10), None]
+    assert y == [0.0, 1.0, 1.0, 0.0, None] * 2
+    assert band_polygons(bands, 0.0, 1.0)[0][:2] == [date(2024, 1, 1)] * 2
+
+def test_downsample_keeps_extremes_of_every_trace(master_path):
+    data = pl.read_parquet(master_path).sort("identifier", "Date")
+
+    sampled = downsample(data, 200, ["Close", "Volume"], ["identifier"])
+
+    for (identifier,), rows in data.group_by("identifier"):
+        trace = sampled.filter(pl.col("identifier") == identifier)
+        assert 0 < trace.height <= 200
+        assert trace["Date"].is_sorted()
+        assert trace["Date"].first() == rows["Date"].min() and trace["Date"].last() == rows["Date"].max()
+        for column in ["Close", "Volume"]:
+            assert trace[column].max() == rows[column].max() and trace[column].min() == rows[column].min()
+    # Short traces are left at their original resolution
+    assert downsample(data, 1000, ["Close"], ["identifier"]).equals(data)
@@ -0,0 +1,229 @@
+import time
+import pandas as pd
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+from stock_alert.fetcher import ReplayFetcher, SyntheticFetcher, YFinanceFetcher
+from stock_alert.storage import PartitionedStore
+
+LATENCY = 0.05
+
+def stub_history(identifier: str, period: str | None, start: pd.Timestamp | None, timeout: float) -> pd.DataFrame:
+    """Offline history provider that injects a fixed network latency."""
+    time.sleep(LATENCY)
+    dates = pd.date_range("2026-01-01", periods=3, freq="D", name="Date")
+    return pd.DataFrame({"Close": [1.0, 2.0, 3.0]}, index=dates)
+
+class FlakyHistory:
+    """Fails the first `failures` calls for every identifier listed in `broken`."""
+    def __init__(self, broken: set[str], failures: int) -> None:
+        self.broken = broken
+        self.failures = failures
+        self.calls: dict[str, int] = {}
+
+    def __call__(self, identifier: str, period: str | None, start: pd.Timestamp | None, timeout: float) -> pd.DataFrame:
+        self.calls[identifier] = self.calls.get(identifier, 0) + 1
+        if identifier in self.broken and self.calls[identifier] <= self.failures:
+            raise ConnectionError(f"{identifier} unavailable")
+        return stub_history(identifier, period, start, timeout)
+
+class FakeMarket:
+    """History provider serving an in-memory market that can move forward in time."""
+    def __init__(self, identifiers: list[str], days: int) -> None:
+        self.history = {identifier: self._bars(identifier, days) for identifier in identifiers}
+
+    @staticmethod
+    def _bars(identifier: str, days: int) -> pd.DataFrame:
+        dates = pd.date_range("2026-01-01", periods=days, freq="D", name="Date", tz="America/New_York")
+        base = 100.0 + len(identifier)
+        return pd.DataFrame({
+            "Close": [base + i for i in range(days)],
+            "Dividends": 0.0,
+            "Stock Splits": 0.0,
+        }, index=dates)
+
+    def advance(self, identifier: str, days: int, dividend: float = 0.0) -> None:
+        history = self.history[identifier]
+        more = self._bars(identifier, len(history) + days).iloc[len(history):]
+        more.iloc[-1, more.columns.get_loc("Dividends")] = dividend
+        self.history[identifier] = pd.concat([history, more])
+
+    def __call__(self, identifier: str, period: str | None, start: pd.Timestamp | None, timeout: float) -> pd.DataFrame:
+        history = self.history[identifier]
+        if start is not None:
+            history = history[history.index >= start]
+        return history.copy()
+
+def test_concurrent_fetch_matches_sequential_and_is_faster():
+    identifiers = [f"T{i}" for i in range(20)]
+
+    start = time.perf_counter()
+    sequential = YFinanceFetcher(identifiers, history_provider=stub_history).fetch()
+    sequential_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    concurrent = YFinanceFetcher(identifiers, max_workers=10, history_provider=stub_history).fetch()
+    concurrent_time = time.perf_counter() - start
+
+    pd.testing.assert_frame_equal(sequential, concurrent)
+    assert concurrent["identifier"].unique().tolist() == identifiers
+    # 20 calls of 50ms: ~1s sequentially vs ~0.1s with 10 in flight
+    assert concurrent_time < sequential_time / 3
+
+def test_retries_recover_transient_failures():
+    provider = FlakyHistory(broken={"B"}, failures=1)
+    fetcher = YFinanceFetcher(["A", "B"], max_retries=1, backoff=0, history_provider=provider)
+
+    data = fetcher.fetch()
+
+    assert provider.calls["B"] == 2
+    assert sorted(data["identifier"].unique()) == ["A", "B"]
+    assert fetcher.last_result.failures == []
+
+def test_failures_are_reported_in_result():
+    provider = FlakyHistory(broken={"B"}, failures=10)
+    fetcher = YFinanceFetcher(["A", "B", "C"], max_workers=3, max_retries=2, backoff=0, history_provider=provider)
+
+    result = fetcher.fetch_all()
+
+    assert result.failed_identifiers == ["B"]
+    assert result.failures[0].attempts == 3
+    assert "B unavailable" in result.failures[0].error
+    assert result.data.collect()["identifier"].unique(maintain_order=True).to_list() == ["A", "C"]
+    assert set(result.latencies) == {"A", "B", "C"}
+
+def test_fetch_raises_when_everything_fails():
+    provider = FlakyHistory(broken={"A"}, failures=10)
+    fetcher = YFinanceFetcher(["A"], max_retries=0, history_provider=provider)
+
+    with pytest.raises(ValueError):
+        fetcher.fetch()
+
+def test_incremental_fetch_only_requests_missing_days(tmp_path):
+    market = FakeMarket(["A", "B"], days=100)
+    YFinanceFetcher(["A", "B"], cache_dir=str(tmp_path), history_provider=market).fetch()
+
+    market.advance("A", days=2)
+    market.advance("B", days=2)
+    fetcher = YFinanceFetcher(["A", "B"], cache_dir=str(tmp_path), history_provider=market, incremental=True)
+    data = fetcher.fetch()
+
+    # Two overlapping days plus the two new ones per identifier
+    assert fetcher.last_result.rows_fetched == 8
+    assert fetcher.last_result.full_refreshes == []
+    assert data.groupby("identifier").size().to_dict() == {"A": 102, "B": 102}
+    assert not data.duplicated(subset=["identifier", "Date"]).any()
+    assert data[data["identifier"] == "A"]["Close"].tolist() == market.history["A"]["Close"].tolist()
+
+def test_incremental_fetch_replaces_a_partial_last_bar(tmp_path):
+    market = FakeMarket(["A"], days=10)
+    # Cached during the trading day: the last bar closes higher than cached
+    YFinanceFetcher(["A"], cache_dir=str(tmp_path), history_provider=market).fetch()
+    market.history["A"].iloc[-1, 0] += 0.5
+    market.advance("A", days=1)
+
+    fetcher = YFinanceFetcher(["A"], cache_dir=str(tmp_path), history_provider=market, incremental=True)
+    data = fetcher.fetch()
+
+    assert fetcher.last_result.full_refreshes == []
+    assert fetcher.last_result.rows_fetched == 3
+    assert data["Close"].tolist() == market.history["A"]["Close"].tolist()
+
+def test_incremental_fetch_refreshes_new_identifiers(tmp_path):
+    market = FakeMarket(["A", "NEW"], days=10)
+    YFinanceFetcher(["A"], cache_dir=str(tmp_path), history_provider=market).fetch()
+
+    fetcher = YFinanceFetcher(["A", "NEW"], cache_dir=str(tmp_path), history_provider=market, incremental=True)
+    data = fetcher.fetch()
+
+    assert fetcher.last_result.full_refreshes == ["NEW"]
+    assert data["identifier"].unique().tolist() == ["A", "NEW"]
+    assert len(data) == 20
+
+def test_incremental_fetch_refetches_restated_history(tmp_path):
+    market = FakeMarket(["A", "B"], days=10)
+    YFinanceFetcher(["A", "B"], cache_dir=str(tmp_path), history_provider=market).fetch()
+
+    # A is re-adjusted retroactively, B pays a dividend on its newest day
+    market.history["A"]["Close"] *= 0.5
+    market.advance("B", days=1, dividend=0.25)
+    fetcher = YFinanceFetcher(["A", "B"], cache_dir=str(tmp_path), history_provider=market, incremental=True)
+    data = fetcher.fetch()
+
+    assert fetcher.last_result.full_refreshes == ["A", "B"]
+    assert data[data["identifier"] == "A"]["Close"].tolist() == market.history["A"]["Close"].tolist()
+    assert len(data[data["identifier"] == "B"]) == 11
+
+def test_scan_streams_from_the_cache(tmp_path):
+    market = FakeMarket(["C", "A", "B"], days=10)
+    fetcher = YFinanceFetcher(["C", "A", "B"], cache_dir=str(tmp_path), max_workers=3, history_provider=market)
+
+    data = fetcher.scan()
+
+    assert "Parquet SCAN" in data.explain()
+    assert data.collect()["identifier"].unique(maintain_order=True).to_list() == ["C", "A", "B"]
+
+def test_scan_batches_yields_sorted_identifier_batches(tmp_path):
+    market = FakeMarket(["C", "A", "B"], days=10)
+    fetcher = YFinanceFetcher(["C", "A", "B"], cache_dir=str(tmp_path), history_provider=market)
+
+    batches = [batch.collect() for batch in fetcher.scan_batches(batch_size=2)]
+
+    assert [batch["identifier"].unique(maintain_order=True).to_list() for batch in batches] == [["A", "B"], ["C"]]
+
+def test_incremental_mode_requires_cache_dir():
+    with pytest.raises(ValueError):
+        YFinanceFetcher(["A"], incremental=True)
+
+
+def test_synthetic_fetcher_is_deterministic():
+    data = SyntheticFetcher(n_identifiers=20, n_days=300, seed=1).scan().collect()
+    again = SyntheticFetcher(n_identifiers=20, n_days=300, seed=1).scan().collect()
+    other = SyntheticFetcher(n_identifiers=20, n_days=300, seed=2).scan().collect()
+    batches = pl.concat(b.collect() for b in SyntheticFetcher(n_identifiers=20, n_days=300, seed=1).scan_batches(6))
+
+    assert_frame_equal(data, again)
+    assert_frame_equal(batches, data)
+    assert not data["Close"].equals(other["Close"])
+    # An identifier does not depend on the size of the universe
+    smaller = SyntheticFetcher(n_identifiers=5, n_days=300, seed=1).scan().collect()
+    assert_frame_equal(smaller, data.filter(pl.col("identifier").is_in(smaller["identifier"].implode())))
+
+def test_synthetic_fetcher_produces_realistic_bars():
+    fetcher = SyntheticFetcher(n_identifiers=50, n_days=504, missing_rate=0.01, late_listing_rate=0.2)
+    data = fetcher.scan().collect()
+
+    calendar = fetcher.calendar()
+    assert len(calendar) == 504 - 18
+    assert calendar.dayofweek.max() < 5
+    assert data["Date"].is_in(pl.Series(calendar).implode()).all()
+
+    per_identifier = data.group_by("identifier").agg(pl.len(), pl.col("Date").min())
+    assert per_identifier.height == 50
+    assert (per_identifier["len"] < len(calendar)).mean() > 0.8
+    assert (per_identifier["Date"] > calendar[0]).any()
+    assert data.filter((pl.col("Low") > pl.min_horizontal("Open", "Close")) | (pl.col("High") < pl.max_horizontal("Open", "Close"))).is_empty()
+
+@pytest.mark.parametrize("source", ["store", "parquet", "csv"])
+def test_replay_fetcher_filters_source(tmp_path, source):
+    data = SyntheticFetcher(n_identifiers=4, n_days=600).scan().collect()
+    if source == "store":
+        PartitionedStore(tmp_path / "stocks").replace(data)
+        path = tmp_path / "stocks"
+    elif source == "parquet":
+        path = tmp_path / "stocks.parquet"
+        data.write_parquet(path)
+    else:
+        # CSV has no time zone
+        data = data.with_columns(pl.col("Date").dt.replace_time_zone(None))
+        path = tmp_path / "stocks.csv"
+        data.write_csv(path)
+
+    end = pd.Timestamp("2016-01-31", tz="America/New_York")
+    replayed = ReplayFetcher(str(path), identifiers=["SYN00001", "SYN00003"], end=end).scan().collect()
+
+    expected = data.filter(
+        pl.col("identifier").is_in(["SYN00001", "SYN00003"]),
+        pl.col("Date").dt.date() <= end.date(),
+    )
+    assert_frame_equal(replayed.sort("identifier", "Date"), expected.sort("identifier", "Date"), check_dtypes=False)
@@ -0,0 +1,45 @@
+import importlib
+import re
+import subprocess
+import sys
+import pytest
+import stock_alert
+
+# Cumulative import time of the packages, without the dependencies they defer
+STARTUP_BUDGET_US = 50_000
+
+def import_times(code: str) -> dict[str, int]:
+    """Cumulative import time in microseconds of every module imported by `code`, in a fresh interpreter."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|(\s+)(\S+)", line)
+        if match:
+            times[match.group(3)] = int(match.group(1))
+    return times
+
+def test_package_import_defers_heavy_dependencies():
+    times = import_times("import stock_alert, stock_alert.features, stock_alert.alerts, common.logger")
+
+    assert not {"yfinance", "pandas", "polars", "colorlog"} & times.keys()
+    assert times["stock_alert"] + times["stock_alert.features"] < STARTUP_BUDGET_US
+
+def test_features_do_not_import_network_dependencies():
+    times = import_times("from stock_alert.features import FeatureEngine, MovingAverage; import stock_alert.features.atomic_features")
+
+    assert "polars" in times
+    assert not {"yfinance", "pandas"} & times.keys()
+
+def test_lazy_exports_resolve():
+    from stock_alert.fetcher import SyntheticFetcher
+
+    assert stock_alert.SyntheticFetcher is SyntheticFetcher
+    assert set(stock_alert.__all__) <= set(dir(stock_alert))
+    with pytest.raises(AttributeError):
+        stock_alert.Missing
+
+@pytest.mark.parametrize("module", ["stock_alert", "stock_alert.features", "stock_alert.alerts"])
+def test_all_lists_every_lazy_export(module):
+    package = importlib.import_module(module)
+
+    assert sorted(package.__all__) == sorted(package._EXPORTS)
@@ -0,0 +1,148 @@
+import json
+import polars as pl
+import pytest
+from stock_alert.alerts import AlertEngine, AlertStateStore, CrossBelow
+from stock_alert.features import FeatureEngine, MovingAverage
+from stock_alert.features.atomic_features import RelativeStrengthIndex
+from stock_alert.features.recursive import ExponentialMovingAverage
+from stock_alert.fetcher import SyntheticFetcher
+from stock_alert.intraday import FileTailSource, StreamingPipeline
+from stock_alert.schema import MasterSchema
+from stock_alert.transformer import Difference
+
+def make_features() -> list:
+    return [
+        MovingAverage("Close", 21, sort_by="Date", group_by="identifier"),
+        RelativeStrengthIndex("Close", 14, sort_by="Date", group_by="identifier"),
+        ExponentialMovingAverage("Close", 10, sort_by="Date", group_by="identifier"),
+    ]
+
+def append_bars(path, bars: pl.DataFrame) -> None:
+    with open(path, "a") as file:
+        for bar in bars.iter_rows(named=True):
+            file.write(json.dumps({**bar, "Date": bar["Date"].isoformat()}) + "\n")
+
+@pytest.fixture
+def bars():
+    return SyntheticFetcher(n_identifiers=4, n_days=200, seed=3).scan().collect()
+
+def make_pipeline(tmp_path, source, **kwargs) -> StreamingPipeline:
+    return StreamingPipeline(
+        source, make_features(), str(tmp_path / "transformed"),
+        transformers=[Difference("Close", "sma_21d")], max_batch_size=50, max_batch_delay=0.01, **kwargs,
+    )
+
+def test_streamed_bars_continue_the_history(tmp_path, bars):
+    cutoff = bars["Date"].unique().sort()[150]
+    history = bars.filter(pl.col("Date") < cutoff)
+    (tmp_path / "transformed").mkdir()
+    transformed = Difference("Close", "sma_21d").transform(FeatureEngine(make_features()).transform(history.lazy()))
+    transformed.collect().write_parquet(tmp_path / "transformed" / "master_table.parquet")
+    # Bars arrive by date, across identifiers, with one replayed bar
+    stream = bars.filter(pl.col("Date") >= cutoff).sort("Date", "identifier")
+    append_bars(tmp_path / "bars.jsonl", pl.concat([history.tail(1), stream]))
+
+    pipeline = make_pipeline(tmp_path, FileTailSource(str(tmp_path / "bars.jsonl")))
+    while pipeline.step().height or pipeline.metrics.bars < stream.height:
+        pass
+    pipeline.compact()
+
+    expected = Difference("Close", "sma_21d").transform(FeatureEngine(make_features()).transform(bars.lazy())).collect()
+    master = pl.read_parquet(tmp_path / "transformed" / "master_table.parquet")
+    assert master.schema == expected.schema
+    assert master.select("identifier", "Date").equals(expected.select("identifier", "Date"))
+    for name in ["sma_21d", "rsi_14d", "ema_10d", "diff_Close_sma_21d"]:
+        assert master[name].to_list() == pytest.approx(expected[name].to_list(), rel=1e-9, nan_ok=True)
+
+    assert pipeline.metrics.bars == stream.height
+    assert pipeline.metrics.late_bars == 1
+    assert pipeline.metrics.batches >= stream.height // 50
+    assert 0 < pipeline.metrics.latency(0.5) <= pipeline.metrics.latency(0.99)
+    assert pipeline.metrics.compactions == 1
+    assert not list(pipeline.parts_directory.iterdir())
+
+def test_alerts_are_evaluated_per_batch(tmp_path, bars):
+    alert_engine = AlertEngine([CrossBelow("Close", "sma_21d")], state_store=AlertStateStore(str(tmp_path / "state.parquet")))
+    pipeline = make_pipeline(tmp_path, FileTailSource(str(tmp_path / "bars.jsonl")), alert_engine=alert_engine,
+                             metrics_path=str(tmp_path / "stream.json"))
+
+    # One day at a time, so every cross is on the latest bar of its batch
+    fired = []
+    for _, day in bars.sort("Date").group_by("Date", maintain_order=True):
+        fired.append(pipeline.process(day.to_dicts()))
+    pipeline.compact()
+    alerts = pl.concat([frame for frame in fired if frame.height]).sort("identifier", "Date")
+
+    # Every cross of the history, evaluated on the whole table
+    master = pl.read_parquet(tmp_path / "transformed" / "master_table.parquet")
+    below = pl.col("Close") < pl.col("sma_21d")
+    crosses = (
+        master.filter(below & (pl.col("Close").shift(1) >= pl.col("sma_21d").shift(1)).over("identifier"))
+        .select("identifier", "Date")
+    )
+    assert alerts.select("identifier", "Date").equals(crosses)
+    assert pipeline.metrics.alerts == alerts.height
+    assert json.loads((tmp_path / "stream.json").read_text())["bars"] == bars.height
+
+def test_pipeline_resumes_from_uncompacted_batches(tmp_path, bars):
+    first = bars.filter(pl.col("Date") < bars["Date"].unique().sort()[100])
+    second = bars.join(first, on=["identifier", "Date"], how="anti").sort("Date", "identifier")
+    source = FileTailSource(str(tmp_path / "missing.jsonl"))
+    make_pipeline(tmp_path, source).process(first.sort("Date", "identifier").to_dicts())
+
+    # Restarted before any compaction: the saved batches warm up the states
+    restarted = make_pipeline(tmp_path, source)
+    restarted.process(second.to_dicts())
+    restarted.compact()
+
+    expected = FeatureEngine(make_features()).transform(bars.lazy()).collect()
+    master = pl.read_parquet(tmp_path / "transformed" / "master_table.parquet")
+    assert master.height == bars.height
+    assert master["ema_10d"].to_list() == pytest.approx(expected["ema_10d"].to_list())
+
+def test_bounded_features_warm_up_from_the_last_rows(tmp_path, bars):
+    features = make_features()[:2]
+    cutoff = bars["Date"].unique().sort()[150]
+    history = bars.filter(pl.col("Date") < cutoff)
+    MasterSchema().write(FeatureEngine(features).transform(history.lazy()), tmp_path / "master_table.parquet")
+    # Only two of the four identifiers get new bars
+    streamed = bars["identifier"].unique().sort()[:2]
+    stream = bars.filter(pl.col("Date") >= cutoff, pl.col("identifier").is_in(streamed.implode())).sort("Date")
+
+    pipeline = StreamingPipeline(FileTailSource(str(tmp_path / "missing.jsonl")), features, str(tmp_path),
+                                 schema=MasterSchema())
+    replayed = []
+    update = pipeline.engine.update
+
+    def counted(key, row):
+        replayed.append(key)
+        return update(key, row)
+
+    pipeline.engine.update = counted
+    pipeline.start()
+    assert len(replayed) == 4 * FeatureEngine(features).lookback
+
+    pipeline.process(stream.to_dicts())
+    pipeline.compact()
+
+    master = pl.read_parquet(tmp_path / "master_table.parquet")
+    expected = MasterSchema().apply(FeatureEngine(features).transform(pl.concat([history, stream]).lazy())).collect()
+    assert master.select("identifier", "Date").equals(expected.select("identifier", "Date"))
+    untouched = ~pl.col("identifier").is_in(streamed.implode())
+    assert master.filter(untouched).equals(expected.filter(untouched))
+    for name in ["sma_21d", "rsi_14d"]:
+        assert master[name].to_list() == pytest.approx(expected[name].to_list(), rel=1e-6, nan_ok=True)
+
+def test_file_tail_source_waits_for_complete_lines(tmp_path):
+    path = tmp_path / "bars.jsonl"
+    source = FileTailSource(str(path))
+    assert source.poll(timeout=0.01, limit=10) == []
+
+    path.write_text('{"identifier": "A", "Date": "2024-01-02T09:30:00-05:00", "Close": 1.0}\n{"identifier": "A"')
+    bars = source.poll(timeout=0.01, limit=10)
+    assert [bar["Close"] for bar in bars] == [1.0]
+    assert bars[0]["Date"].utcoffset().total_seconds() == -5 * 3600
+
+    with open(path, "a") as file:
+        file.write(', "Date": "2024-01-02T09:31:00-05:00", "Close": 2.0}\n')
+    assert [bar["Close"] for bar in source.poll(timeout=0.01, limit=10)] == [2.0]
@@ -0,0 +1,30 @@
+import logging
+import os
+import subprocess
+import sys
+from common import logger as logger_module
+from common.logger import logger
+
+def test_logger_resolves_calling_module(caplog):
+    with caplog.at_level(logging.INFO, logger=__name__):
+        logger.info("hello")
+
+    (record,) = caplog.records
+    assert record.name == __name__
+    assert record.funcName == "test_logger_resolves_calling_module"
+    assert logger_module._loggers[__name__] is logging.getLogger(__name__)
+
+def test_disabled_levels_are_no_ops(caplog):
+    logging.getLogger(__name__).setLevel(logging.INFO)
+
+    assert logger.debug is logger_module._noop
+    logger.debug("not formatted %s", object())
+    assert logger.info is not logger_module._noop
+
+def test_queue_logging_writes_records_on_exit():
+    code = "from common.logger import logger; logger.warning('queued record')"
+    result = subprocess.run(
+        [sys.executable, "-c", code], env={**os.environ, "LOG_QUEUE": "1"}, capture_output=True, text=True
+    )
+
+    assert "queued record" in result.stderr
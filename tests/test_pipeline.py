@@ -0,0 +1,170 @@
+import json
+import numpy as np
+import pandas as pd
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+from stock_alert.features import FeatureEngine, MovingAverage
+from stock_alert.features.atomic_features import Distance, Lag, RelativeStrengthIndex, Returns, Volatility
+from stock_alert.fetcher import BaseFetcher
+from stock_alert.pipeline import DataPipeline
+from stock_alert.regimes import RegimeBands
+from stock_alert.transformer import Difference, ZScore
+
+class FrameFetcher(BaseFetcher):
+    """Fetcher serving a fixed pandas frame."""
+    def __init__(self, data: pd.DataFrame) -> None:
+        super().__init__(cache_dir=None)
+        self.data = data
+
+    def fetch(self) -> pd.DataFrame:
+        return self.data
+
+def make_market(identifiers: list[str], start: str, end: str, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start, end, name="Date", tz="America/New_York")
+    frames = []
+    for identifier in identifiers:
+        close = np.round(100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates)))), 2)
+        frames.append(pd.DataFrame({"Date": dates, "Close": close, "identifier": identifier}))
+    return pd.concat(frames, ignore_index=True)
+
+def make_engine() -> FeatureEngine:
+    returns = Returns(column="Close", n_days=1, sort_by="Date", group_by="identifier")
+    sma_50 = MovingAverage(column="Close", window_days=50, sort_by="Date", group_by="identifier")
+    return FeatureEngine([
+        MovingAverage(column="Close", window_days=21, sort_by="Date", group_by="identifier"),
+        MovingAverage(column="Close", window_days=200, sort_by="Date", group_by="identifier"),
+        Returns(column="Close", n_days=1, sort_by="Date", group_by="identifier"),
+        Volatility(column="Close", window_days=21, sort_by="Date", group_by="identifier"),
+        Volatility(column="Close", window_days=100, sort_by="Date", group_by="identifier"),
+        RelativeStrengthIndex(column="Close", window_days=14, sort_by="Date", group_by="identifier"),
+        Lag(column="Close", n_days=5, sort_by="Date", group_by="identifier"),
+        # Features of features, the SMA50 being an intermediate
+        RelativeStrengthIndex(column=returns, window_days=14, sort_by="Date", group_by="identifier"),
+        Distance(column="Close", reference=sma_50, sort_by="Date", group_by="identifier"),
+    ])
+
+def run(data: pd.DataFrame, directory, incremental: bool = True, batch_size: int | None = None) -> pl.DataFrame:
+    pipeline = DataPipeline(
+        FrameFetcher(data), make_engine(), str(directory), incremental=incremental, batch_size=batch_size
+    )
+    pipeline.run()
+    return pl.read_parquet(directory / "master_table.parquet")
+
+def test_feature_engine_lookback():
+    assert make_engine().lookback == 200
+    assert FeatureEngine([RelativeStrengthIndex(column="Close", window_days=14)]).lookback == 15
+
+def test_incremental_run_is_identical_to_full_recompute(tmp_path):
+    market = make_market(["A", "B", "C"], "2023-06-01", "2026-01-09")
+    days = sorted(market["Date"].unique())
+
+    # Daily runs over the turn of the year; C only appears in the last runs
+    for day in days[-12:]:
+        visible = market[market["Date"] <= day]
+        visible = visible[(visible["identifier"] != "C") | (day >= days[-3])]
+        incremental = run(visible, tmp_path / "incremental")
+
+    full = run(market, tmp_path / "full")
+
+    assert incremental.height == len(market)
+    assert_frame_equal(incremental, full, check_exact=True)
+
+def test_incremental_run_recomputes_restated_history(tmp_path):
+    market = make_market(["A", "B"], "2024-01-01", "2025-06-30")
+    run(market[market["Date"] < "2025-06-20"], tmp_path / "incremental")
+
+    restated = market.copy()
+    restated.loc[restated["identifier"] == "B", "Close"] *= 0.5
+    incremental = run(restated, tmp_path / "incremental")
+    full = run(restated, tmp_path / "full")
+
+    assert_frame_equal(incremental, full, check_exact=True)
+
+def test_blocked_features_match_plain_features(tmp_path):
+    market = make_market(["A", "B"], "2023-01-01", "2025-12-31")
+
+    blocked = run(market, tmp_path / "blocked")
+    plain = run(market, tmp_path / "plain", incremental=False).sort("identifier", "Date")
+
+    assert_frame_equal(blocked, plain, check_exact=False, rel_tol=1e-9, abs_tol=1e-9)
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_batched_run_matches_single_batch(tmp_path, incremental):
+    market = make_market(["A", "B", "C", "D", "E"], "2025-01-01", "2025-12-31")
+
+    single = run(market, tmp_path / "single", incremental=incremental).sort("identifier", "Date")
+    batched = run(market, tmp_path / "batched", incremental=incremental, batch_size=2)
+
+    assert_frame_equal(batched, single, check_exact=True)
+    assert not (tmp_path / "batched" / ".master_table.parts").exists()
+
+def test_pipeline_wraps_errors():
+    with pytest.raises(RuntimeError):
+        DataPipeline(FrameFetcher(pd.DataFrame()), make_engine()).run()
+
+def test_pipeline_reports_stage_metrics(tmp_path):
+    market = make_market(["A", "B"], "2025-01-01", "2025-06-30")
+    pipeline = DataPipeline(
+        FrameFetcher(market), make_engine(), str(tmp_path),
+        report_path=str(tmp_path / "report.json"), prometheus_path=str(tmp_path / "metrics.prom"),
+    )
+    pipeline.run()
+
+    report = json.loads((tmp_path / "report.json").read_text())
+    assert report["status"] == "succeeded"
+    assert [stage["name"] for stage in report["stages"]] == ["fetch", "transform", "sink"]
+    sink = report["stages"][-1]
+    assert sink["rows"] == len(market)
+    assert sink["bytes_written"] == (tmp_path / "master_table.parquet").stat().st_size
+    assert all(stage["seconds"] > 0 and stage["peak_rss_bytes"] > 0 for stage in report["stages"])
+
+    prometheus = (tmp_path / "metrics.prom").read_text()
+    assert f'stock_alert_stage_rows{{stage="sink"}} {len(market)}' in prometheus
+    assert "stock_alert_run_success 1" in prometheus
+
+def test_pipeline_profiles_transformation(tmp_path):
+    market = make_market(["A", "B"], "2025-01-01", "2025-06-30")
+    pipeline = DataPipeline(FrameFetcher(market), make_engine(), str(tmp_path), profile=True)
+    pipeline.run()
+
+    report = pipeline.last_report
+    assert [stage.name for stage in report.stages] == ["fetch", "transform", "execute", "sink"]
+    assert report.query_plan and report.profile
+    assert pl.read_parquet(tmp_path / "master_table.parquet").height == len(market)
+
+def test_failed_run_is_reported(tmp_path):
+    pipeline = DataPipeline(FrameFetcher(pd.DataFrame()), make_engine(), report_path=str(tmp_path / "report.json"))
+    with pytest.raises(RuntimeError):
+        pipeline.run()
+
+    report = json.loads((tmp_path / "report.json").read_text())
+    assert report["status"] == "failed"
+    assert report["stages"][-1]["name"] == "fetch"
+
+def test_pipeline_saves_regime_bands(tmp_path):
+    market = make_market(["A", "B"], "2024-01-01", "2025-06-30")
+    pipeline = DataPipeline(FrameFetcher(market), make_engine(), str(tmp_path), regime_bands=RegimeBands())
+    pipeline.run()
+
+    assert pipeline.last_report.stages[-1].name == "regimes"
+    saved = pl.read_parquet(tmp_path / "rsi_14d_regimes.parquet")
+    expected = RegimeBands().compute(pl.scan_parquet(tmp_path / "master_table.parquet")).collect()
+    assert_frame_equal(saved, expected)
+
+def test_transformers_run_in_incremental_and_batched_runs(tmp_path):
+    market = make_market(["A", "B", "C"], "2023-06-01", "2025-06-30")
+    transformers = [Difference("Close", "sma_200d", percent=True), ZScore("Close", "sma_21d", "volatility_21d")]
+
+    def run_with(directory, data, **kwargs):
+        DataPipeline(FrameFetcher(data), make_engine(), str(directory), transformers=transformers, **kwargs).run()
+        return pl.read_parquet(directory / "master_table.parquet")
+
+    full = run_with(tmp_path / "full", market)
+    expected = ((full["Close"] - full["sma_200d"]) / full["sma_200d"] * 100).alias("diff_pct_Close_sma_200d")
+    assert_frame_equal(full.select(expected.name), expected.to_frame())
+
+    run_with(tmp_path / "incremental", market[market["Date"] < "2025-03-01"], incremental=True)
+    assert_frame_equal(run_with(tmp_path / "incremental", market, incremental=True), full)
+    assert_frame_equal(run_with(tmp_path / "batched", market, batch_size=2), full)
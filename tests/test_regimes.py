@@ -0,0 +1,48 @@
+import polars as pl
+import pytest
+from stock_alert.fetcher import SyntheticFetcher
+from stock_alert.features import FeatureEngine
+from stock_alert.features.atomic_features import RelativeStrengthIndex
+from stock_alert.regimes import RegimeBands
+
+def make_master() -> pl.LazyFrame:
+    data = SyntheticFetcher(n_identifiers=5, n_days=400, seed=3).scan()
+    rsi = RelativeStrengthIndex(column="Close", window_days=14, sort_by="Date", group_by="identifier")
+    return FeatureEngine([rsi]).transform(data)
+
+def loop_bands(rows: pl.DataFrame, condition) -> list[tuple]:
+    """Bands of one identifier, walking the rows one by one."""
+    bands, start = [], None
+    dates, values = rows["Date"].to_list(), rows["rsi_14d"].to_list()
+    for i, (date, value) in enumerate(zip(dates, values)):
+        inside = value is not None and condition(value)
+        if inside and start is None:
+            start = i
+        elif not inside and start is not None:
+            bands.append((dates[start], date, i - start, False))
+            start = None
+    if start is not None:
+        bands.append((dates[start], dates[-1], len(dates) - start, True))
+    return bands
+
+def test_bands_match_row_by_row_detection():
+    master = make_master().collect()
+    bands = RegimeBands().compute(master.lazy()).collect()
+
+    conditions = {"overbought": lambda value: value > 70, "oversold": lambda value: value < 30}
+    for (identifier,), rows in master.sort("identifier", "Date").group_by("identifier", maintain_order=True):
+        for regime, condition in conditions.items():
+            computed = bands.filter(pl.col("identifier") == identifier, pl.col("regime") == regime)
+            expected = loop_bands(rows, condition)
+            assert computed.select("start", "end", "rows", "ongoing").rows() == expected
+    assert bands.height > 0
+
+def test_custom_regimes_and_save(tmp_path):
+    master = make_master()
+    bands = RegimeBands(regimes={"neutral": (40.0, 60.0)})
+
+    assert bands.save(master, tmp_path / bands.table_name) > 0
+    saved = pl.read_parquet(tmp_path / "rsi_14d_regimes.parquet")
+    assert saved["regime"].unique().to_list() == ["neutral"]
+    with pytest.raises(ValueError):
+        RegimeBands(regimes={})
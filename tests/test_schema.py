@@ -0,0 +1,67 @@
+from datetime import date
+import polars as pl
+import pyarrow.parquet as pq
+from polars.testing import assert_frame_equal
+from stock_alert.features import FeatureEngine, MovingAverage
+from stock_alert.features.atomic_features import RelativeStrengthIndex, Volatility
+from stock_alert.fetcher import ReplayFetcher, SyntheticFetcher
+from stock_alert.pipeline import DataPipeline
+from stock_alert.schema import MasterSchema
+
+def make_engine() -> FeatureEngine:
+    return FeatureEngine([
+        MovingAverage(column="Close", window_days=21, sort_by="Date", group_by="identifier"),
+        Volatility(column="Close", window_days=21, sort_by="Date", group_by="identifier"),
+        RelativeStrengthIndex(column="Close", window_days=14, sort_by="Date", group_by="identifier"),
+    ])
+
+def test_schema_is_enforced_on_write(tmp_path):
+    data = SyntheticFetcher(n_identifiers=5, n_days=300).scan().collect().sample(fraction=1.0, shuffle=True, seed=0)
+    path = tmp_path / "master_table.parquet"
+    MasterSchema(row_group_size=500, float64_columns=["High"], date_dtype=pl.Date).write(data.lazy(), path)
+
+    stored = pl.read_parquet(path)
+    assert stored.columns == ["Date", "Open", "High", "Low", "Close", "Volume", "identifier"]
+    assert stored.schema["identifier"] == pl.String
+    assert stored.schema["Date"] == pl.Date
+    assert stored.schema["Close"] == pl.Float32
+    assert stored.schema["High"] == pl.Float64
+    assert stored.select("identifier", "Date").equals(
+        data.select("identifier", pl.col("Date").dt.date()).sort("identifier", "Date")
+    )
+    # Prices in cents survive the float32 round trip
+    assert (stored["Close"].cast(pl.Float64).round(2) == data.sort("identifier", "Date")["Close"]).all()
+    assert stored["Date"].min() == date(2015, 1, 2)
+
+    metadata = pq.ParquetFile(path).metadata
+    assert metadata.num_row_groups == -(-stored.height // 500)
+    assert all(metadata.row_group(i).column(0).statistics.has_min_max for i in range(metadata.num_row_groups))
+
+def test_incremental_run_with_schema_is_identical_to_full_run(tmp_path):
+    path = tmp_path / "raw.parquet"
+    SyntheticFetcher(n_identifiers=4, n_days=600).scan().collect().write_parquet(path)
+    last_day = pl.read_parquet(path)["Date"].max()
+
+    def run(directory, schema: MasterSchema = MasterSchema(), **kwargs) -> pl.DataFrame:
+        DataPipeline(ReplayFetcher(str(path), **kwargs), make_engine(), str(directory), incremental=True,
+                     schema=schema).run()
+        return pl.read_parquet(directory / "master_table.parquet")
+
+    run(tmp_path / "incremental", end=last_day.replace(year=last_day.year - 1))
+    incremental = run(tmp_path / "incremental")
+    full = run(tmp_path / "full")
+
+    assert_frame_equal(incremental, full, check_exact=True)
+    assert full.schema["sma_21d"] == pl.Float32
+    assert "Dividends" not in full.columns
+
+    # Incremental runs join the fetched data with the stored table on the identifier
+    schema = MasterSchema(identifier_dtype=pl.Categorical)
+    run(tmp_path / "categorical", schema, end=last_day.replace(year=last_day.year - 1))
+    categorical = run(tmp_path / "categorical", schema)
+    assert categorical.schema["identifier"] == pl.Categorical
+    assert_frame_equal(categorical.with_columns(pl.col("identifier").cast(pl.String)), full)
+
+    # The features are computed in double precision from the stored prices
+    expected = make_engine().transform(MasterSchema().normalize(pl.scan_parquet(path))).collect()
+    assert_frame_equal(full, MasterSchema().apply(expected.lazy()).collect())
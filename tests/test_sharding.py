@@ -0,0 +1,82 @@
+from functools import partial
+from pathlib import Path
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+from stock_alert.features import FeatureEngine, MovingAverage
+from stock_alert.features.atomic_features import RelativeStrengthIndex
+from stock_alert.fetcher import ReplayFetcher, SyntheticFetcher
+from stock_alert.pipeline import DataPipeline
+from stock_alert.regimes import RegimeBands
+from stock_alert.sharding import Shard, ShardedPipeline, shard_of
+
+class FlakyFetcher(ReplayFetcher):
+    """Replays the data, but fails on SYN00003 until the `fixed` file exists."""
+    def __init__(self, path: str, fixed: str, identifiers: list[str]) -> None:
+        super().__init__(path, identifiers=identifiers)
+        self.fixed = fixed
+
+    def scan(self) -> pl.LazyFrame:
+        if "SYN00003" in self.identifiers and not Path(self.fixed).exists():
+            raise ConnectionError("Source unavailable")
+        return super().scan()
+
+def make_engine() -> FeatureEngine:
+    return FeatureEngine([
+        MovingAverage(column="Close", window_days=21, sort_by="Date", group_by="identifier"),
+        RelativeStrengthIndex(column="Close", window_days=14, sort_by="Date", group_by="identifier"),
+    ])
+
+@pytest.fixture
+def raw_path(tmp_path):
+    path = tmp_path / "raw.parquet"
+    SyntheticFetcher(n_identifiers=12, n_days=300).scan().collect().write_parquet(path)
+    return path
+
+def test_shards_are_stable_and_parsed():
+    identifiers = [f"SYN{i:05d}" for i in range(100)]
+    assert [shard_of(i, 4) for i in identifiers] == [shard_of(i, 4) for i in identifiers]
+    assert len({shard_of(i, 4) for i in identifiers}) == 4
+    assert Shard.parse("2/8") == Shard(2, 8)
+    with pytest.raises(ValueError):
+        Shard.parse("8/8")
+
+def test_sharded_run_matches_a_single_run(tmp_path, raw_path):
+    identifiers = [f"SYN{i:05d}" for i in range(12)]
+    DataPipeline(ReplayFetcher(str(raw_path)), make_engine(), str(tmp_path / "single"), incremental=True).run()
+
+    sharded = ShardedPipeline(
+        partial(ReplayFetcher, str(raw_path)), identifiers, make_engine(), str(tmp_path / "sharded"),
+        n_shards=3, max_workers=2, incremental=True, regime_bands=RegimeBands(),
+    )
+    sharded.run()
+
+    expected = pl.read_parquet(tmp_path / "single" / "master_table.parquet")
+    assert_frame_equal(pl.read_parquet(tmp_path / "sharded" / "master_table.parquet"), expected)
+    assert (tmp_path / "sharded" / "rsi_14d_regimes.parquet").exists()
+    names = [stage.name for stage in sharded.last_report.stages]
+    assert names == ["shard 0/3", "shard 1/3", "shard 2/3", "merge", "regimes"]
+
+def test_failed_shard_is_retried_alone(tmp_path, raw_path):
+    identifiers = [f"SYN{i:05d}" for i in range(12)]
+    fixed = tmp_path / "fixed"
+    sharded = ShardedPipeline(
+        partial(FlakyFetcher, str(raw_path), str(fixed)), identifiers, make_engine(), str(tmp_path / "out"),
+        shards=[identifiers[:3], identifiers[3:6], identifiers[6:]], max_workers=2, retries=0,
+    )
+
+    with pytest.raises(RuntimeError, match=r"Shards \[1\] failed"):
+        sharded.run()
+    assert not (tmp_path / "out" / "master_table.parquet").exists()
+    done = sharded.shard_directory(0) / "master_table.parquet"
+    mtime = done.stat().st_mtime_ns
+
+    fixed.touch()
+    sharded.run_shard(1)
+    sharded.merge()
+
+    # The shards that succeeded were not rerun
+    assert done.stat().st_mtime_ns == mtime
+    merged = pl.read_parquet(tmp_path / "out" / "master_table.parquet")
+    assert merged["identifier"].unique().sort().to_list() == identifiers
+    assert merged.select("identifier", "Date").is_duplicated().sum() == 0
@@ -0,0 +1,88 @@
+from datetime import date, datetime
+import polars as pl
+import pytest
+from stock_alert.storage import PartitionedStore
+
+def make_bars(identifier: str, start: date, end: date) -> pl.DataFrame:
+    dates = pl.datetime_range(start, end, "1d", eager=True, time_zone="America/New_York")
+    return pl.DataFrame({
+        "Date": dates,
+        "Close": [float(i) for i in range(len(dates))],
+        "identifier": identifier,
+    })
+
+@pytest.fixture
+def store(tmp_path):
+    store = PartitionedStore(tmp_path / "stocks")
+    store.replace(pl.concat([
+        make_bars("AAPL", date(2024, 12, 30), date(2026, 1, 2)),
+        make_bars("^GSPC", date(2025, 6, 1), date(2026, 1, 2)),
+    ]))
+    return store
+
+def test_partitions_by_identifier_and_year(store):
+    assert store.identifiers() == ["AAPL", "^GSPC"]
+    assert len(store.files(["AAPL"])) == 3
+    assert len(store.files(["^GSPC"])) == 2
+    assert len(store.files(["AAPL"], start=date(2025, 3, 1), end=date(2025, 3, 31))) == 1
+    # Across the newest partitions
+    assert store.last_rows(["AAPL"], n=3)["Date"].dt.day().to_list() == [31, 1, 2]
+
+def test_scan_pushes_down_identifier_and_date(store):
+    result = store.read(["^GSPC"], start=date(2025, 12, 30), end=datetime(2026, 1, 1))
+
+    assert result["identifier"].unique().to_list() == ["^GSPC"]
+    assert result["Date"].dt.date().to_list() == [date(2025, 12, 30), date(2025, 12, 31), date(2026, 1, 1)]
+
+def test_append_only_rewrites_affected_partitions(store):
+    untouched = {path: path.stat().st_mtime_ns for path in store.files()}
+    new_day = make_bars("AAPL", date(2026, 1, 3), date(2026, 1, 3))
+
+    written = store.append(new_day)
+
+    assert written == store.files(["AAPL"], start=date(2026, 1, 1))
+    for path, mtime in untouched.items():
+        if path not in written:
+            assert path.stat().st_mtime_ns == mtime
+    assert store.last_rows(["AAPL"])["Date"].dt.date().to_list() == [date(2026, 1, 3)]
+
+def test_append_replaces_existing_dates(store):
+    restated = make_bars("AAPL", date(2026, 1, 2), date(2026, 1, 2)).with_columns(pl.lit(-1.0).alias("Close"))
+
+    store.append(restated)
+
+    result = store.read(["AAPL"], start=date(2026, 1, 1))
+    assert result.height == 2
+    assert result["Close"][-1] == -1.0
+
+def test_replace_drops_previous_history(store):
+    store.replace(make_bars("AAPL", date(2026, 1, 1), date(2026, 1, 2)))
+
+    assert len(store.files(["AAPL"])) == 1
+    assert store.read(["AAPL"]).height == 2
+    assert store.read(["^GSPC"]).height > 2
+
+def test_scan_reads_columns_added_later(store):
+    store.append(make_bars("AAPL", date(2026, 1, 3), date(2026, 1, 3)).with_columns(pl.lit(1.0).alias("Volume")))
+
+    result = store.read(start=date(2026, 1, 1))
+
+    assert result.columns == ["Date", "Close", "identifier", "Volume"]
+    assert result.filter(pl.col("Volume").is_not_null())["Date"].dt.date().to_list() == [date(2026, 1, 3)]
+
+def test_scan_widens_numeric_columns_and_rejects_other_dtype_changes(store):
+    # New partitions, written in the dtypes of their rows
+    store.append(make_bars("AAPL", date(2027, 1, 1), date(2027, 1, 1)).with_columns(pl.col("Close").cast(pl.Float32)))
+    store.append(make_bars("MSFT", date(2026, 1, 2), date(2026, 1, 2)).with_columns(pl.col("Close").cast(pl.Int32)))
+
+    result = store.read(start=date(2026, 1, 1))
+
+    assert result.schema["Close"] == pl.Float64
+    assert result.group_by("identifier").len().sort("identifier").rows() == [("AAPL", 3), ("MSFT", 1), ("^GSPC", 2)]
+
+    store.append(make_bars("TSLA", date(2026, 1, 2), date(2026, 1, 2)).with_columns(pl.col("Date").dt.cast_time_unit("ms")))
+    with pytest.raises(ValueError, match="Column 'Date'"):
+        store.scan(start=date(2026, 1, 1))
+
+def test_scan_of_missing_identifier_is_empty(store):
+    assert store.read(["MSFT"]).is_empty()
@@ -0,0 +1,27 @@
+import numpy as np
+import polars as pl
+import pytest
+from stock_alert.features import FeatureEngine, MovingAverage
+from stock_alert.features.atomic_features import Volatility
+from stock_alert.fetcher import SyntheticFetcher
+from stock_alert.transformer import Difference, ZScore
+
+def test_transforms_match_numpy():
+    sma = MovingAverage(column="Close", window_days=21, sort_by="Date", group_by="identifier")
+    std = Volatility(column="Close", window_days=21, sort_by="Date", group_by="identifier")
+    data = FeatureEngine([sma, std]).transform(SyntheticFetcher(n_identifiers=3, n_days=100).scan())
+    transformers = [Difference("Close", sma), Difference("Close", sma, percent=True), ZScore("Close", sma, std)]
+
+    for transformer in transformers:
+        data = transformer.transform(data)
+    result = data.collect()
+
+    close, mean, deviation = (result[c].to_numpy() for c in ["Close", "sma_21d", "volatility_21d"])
+    assert result["diff_Close_sma_21d"].to_numpy() == pytest.approx(close - mean, nan_ok=True)
+    assert result["diff_pct_Close_sma_21d"].to_numpy() == pytest.approx((close - mean) / mean * 100, nan_ok=True)
+    assert result["zscore_Close_sma_21d"].to_numpy() == pytest.approx((close - mean) / deviation, nan_ok=True)
+    assert np.isfinite(result["zscore_Close_sma_21d"].drop_nulls().to_numpy()).all()
+
+def test_custom_name():
+    data = pl.LazyFrame({"Close": [1.0, 2.0], "ref": [2.0, 2.0]})
+    assert Difference("Close", "ref", name="gap").transform(data).collect()["gap"].to_list() == [-1.0, 0.0]